@@ -1,8 +1,9 @@
 from flask import Flask, jsonify
-from database import db
+from database import db, create_missing_indexes
 from routes import api
 from pybreaker import CircuitBreaker
 from extensions import limiter  # Import limiter from extensions.py
+from idempotency import idempotency_store
 
 # Flask App Initialization
 app = Flask(__name__)
@@ -13,6 +14,8 @@ app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['CIRCUIT_BREAKER_FAIL_MAX'] = 5
 app.config['CIRCUIT_BREAKER_RESET_TIMEOUT'] = 60
 app.config['RATE_LIMITS'] = ["200 per day", "50 per hour"]
+app.config['IDEMPOTENCY_TTL'] = 24 * 3600  # Seconds a response to an Idempotency-Key request is replayed
+app.config['IDEMPOTENCY_EVICTION_INTERVAL'] = 300
 
 # Circuit Breaker Configuration
 circuit_breaker = CircuitBreaker(
@@ -25,6 +28,8 @@ limiter.init_app(app)
 # Initialize extensions
 db.init_app(app)
 api.init_app(app)
+idempotency_store.init_app(app)
+create_missing_indexes(app)  # Indexes added to the models since the database was created
 
 @app.errorhandler(429)
 def ratelimit_exceeded(e):
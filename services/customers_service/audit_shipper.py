@@ -0,0 +1,188 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+
+import requests
+
+# Backpressure policies applied when the in-process queue is full
+DROP = "drop"
+BLOCK = "block"
+
+class AuditShipper:
+    """
+    Ships audit events to the security service from a background worker.
+
+    Request handlers call `submit()`, which only puts the event on a bounded in-process
+    queue. A daemon worker drains the queue and sends the events in batches, either when
+    `batch_size` events are waiting or when `flush_interval` seconds have passed since the
+    first event of the batch was queued, so request latency no longer depends on the audit path.
+
+    Args:
+        url (str): The security service bulk endpoint that receives batches of audit events.
+        batch_size (int): The maximum number of events sent in one batch.
+        flush_interval (float): The maximum number of seconds an event waits before it is sent.
+        max_queue_size (int): The capacity of the in-process queue.
+        policy (str): What `submit()` does when the queue is full: "drop" discards the event,
+            "block" waits up to `block_timeout` seconds for room and then discards it.
+        block_timeout (float): How long a "block" submit waits for room in the queue.
+        circuit_breaker (CircuitBreaker, optional): Breaker wrapping the HTTP calls to the security service.
+    """
+
+    def __init__(self, url, batch_size=50, flush_interval=1.0, max_queue_size=10000,
+                 policy=DROP, block_timeout=0.5, circuit_breaker=None):
+        if policy not in (DROP, BLOCK):
+            raise ValueError(f"Unsupported backpressure policy: {policy}")
+        self.url = url
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.circuit_breaker = circuit_breaker
+        self.session = requests.Session()
+        self.queue = queue.Queue(maxsize=max_queue_size)
+        self.stats = {"submitted": 0, "sent": 0, "dropped": 0, "failed": 0}
+        self._stats_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._worker = None
+
+    def start(self):
+        """
+        Starts the background worker if it is not already running.
+
+        The worker is started lazily on the first `submit()`, so importing the module
+        never spawns threads or opens connections.
+        """
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._stopping.clear()
+                self._worker = threading.Thread(target=self._run, name="audit-shipper", daemon=True)
+                self._worker.start()
+
+    def submit(self, event):
+        """
+        Queues an audit event for delivery without waiting on the network.
+
+        Args:
+            event (dict): The audit payload expected by the security service.
+
+        Returns:
+            bool: True if the event was queued, False if it was dropped because of backpressure.
+        """
+        self.start()
+        try:
+            if self.policy == BLOCK:
+                self.queue.put(event, timeout=self.block_timeout)
+            else:
+                self.queue.put_nowait(event)
+        except queue.Full:
+            self._count("dropped")
+            logging.warning(f"Audit queue full, dropping event: {event}")
+            return False
+        self._count("submitted")
+        return True
+
+    def close(self, timeout=5.0):
+        """
+        Stops the worker after it has flushed every queued event.
+
+        Registered with `atexit` so that events queued just before shutdown are not lost.
+
+        Args:
+            timeout (float): The maximum number of seconds to wait for the final flush.
+        """
+        self._stopping.set()
+        if self._worker is not None:
+            self._worker.join(timeout)
+
+    def _count(self, name, amount=1):
+        with self._stats_lock:
+            self.stats[name] += amount
+
+    def _run(self):
+        while not (self._stopping.is_set() and self.queue.empty()):
+            batch = self._next_batch()
+            if batch:
+                self._send(batch)
+
+    def _next_batch(self):
+        """
+        Collects up to `batch_size` events, waiting at most `flush_interval` after the first one.
+        """
+        try:
+            batch = [self.queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._stopping.is_set():
+                # Drain whatever is already queued without waiting any longer
+                try:
+                    batch.append(self.queue.get_nowait())
+                    continue
+                except queue.Empty:
+                    break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _post(self, batch):
+        response = self.session.post(self.url, json=batch, timeout=5)
+        response.raise_for_status()
+        return response.json()
+
+    def _send(self, batch):
+        """
+        Sends a batch to the security service's bulk endpoint in one request.
+
+        Events rejected by validation are logged and not retried, since resending them cannot succeed.
+        """
+        try:
+            if self.circuit_breaker is not None:
+                result = self.circuit_breaker.call(self._post, batch)
+            else:
+                result = self._post(batch)
+        except Exception as e:
+            self._count("failed", len(batch))
+            logging.error(f"Failed to ship {len(batch)} audit events: {e}")
+            return
+        self._count("sent", result.get("accepted", 0))
+        for rejected in result.get("rejected", []):
+            self._count("failed")
+            logging.error(f"Audit event rejected: {rejected.get('error')}. Details: {batch[rejected['index']]}")
+
+def create_shipper(url, circuit_breaker=None):
+    """
+    Builds an `AuditShipper` configured from environment variables and registers its shutdown flush.
+
+    Environment variables:
+        AUDIT_BATCH_SIZE (int): Events per batch (default 50).
+        AUDIT_FLUSH_INTERVAL (float): Seconds before a partial batch is sent (default 1.0).
+        AUDIT_QUEUE_SIZE (int): Capacity of the in-process queue (default 10000).
+        AUDIT_BACKPRESSURE (str): "drop" or "block" (default "drop").
+        AUDIT_BLOCK_TIMEOUT (float): Seconds a blocked submit waits for room (default 0.5).
+
+    Args:
+        url (str): The security service bulk endpoint that receives batches of audit events.
+        circuit_breaker (CircuitBreaker, optional): Breaker wrapping the HTTP calls.
+
+    Returns:
+        AuditShipper: The configured shipper.
+    """
+    shipper = AuditShipper(
+        url,
+        batch_size=int(os.getenv("AUDIT_BATCH_SIZE", 50)),
+        flush_interval=float(os.getenv("AUDIT_FLUSH_INTERVAL", 1.0)),
+        max_queue_size=int(os.getenv("AUDIT_QUEUE_SIZE", 10000)),
+        policy=os.getenv("AUDIT_BACKPRESSURE", DROP),
+        block_timeout=float(os.getenv("AUDIT_BLOCK_TIMEOUT", 0.5)),
+        circuit_breaker=circuit_breaker
+    )
+    atexit.register(shipper.close)
+    return shipper
@@ -0,0 +1,120 @@
+import functools
+import threading
+import uuid
+from datetime import datetime, timezone
+from flask import Response, request
+from flask_restful.utils import unpack
+from werkzeug.http import http_date
+
+class Generations:
+    """
+    Generation counters for conditional GET (`ETag` / `If-None-Match`, `Last-Modified` / `If-Modified-Since`).
+
+    Every cacheable resource has a name (e.g. "goods" or "reviews:product:3"), and every write bumps the
+    names it affects. The ETag of a response is the process boot id plus the current generations of its
+    names, so checking a conditional request costs a dictionary lookup: no query and no serialization.
+    The boot id makes sure ETags handed out before a restart never match afterwards.
+
+    Counters live in the process. A name whose writes can happen in another process can be tracked
+    from a shared counter instead with `track(name, counter)`. Names bumped locally are only correct
+    with a single worker: behind several workers, one that did not handle a write keeps its old
+    generation and answers 304 to clients holding the old ETag.
+    """
+
+    def __init__(self):
+        self.boot_id = uuid.uuid4().hex[:12]
+        self.booted_at = datetime.now(timezone.utc)
+        self._counters = {}  # name -> (generation, last modified)
+        self._sources = {}  # name -> callable returning a shared generation
+        self._lock = threading.Lock()
+
+    def track(self, name, counter):
+        """
+        Reads the generation of `name` from `counter()` instead of the local counter.
+
+        `counter` returns an int, or None when the shared counter cannot be read; conditional GET is
+        then skipped for that request. Last-Modified is the time this process first saw the value.
+        """
+        self._sources[name] = counter
+
+    def bump(self, *names):
+        """
+        Marks resources as changed. Call it after committing the write.
+        """
+        now = datetime.now(timezone.utc)
+        with self._lock:
+            for name in names:
+                if name in self._sources:
+                    continue
+                generation = self._counters.get(name, (0, None))[0]
+                self._counters[name] = (generation + 1, now)
+
+    def _generation(self, name):
+        source = self._sources.get(name)
+        if source is None:
+            return self._counters.get(name, (0, self.booted_at))
+        value = source()
+        if value is None:
+            return None
+        with self._lock:
+            seen = self._counters.get(name)
+            if seen is None or seen[0] != value:
+                seen = (value, datetime.now(timezone.utc))
+                self._counters[name] = seen
+            return seen
+
+    def current(self, *names):
+        """
+        Returns `(etag, last_modified)` for a response built from the given resources, or
+        `(None, None)` if a shared counter cannot be read.
+        """
+        generations = [self._generation(name) for name in names]
+        if any(generation is None for generation in generations):
+            return None, None
+        etag = "-".join([self.boot_id] + [str(generation) for generation, _ in generations])
+        return etag, max(last_modified for _, last_modified in generations)
+
+# Shared counters of this service
+generations = Generations()
+
+def not_modified(etag, last_modified):
+    """
+    Tells whether the conditional headers of the current request match. `If-None-Match` takes
+    precedence over `If-Modified-Since`, which has a resolution of one second.
+    """
+    if request.if_none_match:
+        return request.if_none_match.contains(etag)
+    if request.if_modified_since is not None:
+        return last_modified.replace(microsecond=0) <= request.if_modified_since
+    return False
+
+def conditional(*names):
+    """
+    Decorates a Flask-RESTful GET method with conditional GET support.
+
+    `names` are the generation names the response depends on; they are formatted with the view
+    arguments, e.g. `@conditional("reviews:product:{good_id}")`. A matching request is answered with
+    304 Not Modified before the view runs. Successful responses get `ETag` and `Last-Modified` headers.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            etag, last_modified = generations.current(*[name.format(**kwargs) for name in names])
+            if etag is None:
+                return view(*args, **kwargs)
+            headers = {"ETag": f'"{etag}"', "Last-Modified": http_date(last_modified), "Cache-Control": "no-cache"}
+            if not_modified(etag, last_modified):
+                return Response(status=304, headers=headers)
+
+            result = view(*args, **kwargs)
+            if isinstance(result, Response):
+                if result.status_code == 200:
+                    result.headers.update(headers)
+                return result
+            data, status_code, response_headers = unpack(result)
+            if status_code == 200:
+                response_headers = dict(response_headers or {}, **headers)
+            return data, status_code, response_headers
+
+        return wrapper
+    return decorator
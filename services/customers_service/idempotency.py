@@ -0,0 +1,185 @@
+import functools
+import hashlib
+import json
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from flask import Response, request
+from flask_restful.utils import unpack
+from sqlalchemy.dialects.sqlite import insert
+from database import db
+from models import IdempotencyRecord
+
+# Request header carrying the client's idempotency key
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = 255
+
+records_table = IdempotencyRecord.__table__
+
+class IdempotencyStore:
+    """
+    Replays stored responses for retried requests that carry an `Idempotency-Key` header.
+
+    The first request with a key claims it by inserting a row holding the key, the request scope
+    (method and path) and a hash of the body. Once the handler finishes, its response is stored on that row.
+    A retry with the same key and body then gets the stored response back without running the
+    handler again. While the first request is still running, a retry gets 409 Conflict. Reusing a
+    key with a different body gets 422 Unprocessable Entity.
+
+    Responses with a 5xx status are not stored, so the client can retry them. Rows expire after `ttl`
+    seconds and are deleted by a background sweeper every `eviction_interval` seconds. A claim that
+    never completed (e.g. the worker died) can be taken over after `lock_timeout` seconds.
+
+    Args:
+        ttl (int): Seconds a stored response is replayed.
+        eviction_interval (int): Seconds between sweeps of expired rows.
+        lock_timeout (int): Seconds after which an unfinished claim is considered abandoned.
+    """
+
+    def __init__(self, ttl=24 * 3600, eviction_interval=300, lock_timeout=60):
+        self.ttl = ttl
+        self.eviction_interval = eviction_interval
+        self.lock_timeout = lock_timeout
+        self._sweeper = None
+
+    def init_app(self, app):
+        """
+        Configures the store from the Flask app config and starts the eviction sweeper.
+
+        Config keys:
+            IDEMPOTENCY_TTL (int): Seconds a stored response is replayed.
+            IDEMPOTENCY_EVICTION_INTERVAL (int): Seconds between sweeps of expired rows.
+            IDEMPOTENCY_LOCK_TIMEOUT (int): Seconds after which an unfinished claim can be taken over.
+        """
+        self.ttl = app.config.get('IDEMPOTENCY_TTL', self.ttl)
+        self.eviction_interval = app.config.get('IDEMPOTENCY_EVICTION_INTERVAL', self.eviction_interval)
+        self.lock_timeout = app.config.get('IDEMPOTENCY_LOCK_TIMEOUT', self.lock_timeout)
+        if self._sweeper is None:
+            self._sweeper = threading.Thread(target=self._sweep_loop, args=(app,), name="idempotency-sweeper", daemon=True)
+            self._sweeper.start()
+
+    def _sweep_loop(self, app):
+        while True:
+            time.sleep(self.eviction_interval)
+            try:
+                with app.app_context():
+                    self.evict_expired()
+            except Exception as e:
+                logging.error(f"Failed to evict expired idempotency keys: {e}")
+
+    def evict_expired(self, now=None):
+        """
+        Deletes every expired row.
+
+        Returns:
+            int: The number of deleted rows.
+        """
+        result = db.session.execute(
+            db.delete(records_table).where(records_table.c.expires_at <= (now or datetime.utcnow()))
+        )
+        db.session.commit()
+        return result.rowcount
+
+    def _claim(self, key, scope, request_hash):
+        """
+        Inserts the claim row, or returns the existing row if the key is already taken.
+        """
+        now = datetime.utcnow()
+        claimed = db.session.execute(
+            insert(records_table)
+            .values(key=key, scope=scope, request_hash=request_hash, created_at=now, expires_at=now + timedelta(seconds=self.ttl))
+            .on_conflict_do_nothing()
+        ).rowcount
+        if claimed:
+            db.session.commit()
+            return None
+
+        existing = db.session.execute(
+            db.select(records_table).where(records_table.c.key == key, records_table.c.scope == scope)
+        ).first()
+        if existing is None:
+            # Evicted between the INSERT and the SELECT: try again
+            db.session.commit()
+            return self._claim(key, scope, request_hash)
+        abandoned = existing.status_code is None and existing.created_at <= now - timedelta(seconds=self.lock_timeout)
+        if existing.expires_at <= now or abandoned:
+            # Take over an expired or abandoned row, but only if no other request got to it first
+            taken = db.session.execute(
+                db.update(records_table)
+                .where(records_table.c.key == key, records_table.c.scope == scope, records_table.c.created_at == existing.created_at)
+                .values(request_hash=request_hash, status_code=None, response_body=None,
+                        created_at=now, expires_at=now + timedelta(seconds=self.ttl))
+            ).rowcount
+            db.session.commit()
+            if taken:
+                return None
+            existing = db.session.execute(
+                db.select(records_table).where(records_table.c.key == key, records_table.c.scope == scope)
+            ).first()
+        db.session.commit()
+        return existing
+
+    def _finish(self, key, scope, status_code, body):
+        match = (records_table.c.key == key, records_table.c.scope == scope)
+        if status_code >= 500:
+            # Failed requests are not replayed: release the key so the client can retry
+            db.session.execute(db.delete(records_table).where(*match))
+        else:
+            db.session.execute(db.update(records_table).where(*match).values(status_code=status_code, response_body=body))
+        db.session.commit()
+
+    def discard(self, key, scope):
+        """
+        Deletes a key in the current transaction, without committing, so that the next request with
+        it runs the handler again instead of replaying the stored response.
+
+        Used when the effect of the stored response is undone, e.g. a debit that was refunded.
+        """
+        db.session.execute(db.delete(records_table).where(records_table.c.key == key, records_table.c.scope == scope))
+
+    def idempotent(self, view):
+        """
+        Decorates a Flask-RESTful method so that requests with an `Idempotency-Key` header run at most once.
+
+        Requests without the header are handled as before.
+        """
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            key = request.headers.get(IDEMPOTENCY_HEADER)
+            if not key:
+                return view(*args, **kwargs)
+            if len(key) > MAX_KEY_LENGTH:
+                return {"error": f"{IDEMPOTENCY_HEADER} must be at most {MAX_KEY_LENGTH} characters"}, 400
+
+            scope = f"{request.method} {request.path}"
+            request_hash = hashlib.sha256(request.get_data()).hexdigest()
+            existing = self._claim(key, scope, request_hash)
+            if existing is not None:
+                if existing.request_hash != request_hash:
+                    return {"error": f"{IDEMPOTENCY_HEADER} was already used with a different request"}, 422
+                if existing.status_code is None:
+                    return {"error": "A request with this idempotency key is still in progress"}, 409
+                return Response(existing.response_body, status=existing.status_code, mimetype="application/json",
+                                headers={"Idempotent-Replayed": "true"})
+
+            try:
+                result = view(*args, **kwargs)
+            except Exception:
+                db.session.rollback()
+                self._finish(key, scope, 500, None)
+                raise
+
+            if isinstance(result, Response):
+                status_code, body = result.status_code, result.get_data(as_text=True)
+            else:
+                data, status_code, _ = unpack(result)
+                body = json.dumps(data)
+            self._finish(key, scope, status_code, body)
+            return result
+
+        return wrapper
+
+# Shared store, configured by `idempotency_store.init_app(app)`
+idempotency_store = IdempotencyStore()
+idempotent = idempotency_store.idempotent
@@ -0,0 +1,172 @@
+import json
+import logging
+import os
+import threading
+import time
+from cryptography.fernet import Fernet, MultiFernet, InvalidToken
+
+class KeyUnavailableError(RuntimeError):
+    """
+    Raised when no encryption key could be obtained, so that data is never stored in plaintext.
+    """
+
+class KeyProvider:
+    """
+    Caches the service's Fernet keys in-process and keeps them fresh in the background.
+
+    Keys are fetched lazily on first use instead of at import time. After that a daemon thread
+    refreshes them every `refresh_interval` seconds; a key set older than `ttl` seconds is refreshed
+    synchronously on the next use, by one caller while the others keep using the cached keys. If a
+    refresh fails, the last known keys stay in use and no caller retries before a backoff delay,
+    which doubles with every consecutive failure (up to `refresh_interval`).
+
+    Several keys can be active at once: the first is the primary key used for encryption and the
+    others are only used for decryption (`MultiFernet`), so rotating keys in the security service
+    takes effect without a restart.
+
+    When `cache_path` and `seal_key` are set, the keys are also written to a local file sealed with
+    `seal_key`. On startup that file is read first, so the service can serve requests before the
+    security service answers.
+
+    Args:
+        fetch_keys (callable): Returns the list of active keys (primary first) from the security service.
+        ttl (float): Seconds after which cached keys must be refreshed before use.
+        refresh_interval (float, optional): Seconds between background refreshes. Defaults to half the TTL.
+        cache_path (str, optional): Path of the sealed on-disk key cache.
+        seal_key (str, optional): Fernet key used to seal the on-disk cache.
+        retry_backoff (float): Seconds before the first retry after a failed refresh.
+    """
+
+    def __init__(self, fetch_keys, ttl=300, refresh_interval=None, cache_path=None, seal_key=None, retry_backoff=5):
+        self.fetch_keys = fetch_keys
+        self.ttl = ttl
+        self.refresh_interval = refresh_interval or ttl / 2
+        self.cache_path = cache_path
+        self.sealer = Fernet(seal_key) if cache_path and seal_key else None
+        self._keys = []
+        self._fernet = None
+        self._fetched_at = 0.0
+        self.retry_backoff = retry_backoff
+        self._failures = 0
+        self._retry_at = 0.0
+        self._lock = threading.Lock()
+        self._refresher = None
+        self._loaded_from_cache = False
+
+    def keys(self):
+        """
+        Returns the active keys, primary first.
+        """
+        self.get_fernet()
+        return list(self._keys)
+
+    def get_fernet(self):
+        """
+        Returns a `MultiFernet` over the active keys, fetching or refreshing them if needed.
+
+        Returns:
+            MultiFernet: Encrypts with the primary key and decrypts with any active key.
+
+        Raises:
+            KeyUnavailableError: If no key could be obtained from the security service or the local cache.
+        """
+        if self._fernet is None:
+            with self._lock:
+                if self._fernet is None:
+                    self._load_sealed_cache()
+                    if self._fernet is None and time.monotonic() >= self._retry_at:
+                        self._refresh_locked()
+            self._start_refresher()
+        elif time.monotonic() - self._fetched_at > self.ttl and time.monotonic() >= self._retry_at:
+            self._try_refresh()
+
+        if self._fernet is None:
+            raise KeyUnavailableError("Encryption key is not available")
+        return self._fernet
+
+    def refresh(self):
+        """
+        Fetches the keys from the security service and swaps them in if they changed.
+
+        Returns:
+            bool: True if the refresh succeeded.
+        """
+        with self._lock:
+            return self._refresh_locked()
+
+    def _try_refresh(self):
+        # Stale keys are still valid: if another thread is already refreshing, use them instead of waiting
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            self._refresh_locked()
+        finally:
+            self._lock.release()
+
+    def _refresh_locked(self):
+        try:
+            keys = [key for key in self.fetch_keys() if key]
+        except Exception as e:
+            logging.error(f"Failed to refresh encryption keys: {e}")
+            self._back_off()
+            return False
+        if not keys:
+            logging.error("Security service returned no encryption keys")
+            self._back_off()
+            return False
+        if keys != self._keys:
+            self._install(keys)
+            self._write_sealed_cache(keys)
+        self._fetched_at = time.monotonic()
+        self._failures = 0
+        self._retry_at = 0.0
+        return True
+
+    def _back_off(self):
+        self._failures += 1
+        delay = min(self.retry_backoff * 2 ** (self._failures - 1), self.refresh_interval)
+        self._retry_at = time.monotonic() + delay
+
+    def _install(self, keys):
+        self._fernet = MultiFernet([Fernet(key) for key in keys])
+        self._keys = keys
+
+    def _start_refresher(self):
+        if self._refresher is not None:
+            return
+        with self._lock:
+            if self._refresher is None:
+                self._refresher = threading.Thread(target=self._refresh_loop, name="key-refresher", daemon=True)
+                self._refresher.start()
+
+    def _refresh_loop(self):
+        if self._loaded_from_cache:
+            # Replace the cached keys as soon as the security service answers
+            self.refresh()
+        while True:
+            time.sleep(self.refresh_interval)
+            self.refresh()
+
+    def _load_sealed_cache(self):
+        if self.sealer is None or not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path, "rb") as cache_file:
+                keys = json.loads(self.sealer.decrypt(cache_file.read()))
+            self._install(keys)
+            self._fetched_at = time.monotonic()
+            self._loaded_from_cache = True
+        except (OSError, ValueError, InvalidToken) as e:
+            logging.error(f"Ignoring unreadable encryption key cache: {e}")
+
+    def _write_sealed_cache(self, keys):
+        if self.sealer is None:
+            return
+        temporary_path = f"{self.cache_path}.tmp"
+        try:
+            with open(temporary_path, "wb") as cache_file:
+                cache_file.write(self.sealer.encrypt(json.dumps(keys).encode()))
+            os.chmod(temporary_path, 0o600)
+            os.replace(temporary_path, self.cache_path)
+        except OSError as e:
+            logging.error(f"Failed to write encryption key cache: {e}")
@@ -0,0 +1,90 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+class LookupCache:
+    """
+    Short-lived cache of the customer fields needed at checkout, keyed by username.
+
+    Entries expire after `ttl` seconds and are dropped as soon as this process changes the
+    customer (wallet change, update or delete), so the TTL only bounds staleness caused by
+    other processes. Each entry carries an ETag so clients can revalidate with `If-None-Match`.
+
+    Args:
+        ttl (float): Seconds an entry stays valid.
+        max_entries (int): The maximum number of cached usernames; the least recently used are evicted first.
+    """
+
+    def __init__(self, ttl=2.0, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_etag(value):
+        """
+        Returns a strong ETag (unquoted) for a cached value.
+        """
+        return hashlib.sha1(json.dumps(value, sort_keys=True).encode()).hexdigest()
+
+    def get(self, username):
+        """
+        Returns `(value, etag)` for a username, or None on a miss.
+        """
+        with self._lock:
+            entry = self._entries.get(username)
+            if entry is not None and time.monotonic() - entry[2] > self.ttl:
+                del self._entries[username]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(username)
+            self.hits += 1
+            return entry[0], entry[1]
+
+    def put(self, username, value):
+        """
+        Caches the value of a username and returns its ETag.
+        """
+        etag = self.make_etag(value)
+        with self._lock:
+            self._entries[username] = (value, etag, time.monotonic())
+            self._entries.move_to_end(username)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return etag
+
+    def invalidate(self, *usernames):
+        """
+        Drops the cached values of the given usernames.
+        """
+        with self._lock:
+            for username in usernames:
+                self._entries.pop(username, None)
+
+    def clear(self):
+        """
+        Drops every cached value.
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """
+        Returns the hit and miss counters and the number of cached usernames.
+        """
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+
+# Shared cache used by the username lookup endpoints and invalidated by every customer write
+customer_lookup_cache = LookupCache(
+    ttl=float(os.getenv("CUSTOMER_LOOKUP_TTL", 2.0)),
+    max_entries=int(os.getenv("CUSTOMER_LOOKUP_CACHE_SIZE", 10000))
+)
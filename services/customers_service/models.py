@@ -14,6 +14,46 @@ class Customer(db.Model):
     wallet_balance = db.Column(db.Float, default=0.0)
     created_at = db.Column(db.DateTime, nullable=False, server_default=db.func.now())
 
+
+class WalletLedger(db.Model):
+    __tablename__ = 'wallet_ledger'
+    __table_args__ = (
+        db.Index('ix_wallet_ledger_customer_id_id', 'customer_id', 'id'),
+        # A debit is refunded at most once: refunds reference it as `refund:<ledger_id>`
+        db.Index('ix_wallet_ledger_refund_reference', 'reference', unique=True, sqlite_where=db.text("reason = 'refund'")),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    customer_id = db.Column(db.Integer, nullable=False)
+    amount = db.Column(db.Float, nullable=False)
+    reason = db.Column(db.String(50), nullable=False)
+    reference = db.Column(db.String(120), nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, server_default=db.func.now())
+
+class WalletSnapshot(db.Model):
+    __tablename__ = 'wallet_snapshots'
+    __table_args__ = (
+        db.Index('ix_wallet_snapshots_customer_id_ledger_id', 'customer_id', 'ledger_id'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    customer_id = db.Column(db.Integer, nullable=False)
+    ledger_id = db.Column(db.Integer, nullable=False)
+    balance = db.Column(db.Float, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, server_default=db.func.now())
+
+
+class IdempotencyRecord(db.Model):
+    __tablename__ = 'idempotency_keys'
+    __table_args__ = (
+        db.Index('ix_idempotency_keys_expires_at', 'expires_at'),
+    )
+    key = db.Column(db.String(255), primary_key=True)
+    scope = db.Column(db.String(255), primary_key=True)
+    request_hash = db.Column(db.String(64), nullable=False)
+    status_code = db.Column(db.Integer, nullable=True)
+    response_body = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, server_default=db.func.now())
+    expires_at = db.Column(db.DateTime, nullable=False)
+
 """
 The `Customer` class represents a customer in the system, and is used for interacting with the `customers` table in the database.
 
@@ -38,3 +78,42 @@ Usage:
 - The class can be used to create, query, update, and delete customer records in the database.
 - It provides a structured way to store customer information, such as authentication details and personal data.
 """
+
+
+"""
+The `WalletLedger` class is the append-only history of wallet changes, stored in the `wallet_ledger` table.
+Every change to `Customer.wallet_balance` adds one row in the same transaction; rows are never updated or deleted.
+
+Attributes:
+- `id` (int): The unique, increasing identifier of the entry (Primary Key).
+- `customer_id` (int): The customer whose wallet changed.
+- `amount` (float): The signed change (negative for debits).
+- `reason` (str): Why the wallet changed (e.g., "top_up", "purchase").
+- `reference` (str): An optional caller reference, such as a sale or order id.
+- `created_at` (datetime): When the change was made.
+
+The `WalletSnapshot` class stores the balance of a wallet right after a given ledger entry, in the `wallet_snapshots` table.
+A snapshot is written for the first entry of each customer and then every `WALLET_SNAPSHOT_INTERVAL` entries,
+so the balance at any point of the history is a snapshot plus a bounded number of ledger entries.
+
+Attributes:
+- `id` (int): The unique identifier of the snapshot (Primary Key).
+- `customer_id` (int): The customer whose balance was recorded.
+- `ledger_id` (int): The ledger entry after which the balance was recorded.
+- `balance` (float): The wallet balance after that entry.
+- `created_at` (datetime): When the snapshot was written.
+"""
+
+"""
+The `IdempotencyRecord` class stores requests made with an `Idempotency-Key` header, in the `idempotency_keys` table.
+The first request with a key claims it; its response is stored once it completes and replayed for retries of the same request.
+
+Attributes:
+- `key` (str): The client's idempotency key (Primary Key, with `scope`).
+- `scope` (str): The method and path the key was used on (Primary Key, with `key`).
+- `request_hash` (str): SHA-256 of the request body.
+- `status_code` (int): The stored response status, or None while the request is in progress.
+- `response_body` (str): The stored JSON response body.
+- `created_at` (datetime): When the key was claimed.
+- `expires_at` (datetime): When the row stops being replayed and can be evicted.
+"""
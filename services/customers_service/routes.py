@@ -1,13 +1,42 @@
 from flask_restful import Api, Resource
 from models import Customer
 from database import db
-from flask import request, jsonify
+from flask import request, jsonify, Response, stream_with_context
 from werkzeug.security import generate_password_hash
-from utils import log_to_audit, encrypt_data, decrypt_data, circuit_breaker
+from utils import log_to_audit, encrypt_data, decrypt_data, decrypt_many, circuit_breaker
 from extensions import limiter
+from lookup_cache import customer_lookup_cache
+from idempotency import idempotent
+from etag import conditional, generations
+from wallet import apply_wallet_change, refund_debit, wallet_history, CustomerNotFound, InsufficientFunds, DebitNotFound
+import json
 
 api = Api()
 
+# Fields that GET /customers can return, and how each stored value is turned into its JSON value
+CUSTOMER_FIELDS = {
+    "id": None,
+    "full_name": None,
+    "username": None,
+    "email": None,
+    "age": None,
+    "address": None,
+    "gender": None,
+    "marital_status": None,
+    "wallet_balance": None,
+    "created_at": lambda value: value.strftime("%Y-%m-%d %H:%M:%S")
+}
+
+# Encrypted fields, decrypted in one batch per page or chunk
+ENCRYPTED_CUSTOMER_FIELDS = ["email", "address"]
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+STREAM_CHUNK_SIZE = 500
+
+# Maximum number of usernames in one POST /customers/username/batch request
+MAX_LOOKUP_BATCH_SIZE = 1000
+
 class RegisterCustomer(Resource):
     decorators = [limiter.limit("10/minute")]  # Limit endpoint to 10 requests per minute
 
@@ -55,6 +84,7 @@ class RegisterCustomer(Resource):
         )
         db.session.add(customer)
         db.session.commit()
+        generations.bump("customers")
 
         log_to_audit("customers_service", "POST /customers/register", "success", user=username, details="Customer registered")
         return {"message": "Customer registered successfully"}, 201
@@ -78,12 +108,15 @@ class UpdateCustomer(Resource):
             log_to_audit("customers_service", "PUT /customers/<int:customer_id>", "error", details="Customer not found")
             return {"error": "Customer not found"}, 404
 
+        previous_username = customer.username
         if "username" in data:
             customer.username = data.get('username', customer.username)
         if "email" in data:
             customer.email = encrypt_data(data.get('email', decrypt_data(customer.email)))
 
         db.session.commit()
+        customer_lookup_cache.invalidate(previous_username, customer.username)
+        generations.bump("customers")
         log_to_audit("customers_service", "PUT /customers/<int:customer_id>", "success", user=customer.username, details="Customer updated")
         return {"message": "Customer updated successfully"}, 200
 
@@ -108,59 +141,369 @@ class DeleteCustomer(Resource):
         log_to_audit("customers_service", "DELETE /customers/<int:customer_id>", "success", user=customer.username, details="Customer deleted")
         db.session.delete(customer)
         db.session.commit()
+        customer_lookup_cache.invalidate(customer.username)
+        generations.bump("customers", f"wallet:{customer_id}")
         return {"message": "Customer deleted successfully"}, 200
 
+def lookup_customers(usernames):
+    """
+    Returns the checkout fields (`id` and `wallet_balance`) of customers by username.
+
+    Cached entries are served from `customer_lookup_cache`; the rest are loaded with a single
+    indexed `username IN (...)` query that selects only those two columns, and then cached.
+
+    Args:
+        usernames (list): The usernames to look up.
+
+    Returns:
+        dict: `{username: (value, etag)}` for every username that exists.
+    """
+    found = {}
+    missing = []
+    for username in dict.fromkeys(usernames):
+        cached = customer_lookup_cache.get(username)
+        if cached is not None:
+            found[username] = cached
+        else:
+            missing.append(username)
+
+    if missing:
+        rows = db.session.execute(
+            db.select(Customer.username, Customer.id, Customer.wallet_balance).where(Customer.username.in_(missing))
+        ).all()
+        for row in rows:
+            value = {"id": row.id, "wallet_balance": row.wallet_balance}
+            found[row.username] = (value, customer_lookup_cache.put(row.username, value))
+    return found
+
+class GetCustomerByUsername(Resource):
+    decorators = [limiter.limit("60/minute")]
+
+    def get(self, username):
+        """
+        Fetches the fields checkout needs for one customer.
+
+        Responds with an ETag; a request whose `If-None-Match` matches it gets 304 Not Modified.
+
+        Returns:
+            dict: The customer's `id` and `wallet_balance`, or an error message.
+        """
+        result = lookup_customers([username]).get(username)
+        if result is None:
+            log_to_audit("customers_service", "GET /customers/username/<username>", "error", user=username, details="Customer not found")
+            return {"error": "Customer not found"}, 404
+
+        value, etag = result
+        headers = {"ETag": f'"{etag}"', "Cache-Control": f"private, max-age={int(customer_lookup_cache.ttl)}"}
+        if request.if_none_match.contains(etag):
+            return Response(status=304, headers=headers)
+        return value, 200, headers
+
+class GetCustomersByUsername(Resource):
+    decorators = [limiter.limit("60/minute")]
+
+    def post(self):
+        """
+        Fetches the fields checkout needs for many customers in one request.
+
+        Request Body:
+            usernames (list): Up to 1000 usernames.
+
+        Returns:
+            dict: `customers` maps each found username to its `id` and `wallet_balance`;
+            `missing` lists the usernames that do not exist.
+        """
+        usernames = (request.json or {}).get('usernames')
+        if not isinstance(usernames, list) or not all(isinstance(username, str) for username in usernames):
+            return {"error": "usernames must be a list of strings"}, 400
+        if len(usernames) > MAX_LOOKUP_BATCH_SIZE:
+            return {"error": f"At most {MAX_LOOKUP_BATCH_SIZE} usernames can be looked up at once"}, 400
+
+        found = lookup_customers(usernames)
+        log_to_audit("customers_service", "POST /customers/username/batch", "success", details=f"Looked up {len(usernames)} customers")
+        return {
+            "customers": {username: value for username, (value, _) in found.items()},
+            "missing": [username for username in dict.fromkeys(usernames) if username not in found]
+        }, 200
+
 class GetCustomers(Resource):
     decorators = [limiter.limit("20/minute")]
 
+    # Per-process generation: run one worker, or a write handled by another worker is answered with a stale 304
+    @conditional("customers")
     def get(self):
         """
-        Fetches all customers from the database.
+        Fetches customers page by page.
+
+        Query Parameters:
+            fields (str, optional): Comma-separated fields to return (default: all). Encrypted fields
+                (`email`, `address`) are only decrypted when they are requested.
+            limit (int, optional): Page size (default 100, maximum 1000).
+            cursor (int, optional): The `next_cursor` of the previous page.
+            stream (bool, optional): If "true", streams every remaining customer as one chunked JSON array.
 
         Returns:
-            dict: A list of customer records.
-        """
-        customers = Customer.query.all()
-        log_to_audit("customers_service", "GET /customers", "success", details="Fetched all customers")
-        return jsonify([{
-            "id": c.id,
-            "full_name": c.full_name,
-            "username": c.username,
-            "email": decrypt_data(c.email),
-            "age": c.age,
-            "address": decrypt_data(c.address) if c.address else None,
-            "gender": c.gender,
-            "marital_status": c.marital_status,
-            "wallet_balance": c.wallet_balance,
-            "created_at": c.created_at.strftime("%Y-%m-%d %H:%M:%S")
-        } for c in customers])
+            dict: A page of customer records and the `next_cursor` (None on the last page),
+            or a streamed JSON array when `stream=true`. Responses carry an ETag and Last-Modified
+            that change with every customer write; a matching conditional request gets 304 Not Modified.
+        """
+        fields = request.args.get('fields')
+        fields = [field.strip() for field in fields.split(",") if field.strip()] if fields else list(CUSTOMER_FIELDS)
+        unknown = [field for field in fields if field not in CUSTOMER_FIELDS]
+        if unknown:
+            return {"error": f"Unknown fields: {', '.join(unknown)}"}, 400
+
+        try:
+            limit = min(int(request.args.get('limit', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+            cursor = int(request.args.get('cursor', 0))
+        except ValueError:
+            return {"error": "limit and cursor must be integers"}, 400
+        if limit < 1:
+            return {"error": "limit must be greater than zero"}, 400
+
+        # Only the requested columns are loaded; `id` is always selected to drive the keyset cursor
+        columns = [Customer.__table__.c[field] for field in dict.fromkeys(["id"] + fields)]
+        query = db.select(*columns).where(Customer.id > cursor).order_by(Customer.id)
+
+        log_to_audit("customers_service", "GET /customers", "success", details="Fetched customers")
+        if request.args.get('stream', '').lower() == 'true':
+            return self.stream(query, fields)
+
+        rows = db.session.execute(query.limit(limit + 1)).all()
+        next_cursor = rows[limit - 1].id if len(rows) > limit else None
+        return jsonify({
+            "customers": serialize_customers(rows[:limit], fields),
+            "next_cursor": next_cursor
+        })
+
+    def stream(self, query, fields):
+        """
+        Streams every customer matched by the query as a chunked JSON array.
+
+        Rows are read from a server-side cursor in chunks of `STREAM_CHUNK_SIZE`, so memory use
+        stays flat no matter how many customers there are.
+
+        Returns:
+            Response: A streamed `application/json` response.
+        """
+        def generate():
+            yield "["
+            first = True
+            result = db.session.execute(query.execution_options(stream_results=True, yield_per=STREAM_CHUNK_SIZE))
+            for chunk in result.partitions():
+                for customer in serialize_customers(chunk, fields):
+                    yield ("" if first else ",") + json.dumps(customer)
+                    first = False
+            yield "]"
+
+        return Response(stream_with_context(generate()), mimetype='application/json')
+
+def serialize_customers(rows, fields):
+    """
+    Builds the JSON representation of customer rows.
+
+    Encrypted fields are only decrypted when requested, and then for all rows in one batch.
+
+    Args:
+        rows (list): Rows holding at least the requested columns.
+        fields (list): The fields to include.
+
+    Returns:
+        list: The customer records.
+    """
+    decrypted = {
+        field: decrypt_many([getattr(row, field) for row in rows])
+        for field in ENCRYPTED_CUSTOMER_FIELDS if field in fields
+    }
+    customers = []
+    for index, row in enumerate(rows):
+        customer = {}
+        for field in fields:
+            if field in decrypted:
+                customer[field] = decrypted[field][index]
+                continue
+            value = getattr(row, field)
+            transform = CUSTOMER_FIELDS[field]
+            customer[field] = transform(value) if transform and value is not None else value
+        customers.append(customer)
+    return customers
+
+def parse_amount(data):
+    """
+    Reads the `amount` of a wallet request body.
+
+    Returns:
+        float: The amount, or None if it is missing or not a number.
+    """
+    amount = (data or {}).get('amount')
+    if isinstance(amount, bool) or not isinstance(amount, (int, float)):
+        return None
+    return amount
 
 class WalletOperation(Resource):
     decorators = [limiter.limit("10/minute")]
 
+    @idempotent
     def put(self, customer_id):
         """
         Updates the wallet balance for a specific customer.
 
-        Increases the wallet balance by the specified amount.
+        Adds the specified amount to the wallet balance (negative amounts debit it) with a single
+        conditional UPDATE, and records the change in the wallet ledger. A change that would make
+        the balance negative is rejected. Requests with an `Idempotency-Key` header are applied at most once.
 
         Returns:
-            dict: Success or error message.
+            dict: Success or error message, and the new balance.
         """
         data = request.json
-        amount = data.get('amount')
+        amount = parse_amount(data)
 
         if amount is None:
             log_to_audit("customers_service", "PUT /customers/<int:customer_id>/wallet", "error", details="Amount is missing")
             return {"error": "Amount is required"}, 400
 
-        customer = Customer.query.get(customer_id)
-        if not customer:
+        try:
+            customer = apply_wallet_change(
+                amount,
+                customer_id=customer_id,
+                reason=data.get('reason') or ("top_up" if amount >= 0 else "debit"),
+                reference=data.get('reference')
+            )
+        except CustomerNotFound:
             log_to_audit("customers_service", "PUT /customers/<int:customer_id>/wallet", "error", details="Customer not found")
             return {"error": "Customer not found"}, 404
-
-        customer.wallet_balance += amount
-        db.session.commit()
+        except InsufficientFunds:
+            log_to_audit("customers_service", "PUT /customers/<int:customer_id>/wallet", "error", details="Insufficient wallet balance")
+            return {"error": "Insufficient wallet balance"}, 400
 
         log_to_audit("customers_service", "PUT /customers/<int:customer_id>/wallet", "success", user=customer.username, details="Wallet updated")
-        return {"message": "Wallet balance updated successfully"}, 200
+        return {"message": "Wallet balance updated successfully", "wallet_balance": customer.wallet_balance}, 200
+
+class WalletDebit(Resource):
+    decorators = [limiter.limit("60/minute")]
+
+    @idempotent
+    def post(self, username):
+        """
+        Debits a customer's wallet by username in one call.
+
+        Used by the sales service at checkout: the balance check and the debit are the same
+        conditional UPDATE, so no prior GET of the customer is needed and concurrent purchases
+        cannot overdraw the wallet. Requests with an `Idempotency-Key` header are applied at most once,
+        so the caller can safely retry a debit that timed out.
+
+        Request Body:
+            amount (float): The positive amount to debit.
+            reference (str, optional): A reference stored in the ledger, such as the sale id.
+            reason (str, optional): The ledger reason (default "purchase").
+
+        Returns:
+            dict: The customer id, username, new wallet balance and the `ledger_id` of the debit, or an error message.
+        """
+        data = request.json
+        amount = parse_amount(data)
+
+        if amount is None or amount <= 0:
+            log_to_audit("customers_service", "POST /customers/username/<username>/wallet/debit", "error", user=username, details="Invalid amount")
+            return {"error": "A positive amount is required"}, 400
+
+        try:
+            customer = apply_wallet_change(
+                -amount,
+                username=username,
+                reason=data.get('reason') or "purchase",
+                reference=data.get('reference')
+            )
+        except CustomerNotFound:
+            log_to_audit("customers_service", "POST /customers/username/<username>/wallet/debit", "error", user=username, details="Customer not found")
+            return {"error": "Customer not found"}, 404
+        except InsufficientFunds:
+            log_to_audit("customers_service", "POST /customers/username/<username>/wallet/debit", "error", user=username, details="Insufficient wallet balance")
+            return {"error": "Insufficient wallet balance"}, 400
+
+        log_to_audit("customers_service", "POST /customers/username/<username>/wallet/debit", "success", user=username, details=f"Debited {amount}")
+        return {"id": customer.id, "username": customer.username, "wallet_balance": customer.wallet_balance, "ledger_id": customer.ledger_id}, 200
+
+class WalletRefund(Resource):
+    decorators = [limiter.limit("60/minute")]
+
+    @idempotent
+    def post(self, customer_id):
+        """
+        Refunds one wallet debit in full.
+
+        Used by the sales service to compensate a debit when the sale could not be recorded. The debit
+        is named by the `ledger_id` its response returned, and it is refunded at most once: refunding it
+        again returns the earlier refund with `refunded` set to false, so the call can be retried safely.
+
+        Request Body:
+            ledger_id (int): The ledger entry of the debit.
+            debit_key (str, optional): The `Idempotency-Key` the debit was made with. It is released with the
+                refund, so retrying the debit with it debits the wallet again instead of replaying the refunded debit.
+
+        Returns:
+            dict: The customer id, new wallet balance, the `ledger_id` of the refund and whether this call
+            `refunded` the debit, or an error message.
+        """
+        data = request.json or {}
+        ledger_id = data.get('ledger_id')
+        if isinstance(ledger_id, bool) or not isinstance(ledger_id, int) or not isinstance(data.get('debit_key') or "", str):
+            log_to_audit("customers_service", "POST /customers/<int:customer_id>/wallet/refund", "error", details="Invalid ledger_id or debit_key")
+            return {"error": "ledger_id must be an integer and debit_key a string"}, 400
+
+        try:
+            refund, refunded = refund_debit(customer_id, ledger_id, data.get('debit_key') or None)
+        except DebitNotFound:
+            log_to_audit("customers_service", "POST /customers/<int:customer_id>/wallet/refund", "error", details="Debit not found")
+            return {"error": "Debit not found"}, 404
+
+        log_to_audit(
+            "customers_service", "POST /customers/<int:customer_id>/wallet/refund", "success", user=refund.username,
+            details=f"Refunded ledger entry {ledger_id}" if refunded else f"Ledger entry {ledger_id} was already refunded"
+        )
+        return {"id": refund.id, "wallet_balance": refund.wallet_balance, "ledger_id": refund.ledger_id, "refunded": refunded}, 200
+
+class WalletHistory(Resource):
+    decorators = [limiter.limit("20/minute")]
+
+    # Per-process generation, bumped only by wallet changes made in this worker (see `GetCustomers`)
+    @conditional("wallet:{customer_id}")
+    def get(self, customer_id):
+        """
+        Fetches a customer's wallet history, newest first.
+
+        Query Parameters:
+            limit (int, optional): Page size (default 100, maximum 1000).
+            cursor (int, optional): The `next_cursor` of the previous page.
+
+        Returns:
+            dict: The ledger entries with the balance after each one, and the `next_cursor` (None on the last page).
+        """
+        try:
+            limit = min(int(request.args.get('limit', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+            cursor = request.args.get('cursor')
+            cursor = int(cursor) if cursor else None
+        except ValueError:
+            return {"error": "limit and cursor must be integers"}, 400
+        if limit < 1:
+            return {"error": "limit must be greater than zero"}, 400
+
+        if db.session.get(Customer, customer_id) is None:
+            log_to_audit("customers_service", "GET /customers/<int:customer_id>/wallet/history", "error", details="Customer not found")
+            return {"error": "Customer not found"}, 404
+
+        entries, next_cursor = wallet_history(customer_id, limit, cursor)
+        log_to_audit("customers_service", "GET /customers/<int:customer_id>/wallet/history", "success", details="Fetched wallet history")
+        return {"entries": entries, "next_cursor": next_cursor}, 200
+
+# Add API resources
+api.add_resource(RegisterCustomer, '/customers/register')
+api.add_resource(UpdateCustomer, '/customers/<int:customer_id>', endpoint='update_customer')
+api.add_resource(DeleteCustomer, '/customers/<int:customer_id>', endpoint='delete_customer')
+api.add_resource(GetCustomers, '/customers')
+api.add_resource(GetCustomersByUsername, '/customers/username/batch')
+api.add_resource(GetCustomerByUsername, '/customers/username/<string:username>')
+api.add_resource(WalletOperation, '/customers/<int:customer_id>/wallet')
+api.add_resource(WalletHistory, '/customers/<int:customer_id>/wallet/history')
+api.add_resource(WalletDebit, '/customers/username/<string:username>/wallet/debit')
+api.add_resource(WalletRefund, '/customers/<int:customer_id>/wallet/refund')
@@ -0,0 +1,78 @@
+import threading
+import time
+import pytest
+from cryptography.fernet import Fernet
+from key_provider import KeyProvider, KeyUnavailableError
+
+KEY = Fernet.generate_key().decode()
+
+class FlakySecurityService:
+    """
+    Serves the keys, or fails slowly like an unreachable server while `down` is set.
+    """
+
+    def __init__(self, delay=0.2):
+        self.down = False
+        self.delay = delay
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.down:
+            time.sleep(self.delay)
+            raise ConnectionError("Connection refused")
+        return [KEY]
+
+def expire(provider):
+    provider._fetched_at = time.monotonic() - provider.ttl - 1
+
+def test_a_failed_refresh_backs_off_and_keeps_the_cached_keys():
+    service = FlakySecurityService(delay=0)
+    provider = KeyProvider(service, ttl=60, retry_backoff=30)
+    fernet = provider.get_fernet()
+    service.down = True
+    expire(provider)
+
+    assert provider.get_fernet() is fernet
+    assert provider.get_fernet() is fernet
+    assert service.calls == 2
+
+def test_the_backoff_doubles_and_resets_after_a_success():
+    service = FlakySecurityService(delay=0)
+    provider = KeyProvider(service, ttl=60, retry_backoff=1)
+    provider.get_fernet()
+    service.down = True
+
+    started = time.monotonic()
+    provider.refresh()
+    provider.refresh()
+    assert provider._retry_at - started == pytest.approx(2, abs=0.5)
+
+    service.down = False
+    provider.refresh()
+    assert provider._retry_at == 0.0
+
+def test_callers_do_not_wait_for_a_slow_refresh_of_stale_keys():
+    service = FlakySecurityService(delay=0.5)
+    provider = KeyProvider(service, ttl=60, retry_backoff=30)
+    fernet = provider.get_fernet()
+    service.down = True
+    expire(provider)
+
+    refresher = threading.Thread(target=provider.get_fernet)
+    refresher.start()
+    time.sleep(0.1)
+    started = time.monotonic()
+    assert provider.get_fernet() is fernet
+    assert time.monotonic() - started < 0.1
+    refresher.join()
+
+def test_no_fetch_is_retried_during_the_backoff_when_no_key_is_known():
+    service = FlakySecurityService(delay=0)
+    service.down = True
+    provider = KeyProvider(service, retry_backoff=30)
+
+    for _ in range(3):
+        with pytest.raises(KeyUnavailableError):
+            provider.get_fernet()
+    assert service.calls == 1
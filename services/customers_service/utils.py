@@ -1,18 +1,28 @@
+import os
 import requests
-from cryptography.fernet import Fernet
 from pybreaker import CircuitBreaker
+from audit_shipper import create_shipper
+from key_provider import KeyProvider
+from batch_crypto import create_batch_crypto
 
 # Configuration for the security service URL
 SECURITY_SERVICE_URL = "http://127.0.0.1:5005"
 
+# Names of the active encryption keys in the security service, primary first
+ENCRYPTION_KEY_NAMES = os.getenv("ENCRYPTION_KEY_NAMES", "encryption_key").split(",")
+
 # Circuit breaker to handle retries and failures
 circuit_breaker = CircuitBreaker(fail_max=5, reset_timeout=60)
 
+# Background shipper that delivers audit events in batches off the request path
+audit_shipper = create_shipper(f"{SECURITY_SERVICE_URL}/audit_logs/bulk", circuit_breaker=circuit_breaker)
+
 def log_to_audit(service, operation, status, user=None, details=None):
     """
     Logs an audit entry to the security service.
 
-    This function sends a JSON payload to the security service's `/audit_logs` endpoint.
+    This function queues a JSON payload for the security service's `/audit_logs/bulk` endpoint.
+    The payload is delivered by the background `audit_shipper`, so the caller never waits on the network.
     It logs details about operations performed in the service, including status and user information.
 
     Args:
@@ -32,58 +42,82 @@ def log_to_audit(service, operation, status, user=None, details=None):
         "user": user,
         "details": details
     }
-    try:
-        response = circuit_breaker.call(requests.post, f"{SECURITY_SERVICE_URL}/audit_logs", json=payload)
-        response.raise_for_status()
-        print(f"Audit log successful: {response.status_code}")
-    except Exception as e:
-        print(f"Failed to log to security service: {e}. Details: {payload}")
+    audit_shipper.submit(payload)
 
-def fetch_encryption_key():
+def fetch_encryption_keys():
     """
-    Fetches the encryption key from the security service.
+    Fetches the active encryption keys from the security service.
 
-    This function retrieves the encryption key from the security service's `/secure_keys/encryption_key` endpoint.
+    This function retrieves every key named in `ENCRYPTION_KEY_NAMES` from the security service's
+    `/secure_keys/<key_name>` endpoint. The first name is the primary key used for encryption; the
+    others are older keys that are still accepted for decryption during a rotation.
     It uses a circuit breaker to handle retries and failures.
 
     Returns:
-        Fernet: An instance of Fernet initialized with the encryption key.
-        None: If the key retrieval fails.
+        list: The key values, primary first. Keys that are not found are skipped.
+
+    Raises:
+        Exception: If the primary key cannot be retrieved.
     """
-    try:
-        response = circuit_breaker.call(requests.get, f"{SECURITY_SERVICE_URL}/secure_keys/encryption_key")
+    keys = []
+    for index, key_name in enumerate(ENCRYPTION_KEY_NAMES):
+        response = circuit_breaker.call(requests.get, f"{SECURITY_SERVICE_URL}/secure_keys/{key_name}", timeout=5)
+        if response.status_code == 404 and index > 0:
+            continue
         response.raise_for_status()
-        key = response.json().get("key_value")
-        return Fernet(key)
-    except Exception as e:
-        print(f"Failed to fetch encryption key: {e}")
-        return None
+        keys.append(response.json().get("key_value"))
+    return keys
 
-# Initialize the encryption utility with the fetched key
-fernet = fetch_encryption_key()
+# Cached, background-refreshed encryption keys (fetched on first use, not at import time)
+key_provider = KeyProvider(
+    fetch_encryption_keys,
+    ttl=float(os.getenv("ENCRYPTION_KEY_TTL", 300)),
+    cache_path=os.getenv("ENCRYPTION_KEY_CACHE_PATH"),
+    seal_key=os.getenv("ENCRYPTION_KEY_CACHE_SEAL_KEY"),
+    retry_backoff=float(os.getenv("ENCRYPTION_KEY_RETRY_BACKOFF", 5))
+)
+
+# Batch encryption helper used by the list endpoints
+batch_crypto = create_batch_crypto()
 
 def encrypt_data(data):
     """
-    Encrypts the given data using the fetched encryption key.
+    Encrypts the given data using the primary encryption key.
 
     Args:
         data (str): The plain text data to be encrypted.
 
     Returns:
         str: The encrypted data in string format.
-        str: Returns the plain text data if the encryption key is not available.
+
+    Raises:
+        KeyUnavailableError: If no encryption key is available. Data is never stored in plaintext.
     """
-    return fernet.encrypt(data.encode()).decode() if fernet else data
+    return key_provider.get_fernet().encrypt(data.encode()).decode()
 
 def decrypt_data(encrypted_data):
     """
-    Decrypts the given encrypted data using the fetched encryption key.
+    Decrypts the given encrypted data using any of the active encryption keys.
 
     Args:
         encrypted_data (str): The encrypted data to be decrypted.
 
     Returns:
         str: The decrypted plain text data.
-        str: Returns the encrypted data as is if the encryption key is not available.
+
+    Raises:
+        KeyUnavailableError: If no encryption key is available.
+    """
+    return key_provider.get_fernet().decrypt(encrypted_data.encode()).decode()
+
+def decrypt_many(encrypted_values):
+    """
+    Decrypts a list of encrypted values in one batch, in parallel for large lists.
+
+    Args:
+        encrypted_values (list): The encrypted strings; `None` entries stay `None`.
+
+    Returns:
+        list: The decrypted plain text strings, in the same order.
     """
-    return fernet.decrypt(encrypted_data.encode()).decode() if fernet else encrypted_data
+    return batch_crypto.decrypt_many(encrypted_values, key_provider.keys())
@@ -0,0 +1,249 @@
+import os
+from collections import namedtuple
+from sqlalchemy.exc import IntegrityError
+from database import db
+from models import Customer, WalletLedger, WalletSnapshot
+from lookup_cache import customer_lookup_cache
+from etag import generations
+from idempotency import idempotency_store
+
+# A balance snapshot is written every this many ledger entries of a customer
+WALLET_SNAPSHOT_INTERVAL = int(os.getenv("WALLET_SNAPSHOT_INTERVAL", 100))
+
+# Idempotency scope of the debits of a customer, as recorded by `WalletDebit`
+DEBIT_SCOPE = "POST /customers/username/{username}/wallet/debit"
+
+# Result of a wallet change: the customer's id, username and new balance, and the id of the ledger entry written
+WalletChange = namedtuple('WalletChange', ['id', 'username', 'wallet_balance', 'ledger_id'])
+
+customers_table = Customer.__table__
+ledger_table = WalletLedger.__table__
+snapshots_table = WalletSnapshot.__table__
+
+class CustomerNotFound(LookupError):
+    """
+    Raised when a wallet change targets a customer that does not exist.
+    """
+
+class InsufficientFunds(ValueError):
+    """
+    Raised when a wallet change would make the balance negative.
+    """
+
+class DebitNotFound(LookupError):
+    """
+    Raised when a refund names a ledger entry that is not a debit of the customer.
+    """
+
+def apply_wallet_change(amount, customer_id=None, username=None, reason="adjustment", reference=None):
+    """
+    Atomically adds a signed amount to a customer's wallet and records it in the ledger.
+
+    The balance is changed by a single conditional statement:
+
+        UPDATE customers SET wallet_balance = wallet_balance + :amount
+        WHERE id = :id AND wallet_balance + :amount >= 0
+        RETURNING id, username, wallet_balance
+
+    so concurrent changes can neither lose updates nor overdraw the wallet, and no SELECT is needed
+    beforehand. The ledger entry (and a snapshot when one is due) is written in the same transaction.
+
+    Args:
+        amount (float): The signed change; negative amounts debit the wallet.
+        customer_id (int, optional): The customer's id. Either this or `username` is required.
+        username (str, optional): The customer's username.
+        reason (str): Why the wallet changed, stored in the ledger.
+        reference (str, optional): A caller reference stored in the ledger, such as a sale id.
+
+    Returns:
+        WalletChange: The customer's `id`, `username` and new `wallet_balance`, and the `ledger_id` of the entry.
+
+    Raises:
+        CustomerNotFound: If no customer matches.
+        InsufficientFunds: If the change would make the balance negative.
+    """
+    if customer_id is not None:
+        match = customers_table.c.id == customer_id
+    else:
+        match = customers_table.c.username == username
+
+    new_balance = db.func.coalesce(customers_table.c.wallet_balance, 0.0) + amount
+    stmt = (
+        db.update(customers_table)
+        .where(match, new_balance >= 0)
+        .values(wallet_balance=new_balance)
+        .returning(customers_table.c.id, customers_table.c.username, customers_table.c.wallet_balance)
+    )
+    customer = db.session.execute(stmt).first()
+    if customer is None:
+        db.session.rollback()
+        # Only failed changes pay for a second query, to tell the two errors apart
+        if db.session.execute(db.select(customers_table.c.id).where(match)).first() is None:
+            raise CustomerNotFound("Customer not found")
+        raise InsufficientFunds("Insufficient wallet balance")
+
+    result = db.session.execute(db.insert(ledger_table).values(
+        customer_id=customer.id,
+        amount=amount,
+        reason=reason,
+        reference=reference
+    ))
+    ledger_id = result.inserted_primary_key[0]
+    if snapshot_due(customer.id):
+        db.session.execute(db.insert(snapshots_table).values(
+            customer_id=customer.id,
+            ledger_id=ledger_id,
+            balance=customer.wallet_balance
+        ))
+    db.session.commit()
+    customer_lookup_cache.invalidate(customer.username)
+    generations.bump("customers", f"wallet:{customer.id}")
+    return WalletChange(customer.id, customer.username, customer.wallet_balance, ledger_id)
+
+def refund_debit(customer_id, ledger_id, debit_key=None):
+    """
+    Gives back the amount of one wallet debit, at most once.
+
+    The refund is written to the ledger with the reference `refund:<ledger_id>`. If that entry already
+    exists the debit was refunded before and the wallet is left unchanged, so a caller whose refund
+    timed out can safely send it again. A unique index on the references of refunds enforces this
+    in the database: of two concurrent refunds of one debit, the second fails to insert its entry,
+    is rolled back and returns the first.
+
+    When the debit was made with an `Idempotency-Key`, pass it as `debit_key`: it is released in the
+    refund's transaction. Otherwise a retry of the debit with the same key would replay the stored
+    success without debiting, although the money was given back.
+
+    Args:
+        customer_id (int): The customer's id.
+        ledger_id (int): The ledger entry of the debit, as returned by the debit.
+        debit_key (str, optional): The `Idempotency-Key` the debit was made with.
+
+    Returns:
+        tuple: The `WalletChange` of the refund (of the earlier refund if there was one), and whether
+        this call refunded the debit.
+
+    Raises:
+        DebitNotFound: If the entry does not exist, is not a debit or belongs to another customer.
+    """
+    debit = db.session.execute(
+        db.select(ledger_table.c.amount, customers_table.c.username, customers_table.c.wallet_balance)
+        .join(customers_table, customers_table.c.id == ledger_table.c.customer_id)
+        .where(ledger_table.c.id == ledger_id, ledger_table.c.customer_id == customer_id, ledger_table.c.amount < 0)
+    ).first()
+    if debit is None:
+        raise DebitNotFound("Debit not found")
+    if debit_key:
+        idempotency_store.discard(debit_key, DEBIT_SCOPE.format(username=debit.username))
+
+    reference = f"refund:{ledger_id}"
+    refund = find_refund(reference)
+    if refund is None:
+        try:
+            return apply_wallet_change(-debit.amount, customer_id=customer_id, reason="refund", reference=reference), True
+        except IntegrityError:
+            # A concurrent refund of the same debit committed first
+            db.session.rollback()
+            refund = find_refund(reference)
+            if refund is None:
+                raise
+    db.session.commit()
+    return WalletChange(customer_id, refund.username, refund.wallet_balance, refund.id), False
+
+def find_refund(reference):
+    """
+    Returns the refund entry with a reference, read from its unique index, with the customer's
+    username and current balance, or None.
+    """
+    return db.session.execute(
+        db.select(ledger_table.c.id, customers_table.c.username, customers_table.c.wallet_balance)
+        .join(customers_table, customers_table.c.id == ledger_table.c.customer_id)
+        .where(ledger_table.c.reason == "refund", ledger_table.c.reference == reference)
+    ).first()
+
+def latest_snapshot(customer_id, max_ledger_id=None):
+    """
+    Returns the most recent snapshot of a customer, optionally only those taken at or before a ledger entry.
+    """
+    stmt = db.select(snapshots_table).where(snapshots_table.c.customer_id == customer_id)
+    if max_ledger_id is not None:
+        stmt = stmt.where(snapshots_table.c.ledger_id <= max_ledger_id)
+    return db.session.execute(stmt.order_by(snapshots_table.c.ledger_id.desc()).limit(1)).first()
+
+def snapshot_due(customer_id):
+    """
+    Tells whether a snapshot should be written after the customer's newest ledger entry.
+
+    A snapshot is due for a customer's first entry and then once `WALLET_SNAPSHOT_INTERVAL`
+    entries have been written since the last one.
+    """
+    snapshot = latest_snapshot(customer_id)
+    if snapshot is None:
+        return True
+    entries_since = db.session.execute(
+        db.select(db.func.count())
+        .select_from(ledger_table)
+        .where(ledger_table.c.customer_id == customer_id, ledger_table.c.id > snapshot.ledger_id)
+    ).scalar()
+    return entries_since >= WALLET_SNAPSHOT_INTERVAL
+
+def balance_after(customer_id, ledger_id):
+    """
+    Returns the wallet balance right after a ledger entry.
+
+    The balance is read from the nearest earlier snapshot plus the entries written since it,
+    so at most `WALLET_SNAPSHOT_INTERVAL` ledger rows are summed.
+
+    Args:
+        customer_id (int): The customer's id.
+        ledger_id (int): The id of one of the customer's ledger entries.
+
+    Returns:
+        float: The balance after that entry, or None if the customer has no snapshot yet.
+    """
+    snapshot = latest_snapshot(customer_id, ledger_id)
+    if snapshot is None:
+        return None
+    delta = db.session.execute(
+        db.select(db.func.coalesce(db.func.sum(ledger_table.c.amount), 0.0))
+        .where(
+            ledger_table.c.customer_id == customer_id,
+            ledger_table.c.id > snapshot.ledger_id,
+            ledger_table.c.id <= ledger_id
+        )
+    ).scalar()
+    return snapshot.balance + delta
+
+def wallet_history(customer_id, limit, cursor=None):
+    """
+    Reads a page of a customer's wallet history, newest first.
+
+    Args:
+        customer_id (int): The customer's id.
+        limit (int): The page size.
+        cursor (int, optional): The `next_cursor` of the previous page.
+
+    Returns:
+        tuple: The entries (each with the balance after it) and the cursor of the next page, or None on the last page.
+    """
+    stmt = db.select(ledger_table).where(ledger_table.c.customer_id == customer_id)
+    if cursor is not None:
+        stmt = stmt.where(ledger_table.c.id < cursor)
+    rows = db.session.execute(stmt.order_by(ledger_table.c.id.desc()).limit(limit + 1)).all()
+    next_cursor = rows[limit - 1].id if len(rows) > limit else None
+    rows = rows[:limit]
+
+    entries = []
+    balance = balance_after(customer_id, rows[0].id) if rows else None
+    for row in rows:
+        entries.append({
+            "id": row.id,
+            "amount": row.amount,
+            "reason": row.reason,
+            "reference": row.reference,
+            "created_at": row.created_at.strftime("%Y-%m-%d %H:%M:%S"),
+            "balance_after": balance
+        })
+        if balance is not None:
+            balance -= row.amount
+    return entries, next_cursor
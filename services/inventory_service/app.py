@@ -1,18 +1,27 @@
+import os
 from flask import Flask, jsonify
-from database import db
+from database import db, create_missing_indexes
 from routes import api
 from extensions import limiter  # Import limiter from extensions.py
 from pybreaker import CircuitBreaker
+from reservations import reservation_sweeper
+from catalog_cache import catalog_cache
+from etag import generations
+import goods_search
 
 # Flask App Initialization
 app = Flask(__name__)
 
 # Configuration
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///inventory.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('INVENTORY_DATABASE_URI', 'sqlite:///inventory.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['CIRCUIT_BREAKER_FAIL_MAX'] = 5
 app.config['CIRCUIT_BREAKER_RESET_TIMEOUT'] = 60
 app.config['RATE_LIMITS'] = ["200 per day", "50 per hour"]
+app.config['RATELIMIT_ENABLED'] = os.getenv('RATELIMIT_ENABLED', 'true').lower() == 'true'
+app.config['RESERVATION_TTL'] = 300  # Default seconds a stock reservation is held
+app.config['RESERVATION_MAX_TTL'] = 3600
+app.config['RESERVATION_SWEEP_INTERVAL'] = 30  # Seconds between sweeps of expired reservations
 
 # Circuit Breaker Configuration
 circuit_breaker = CircuitBreaker(
@@ -24,6 +33,12 @@ circuit_breaker = CircuitBreaker(
 limiter.init_app(app)  # Initialize limiter
 db.init_app(app)
 api.init_app(app)
+reservation_sweeper.init_app(app)
+create_missing_indexes(app)  # Indexes added to the models since inventory.db was created
+goods_search.init_app(app)  # Create the search index on databases that predate it
+
+# GET /goods revalidates against the catalog version, which is shared between workers when REDIS_URL is set
+generations.track("goods", catalog_cache.current_version)
 
 @app.errorhandler(429)
 def ratelimit_exceeded(e):
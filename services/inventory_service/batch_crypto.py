@@ -0,0 +1,145 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from cryptography.fernet import Fernet, MultiFernet
+
+# Executor kinds used for large batches
+THREAD = "thread"
+PROCESS = "process"
+
+def _build_fernet(keys):
+    return MultiFernet([Fernet(key) for key in keys])
+
+def _decrypt_chunk(keys, tokens):
+    """
+    Decrypts a chunk of tokens. Defined at module level so it can run in a worker process.
+    """
+    fernet = _build_fernet(keys)
+    return [fernet.decrypt(token.encode()).decode() for token in tokens]
+
+def _encrypt_chunk(keys, values):
+    """
+    Encrypts a chunk of values with the primary key. Defined at module level so it can run in a worker process.
+    """
+    fernet = _build_fernet(keys)
+    return [fernet.encrypt(value.encode()).decode() for value in values]
+
+class BatchCrypto:
+    """
+    Encrypts and decrypts whole lists of Fernet values at once for the list endpoints.
+
+    Batches smaller than `threshold` are processed inline. Larger batches are split into one chunk
+    per worker and spread across a thread pool or, with `executor="process"`, a process pool, which
+    sidesteps the GIL so that a large listing uses every core. `None` values are passed through.
+
+    Throughput is recorded for every batch and reported by `stats()`.
+
+    Args:
+        threshold (int): The smallest batch that is spread across the pool.
+        workers (int, optional): Pool size. Defaults to the number of CPUs.
+        executor (str): "thread" or "process".
+    """
+
+    def __init__(self, threshold=256, workers=None, executor=THREAD):
+        if executor not in (THREAD, PROCESS):
+            raise ValueError(f"Unsupported executor: {executor}")
+        self.threshold = threshold
+        self.workers = workers or os.cpu_count() or 1
+        self.executor = executor
+        self._pool = None
+        self._lock = threading.Lock()
+        self._stats = {"batches": 0, "parallel_batches": 0, "rows": 0, "seconds": 0.0}
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                pool_class = ProcessPoolExecutor if self.executor == PROCESS else ThreadPoolExecutor
+                self._pool = pool_class(max_workers=self.workers)
+            return self._pool
+
+    def _run(self, function, keys, values):
+        started = time.perf_counter()
+        positions = [index for index, value in enumerate(values) if value is not None]
+        present = [values[index] for index in positions]
+
+        parallel = len(present) >= self.threshold and self.workers > 1
+        if parallel:
+            chunk_size = -(-len(present) // self.workers)
+            chunks = [present[start:start + chunk_size] for start in range(0, len(present), chunk_size)]
+            results = []
+            for chunk_result in self._get_pool().map(function, [keys] * len(chunks), chunks):
+                results.extend(chunk_result)
+        else:
+            results = function(keys, present) if present else []
+
+        output = list(values)
+        for index, result in zip(positions, results):
+            output[index] = result
+
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self._stats["batches"] += 1
+            self._stats["parallel_batches"] += int(parallel)
+            self._stats["rows"] += len(present)
+            self._stats["seconds"] += elapsed
+        logging.debug(f"Processed {len(present)} values in {elapsed:.4f}s (parallel={parallel})")
+        return output
+
+    def decrypt_many(self, tokens, keys):
+        """
+        Decrypts a list of Fernet tokens.
+
+        Args:
+            tokens (list): Encrypted strings; `None` entries are returned as `None`.
+            keys (list): The active keys, primary first.
+
+        Returns:
+            list: The decrypted strings, in the same order as `tokens`.
+        """
+        return self._run(_decrypt_chunk, keys, tokens)
+
+    def encrypt_many(self, values, keys):
+        """
+        Encrypts a list of strings with the primary key.
+
+        Args:
+            values (list): Plain text strings; `None` entries are returned as `None`.
+            keys (list): The active keys, primary first.
+
+        Returns:
+            list: The encrypted strings, in the same order as `values`.
+        """
+        return self._run(_encrypt_chunk, keys, values)
+
+    def stats(self):
+        """
+        Returns throughput counters.
+
+        Returns:
+            dict: Batches processed, how many ran in parallel, total rows, total seconds and rows per second.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+        stats["rows_per_second"] = stats["rows"] / stats["seconds"] if stats["seconds"] else 0.0
+        return stats
+
+def create_batch_crypto():
+    """
+    Builds a `BatchCrypto` configured from environment variables.
+
+    Environment variables:
+        CRYPTO_PARALLEL_THRESHOLD (int): Smallest batch spread across the pool (default 256).
+        CRYPTO_WORKERS (int): Pool size (default: number of CPUs).
+        CRYPTO_EXECUTOR (str): "thread" or "process" (default "thread").
+
+    Returns:
+        BatchCrypto: The configured helper.
+    """
+    workers = os.getenv("CRYPTO_WORKERS")
+    return BatchCrypto(
+        threshold=int(os.getenv("CRYPTO_PARALLEL_THRESHOLD", 256)),
+        workers=int(workers) if workers else None,
+        executor=os.getenv("CRYPTO_EXECUTOR", THREAD)
+    )
@@ -0,0 +1,188 @@
+import json
+import logging
+import os
+import threading
+
+class CatalogCache:
+    """
+    In-process snapshot of the goods catalog, held as the serialized JSON body of `GET /goods`.
+
+    Every snapshot is tagged with a version. Writers bump the version after their commit
+    (`invalidate`), or, when they know the exact new values, rewrite the snapshot in place
+    (`patch_stock`) so the next read does not go back to the database. A reader that loads
+    the catalog takes the version *before* querying and stores the body under that version,
+    so a body built from rows read before a concurrent write is never served as current.
+
+    With a Redis-compatible client the version counter and the latest body are shared, which keeps
+    several workers consistent: each read checks the shared version (one `GET`) and serves the local
+    bytes only if they carry that version, otherwise it takes the shared body or reloads. Without
+    a client the cache is local to the process.
+
+    Args:
+        redis_client (object, optional): A client with `get`, `set` and `incr`, e.g. `redis.Redis`.
+        key_prefix (str): Prefix of the shared keys.
+        ttl (int): Seconds a shared body is kept.
+    """
+
+    def __init__(self, redis_client=None, key_prefix="inventory:catalog", ttl=300):
+        self.redis = redis_client
+        self.version_key = f"{key_prefix}:version"
+        self.body_key = f"{key_prefix}:body"
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._version = 0
+        self._snapshot = None  # (version, goods, body)
+        self._lock = threading.Lock()
+
+    def current_version(self):
+        """
+        Returns the current catalog version, or None if the shared tier cannot be reached.
+        """
+        if self.redis is None:
+            return self._version
+        try:
+            return int(self.redis.get(self.version_key) or 0)
+        except Exception as e:
+            logging.warning(f"Catalog cache: shared tier unavailable: {e}")
+            return None
+
+    def get(self):
+        """
+        Returns `(version, body)` for the current catalog, or `(version, None)` on a miss.
+
+        On a miss the caller loads the catalog and stores it with `put(version, goods)`.
+        """
+        version = self.current_version()
+        if version is None:
+            return None, None
+        with self._lock:
+            if self._snapshot is not None and self._snapshot[0] == version:
+                self.hits += 1
+                return version, self._snapshot[2]
+
+        if self.redis is not None:
+            try:
+                body = self.redis.get(f"{self.body_key}:{version}")
+            except Exception as e:
+                logging.warning(f"Catalog cache: shared tier unavailable: {e}")
+                body = None
+            if body is not None:
+                with self._lock:
+                    self._snapshot = (version, json.loads(body), body)
+                    self.hits += 1
+                return version, body
+
+        with self._lock:
+            self.misses += 1
+        return version, None
+
+    def put(self, version, goods):
+        """
+        Serializes the goods loaded for `version` and stores them. A None version (shared tier
+        unreachable) is serialized but not stored.
+
+        Returns:
+            bytes: The serialized body.
+        """
+        body = json.dumps(goods, separators=(",", ":")).encode()
+        if version is None:
+            return body
+        with self._lock:
+            if self._snapshot is None or self._snapshot[0] <= version:
+                self._snapshot = (version, goods, body)
+        if self.redis is not None:
+            try:
+                self.redis.set(f"{self.body_key}:{version}", body, ex=self.ttl)
+            except Exception as e:
+                logging.warning(f"Catalog cache: failed to share the catalog: {e}")
+        return body
+
+    def _bump(self):
+        """
+        Increments the version and returns `(previous, new)`; previous is None if it is unknown.
+        """
+        if self.redis is None:
+            with self._lock:
+                self._version += 1
+                return self._version - 1, self._version
+        try:
+            new = int(self.redis.incr(self.version_key))
+            return new - 1, new
+        except Exception as e:
+            logging.warning(f"Catalog cache: failed to bump the shared version: {e}")
+            with self._lock:
+                self._snapshot = None
+            return None, None
+
+    def invalidate(self):
+        """
+        Marks the current snapshot as stale. Call it after committing a catalog write.
+        """
+        self._bump()
+
+    def patch_stock(self, new_stock):
+        """
+        Applies the stock counts committed by a deduction to the snapshot instead of dropping it.
+
+        The snapshot is rewritten only if it was the latest version right before this write; if
+        another write happened in between, the catalog is just invalidated. Concurrent deductions can
+        patch in a different order than they committed, so a patch that would raise a good's stock
+        above the snapshot's is older than the snapshot: it is dropped and the catalog invalidated.
+
+        Args:
+            new_stock (dict): The new stock count of each changed good, keyed by good id. Only
+                deductions may be patched in; any other stock change must `invalidate`.
+        """
+        with self._lock:
+            snapshot = self._snapshot
+        previous, version = self._bump()
+        if snapshot is None or previous is None or snapshot[0] != previous:
+            return
+        if any(good["id"] in new_stock and new_stock[good["id"]] > good["stock_count"] for good in snapshot[1]):
+            return
+        goods = [
+            dict(good, stock_count=new_stock[good["id"]]) if good["id"] in new_stock else good
+            for good in snapshot[1]
+        ]
+        self.put(version, goods)
+
+    def clear(self):
+        """
+        Drops the local snapshot.
+        """
+        with self._lock:
+            self._snapshot = None
+
+    def stats(self):
+        """
+        Returns the hit and miss counters and the version of the local snapshot.
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "version": self._snapshot[0] if self._snapshot else None,
+                "shared": self.redis is not None
+            }
+
+def create_catalog_cache():
+    """
+    Creates the catalog cache, sharing it through Redis when `REDIS_URL` is set.
+
+    The `redis` package is only imported when it is needed. If it is missing, the cache stays
+    local to the process.
+    """
+    ttl = int(os.getenv("CATALOG_CACHE_TTL", 300))
+    redis_url = os.getenv("REDIS_URL")
+    if not redis_url:
+        return CatalogCache(ttl=ttl)
+    try:
+        import redis
+    except ImportError:
+        logging.warning("REDIS_URL is set but the redis package is not installed; the catalog cache is local to this process")
+        return CatalogCache(ttl=ttl)
+    return CatalogCache(redis.Redis.from_url(redis_url, socket_timeout=0.5), ttl=ttl)
+
+# Shared catalog cache, invalidated or patched by every catalog write
+catalog_cache = create_catalog_cache()
@@ -0,0 +1,111 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+# Rough per-entry bookkeeping overhead (dict slot, tuple, string headers) counted against the byte limit
+ENTRY_OVERHEAD = 200
+
+class DecryptCache:
+    """
+    Size-bounded LRU cache of decrypted values, keyed by ciphertext.
+
+    Fernet tokens are unique per encryption, so a ciphertext always maps to the same plain text for
+    a given key. The cache is bound to a key fingerprint with `bind_key`, and a call with a different
+    key clears it, so values decrypted with a rotated-out key are never served. The services load their
+    key once at import and bind it there; a service that reloads its key must call `bind_key` again.
+
+    Args:
+        max_entries (int): The maximum number of cached values.
+        max_bytes (int): The approximate maximum memory used by cached tokens and values.
+        ttl (float, optional): Seconds after which an entry expires, or None to keep entries until evicted.
+    """
+
+    def __init__(self, max_entries=10000, max_bytes=16 * 1024 * 1024, ttl=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._key_fingerprint = None
+        self._lock = threading.Lock()
+
+    def bind_key(self, key):
+        """
+        Binds the cache to the active key, clearing it if the key changed since the last call.
+
+        Args:
+            key (str or bytes): The active encryption key.
+        """
+        raw = key.encode() if isinstance(key, str) else key
+        fingerprint = hashlib.sha256(raw).hexdigest()
+        if fingerprint != self._key_fingerprint:
+            with self._lock:
+                self._clear_locked()
+                self._key_fingerprint = fingerprint
+
+    def get(self, token):
+        """
+        Returns the cached plain text for a token, or None on a miss.
+        """
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is not None and self.ttl is not None and time.monotonic() - entry[1] > self.ttl:
+                self._remove_locked(token)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(token)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, token, value):
+        """
+        Caches the plain text of a token, evicting least recently used entries beyond the limits.
+        """
+        size = len(token) + len(value) + ENTRY_OVERHEAD
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if token in self._entries:
+                self._remove_locked(token)
+            self._entries[token] = (value, time.monotonic())
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove_locked(oldest)
+                self.evictions += 1
+
+    def clear(self):
+        """
+        Drops every cached value.
+        """
+        with self._lock:
+            self._clear_locked()
+
+    def stats(self):
+        """
+        Returns the hit and miss counters and the current size of the cache.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes
+            }
+
+    def _remove_locked(self, token):
+        value, _ = self._entries.pop(token)
+        self._bytes -= len(token) + len(value) + ENTRY_OVERHEAD
+
+    def _clear_locked(self):
+        self._entries.clear()
+        self._bytes = 0
@@ -0,0 +1,155 @@
+import base64
+import json
+from database import db
+from models import Good
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# Query parameters that switch GET /goods from the cached full catalog to a filtered page
+FILTER_PARAMS = ("category", "min_price", "max_price", "in_stock", "name_prefix", "sort", "limit", "cursor")
+
+# Supported sort orders: the column and whether it is descending. `id` breaks ties so the keyset is unique.
+SORT_ORDERS = {
+    "id": (None, False),
+    "price": ("price", False),
+    "-price": ("price", True),
+    "name": ("name", False),
+    "-name": ("name", True),
+}
+
+# Type of the keyset value of each sort column; a cursor holds one per sort key, then the good id
+CURSOR_TYPES = {
+    "price": (int, float),
+    "name": str,
+}
+
+goods_table = Good.__table__
+
+def wants_filtering(args):
+    """
+    Tells whether a GET /goods request uses any filter, sort or pagination parameter.
+    """
+    return any(param in args for param in FILTER_PARAMS)
+
+def parse_filters(args):
+    """
+    Validates the filter, sort and pagination parameters of GET /goods.
+
+    Args:
+        args (MultiDict): The request query parameters.
+
+    Returns:
+        dict: The parsed parameters.
+
+    Raises:
+        ValueError: If a parameter is invalid.
+    """
+    try:
+        min_price = float(args['min_price']) if 'min_price' in args else None
+        max_price = float(args['max_price']) if 'max_price' in args else None
+        limit = int(args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise ValueError("min_price and max_price must be numbers and limit an integer")
+    if limit < 1:
+        raise ValueError("limit must be greater than zero")
+    sort = args.get('sort', 'id')
+    if sort not in SORT_ORDERS:
+        raise ValueError(f"sort must be one of: {', '.join(SORT_ORDERS)}")
+    in_stock = args.get('in_stock', '').lower()
+    if in_stock not in ('', 'true', 'false'):
+        raise ValueError("in_stock must be true or false")
+
+    return {
+        "category": args.get('category') or None,
+        "min_price": min_price,
+        "max_price": max_price,
+        "in_stock": in_stock == 'true',
+        "name_prefix": args.get('name_prefix') or None,
+        "sort": sort,
+        "limit": min(limit, MAX_PAGE_SIZE),
+        "cursor": decode_cursor(args['cursor'], sort) if args.get('cursor') else None,
+    }
+
+def encode_cursor(row, sort):
+    """
+    Encodes the keyset position after `row` as an opaque URL-safe string.
+    """
+    column, _ = SORT_ORDERS[sort]
+    position = [getattr(row, column), row.id] if column else [row.id]
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+def decode_cursor(cursor, sort):
+    """
+    Decodes a cursor made by `encode_cursor` for the same sort order.
+
+    Raises:
+        ValueError: If the cursor is malformed or was made for another sort order.
+    """
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(position, list) or not position:
+        raise ValueError("Invalid cursor")
+    column, _ = SORT_ORDERS[sort]
+    types = ([CURSOR_TYPES[column]] if column else []) + [int]
+    if len(position) != len(types):
+        raise ValueError("Cursor does not match the sort order")
+    if any(isinstance(value, bool) or not isinstance(value, value_type) for value, value_type in zip(position, types)):
+        raise ValueError("Invalid cursor")
+    return position
+
+def prefix_upper_bound(prefix):
+    """
+    Returns the smallest string greater than every string starting with `prefix`.
+
+    `name >= prefix AND name < bound` matches the same rows as `name LIKE 'prefix%'` (case-sensitively)
+    but, unlike LIKE, can use the index on `name`.
+    """
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+def build_goods_query(filters):
+    """
+    Builds the keyset-paginated SELECT for a page of goods.
+
+    Every filter is a sargable comparison, so the indexes of the goods table can serve it: `category`
+    for a category in id order, `(category, price)` for a category with a price range or price sort,
+    `(category, name)` for a category with a name prefix or name sort, and `price` / `name` when no
+    category is given.
+    `in_stock` is applied to the rows the index selects; stock changes on every sale, so it is not indexed.
+
+    Args:
+        filters (dict): Parameters returned by `parse_filters`.
+
+    Returns:
+        Select: The query, fetching one row more than the page size to detect the last page.
+    """
+    c = goods_table.c
+    conditions = []
+    if filters["category"] is not None:
+        conditions.append(c.category == filters["category"])
+    if filters["min_price"] is not None:
+        conditions.append(c.price >= filters["min_price"])
+    if filters["max_price"] is not None:
+        conditions.append(c.price <= filters["max_price"])
+    if filters["name_prefix"] is not None:
+        conditions.append(c.name >= filters["name_prefix"])
+        conditions.append(c.name < prefix_upper_bound(filters["name_prefix"]))
+    if filters["in_stock"]:
+        conditions.append(c.stock_count > 0)
+
+    column_name, descending = SORT_ORDERS[filters["sort"]]
+    keys = ([c[column_name]] if column_name else []) + [c.id]
+    cursor = filters["cursor"]
+    if cursor is not None:
+        position = db.tuple_(*keys)
+        conditions.append(position < db.tuple_(*cursor) if descending else position > db.tuple_(*cursor))
+
+    order = [key.desc() if descending else key for key in keys]
+    return (
+        db.select(c.id, c.name, c.category, c.price, c.description, c.stock_count)
+        .where(*conditions)
+        .order_by(*order)
+        .limit(filters["limit"] + 1)
+    )
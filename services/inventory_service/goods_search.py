@@ -0,0 +1,135 @@
+import logging
+import re
+from sqlalchemy import DDL, event
+from database import db
+from models import Good
+from utils import decrypt_many
+
+SEARCH_PAGE_SIZE = 20
+MAX_SEARCH_PAGE_SIZE = 100
+
+# Largest offset a search page can start at; deeper pages should refine the query instead
+MAX_SEARCH_OFFSET = 1000
+
+# Goods decrypted and indexed per batch by `rebuild_search_index`
+REBUILD_BATCH_SIZE = 500
+
+# bm25 weights of the name, category and description columns: a match in the name ranks highest
+COLUMN_WEIGHTS = (10.0, 5.0, 1.0)
+
+# Contentless FTS5 table: it stores the token index but not the text, so plaintext descriptions
+# are never kept at rest next to their encrypted copy. The rowid is the good id.
+create_search_table = DDL(
+    "CREATE VIRTUAL TABLE IF NOT EXISTS goods_fts USING fts5("
+    "name, category, description, content='', tokenize='unicode61 remove_diacritics 2')"
+)
+event.listen(Good.__table__, "after_create", create_search_table.execute_if(dialect="sqlite"))
+
+def index_good(good_id, name, category, description):
+    """
+    Adds a good to the search index in the current transaction. `description` is the plaintext.
+    """
+    db.session.execute(
+        db.text("INSERT INTO goods_fts(rowid, name, category, description) VALUES (:id, :name, :category, :description)"),
+        {"id": good_id, "name": name, "category": category, "description": description or ""}
+    )
+
+def unindex_good(good_id, name, category, description):
+    """
+    Removes a good from the search index in the current transaction.
+
+    A contentless table does not know the text it indexed, so the values that were indexed
+    (with the plaintext description) must be passed back exactly.
+    """
+    db.session.execute(
+        db.text("INSERT INTO goods_fts(goods_fts, rowid, name, category, description) "
+                "VALUES ('delete', :id, :name, :category, :description)"),
+        {"id": good_id, "name": name, "category": category, "description": description or ""}
+    )
+
+def to_match_query(text):
+    """
+    Turns free text into an FTS5 query matching every word, the last one as a prefix.
+
+    Words are quoted, so FTS5 operators and punctuation in the input are never interpreted.
+
+    Returns:
+        str: The MATCH expression, or None if the text has no words.
+    """
+    words = re.findall(r"\w+", text)
+    if not words:
+        return None
+    return " ".join(f'"{word}"' for word in words[:-1]) + (" " if len(words) > 1 else "") + f'"{words[-1]}"*'
+
+def search_goods(text, limit=SEARCH_PAGE_SIZE, offset=0):
+    """
+    Searches goods by name, category and description, best matches first.
+
+    Only the ids of one page are read from the index; the goods are then loaded by primary key,
+    so search never touches the rest of the catalog.
+
+    Args:
+        text (str): The search text.
+        limit (int): Page size.
+        offset (int): Number of results to skip.
+
+    Returns:
+        tuple: The matching `Good` rows of the page in rank order, and whether more results follow.
+    """
+    query = to_match_query(text)
+    if query is None:
+        return [], False
+    ids = db.session.execute(
+        db.text("SELECT rowid FROM goods_fts WHERE goods_fts MATCH :query "
+                "ORDER BY bm25(goods_fts, :w_name, :w_category, :w_description) LIMIT :limit OFFSET :offset"),
+        {"query": query, "w_name": COLUMN_WEIGHTS[0], "w_category": COLUMN_WEIGHTS[1], "w_description": COLUMN_WEIGHTS[2],
+         "limit": limit + 1, "offset": offset}
+    ).scalars().all()
+    more = len(ids) > limit
+    ids = ids[:limit]
+    goods = {good.id: good for good in Good.query.filter(Good.id.in_(ids))}
+    return [goods[good_id] for good_id in ids if good_id in goods], more
+
+def rebuild_search_index():
+    """
+    Rebuilds the search index from the goods table, decrypting descriptions in batches.
+
+    Returns:
+        int: The number of indexed goods.
+    """
+    db.session.connection().execute(create_search_table)
+    db.session.execute(db.text("INSERT INTO goods_fts(goods_fts) VALUES ('delete-all')"))
+    indexed = 0
+    last_id = 0
+    while True:
+        goods = Good.query.filter(Good.id > last_id).order_by(Good.id).limit(REBUILD_BATCH_SIZE).all()
+        if not goods:
+            break
+        descriptions = decrypt_many([good.description or None for good in goods])
+        for good, description in zip(goods, descriptions):
+            index_good(good.id, good.name, good.category, description)
+        indexed += len(goods)
+        last_id = goods[-1].id
+    db.session.commit()
+    return indexed
+
+def init_app(app):
+    """
+    Creates the search index on a database whose goods table predates it, and fills it from the goods.
+
+    A new database gets the index from `db.create_all()`; an existing one would otherwise fail every
+    write to the catalog. If the goods cannot be indexed (e.g. their descriptions do not decrypt with
+    the configured key), the index is created empty and `rebuild_search_index.py` must be run.
+    """
+    with app.app_context():
+        tables = set(db.inspect(db.engine).get_table_names())
+        if Good.__tablename__ not in tables or "goods_fts" in tables:
+            return
+        try:
+            indexed = rebuild_search_index()
+            logging.info(f"Created the search index with {indexed} goods")
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f"Failed to index the existing goods, run rebuild_search_index.py: {e}")
+            with db.engine.begin() as connection:
+                connection.execute(create_search_table)
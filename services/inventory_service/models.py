@@ -1,6 +1,13 @@
 from database import db
 
 class Good(db.Model):
+    __table_args__ = (
+        db.Index('ix_goods_category', 'category'),
+        db.Index('ix_goods_category_price', 'category', 'price'),
+        db.Index('ix_goods_category_name', 'category', 'name'),
+        db.Index('ix_goods_price', 'price'),
+        db.Index('ix_goods_name', 'name'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(255), nullable=False)
     category = db.Column(db.String(255), nullable=False)
@@ -8,6 +15,20 @@ class Good(db.Model):
     description = db.Column(db.Text, nullable=True)
     stock_count = db.Column(db.Integer, nullable=False)
 
+
+class Reservation(db.Model):
+    __tablename__ = 'reservations'
+    __table_args__ = (
+        db.Index('ix_reservations_status_expires_at', 'status', 'expires_at'),
+    )
+    id = db.Column(db.String(32), primary_key=True)
+    good_id = db.Column(db.Integer, nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    status = db.Column(db.String(20), nullable=False)
+    reference = db.Column(db.String(120), nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
 """
 The `Good` class represents a product in the system and is used to interact with the `goods` table in the database.
 
@@ -19,6 +40,12 @@ Attributes:
 - `description` (str): A description of the product (optional).
 - `stock_count` (int): The number of items available in stock (required).
 
+Indexes:
+- `category` backs the category filter in the default `id` order (SQLite keys it as `(category, id)`).
+- `(category, price)` and `(category, name)` back the category filter of `GET /goods` combined with a price range,
+  a name prefix, or a sort on either column.
+- `price` and `name` back the same filters and sorts across all categories.
+
 Methods:
 - As a model for SQLAlchemy, the `Good` class inherits from `db.Model`, which provides all the necessary CRUD operations (Create, Read, Update, Delete) for interacting with the `goods` table in the database.
 
@@ -33,3 +60,19 @@ Example:
 
 The `Good` model is used for managing product information, such as pricing, description, and inventory tracking.
 """
+
+"""
+The `Reservation` class represents a temporary hold on stock during checkout, stored in the `reservations` table.
+
+Reserving units removes them from `Good.stock_count` right away, so other buyers cannot take them. The hold is then
+confirmed (the units are sold), released (the units go back to stock), or expires and is reclaimed by the sweeper.
+
+Attributes:
+- `id` (str): The random identifier of the reservation (Primary Key).
+- `good_id` (int): The reserved good.
+- `quantity` (int): The number of reserved units.
+- `status` (str): "held", "confirmed", "released" or "expired".
+- `reference` (str): An optional caller reference, such as an order id.
+- `created_at` (datetime): When the units were reserved.
+- `expires_at` (datetime): When an unconfirmed hold is reclaimed.
+"""
@@ -0,0 +1,22 @@
+from app import app
+from goods_search import rebuild_search_index
+
+def main():
+    with app.app_context():
+        indexed = rebuild_search_index()
+    print(f"Indexed {indexed} goods")
+
+if __name__ == "__main__":
+    main()
+
+"""
+Rebuilds the full-text search index (`goods_fts`) from the goods table.
+
+The service creates and fills the index itself when it starts on a database that predates it. Run this
+if that failed (see the log), and whenever the index is suspected to be out of sync (e.g. after editing
+goods directly in the database).
+Descriptions are decrypted in batches, so the configured `ENCRYPTION_KEY` must be the one the goods were stored with.
+
+Usage:
+    python rebuild_search_index.py
+"""
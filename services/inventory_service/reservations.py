@@ -0,0 +1,196 @@
+import logging
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from database import db
+from models import Reservation
+from catalog_cache import catalog_cache
+from stock import conditional_deduct, deduction_failure, restock
+
+# Reservation states
+HELD = "held"
+CONFIRMED = "confirmed"
+RELEASED = "released"
+EXPIRED = "expired"
+
+# Largest number of expired holds reclaimed per sweeper transaction
+SWEEP_BATCH_SIZE = 500
+
+reservations_table = Reservation.__table__
+
+class ReservationNotFound(LookupError):
+    """
+    Raised when a reservation id does not exist.
+    """
+
+class ReservationNotHeld(ValueError):
+    """
+    Raised when a reservation can no longer be confirmed or released because it is not held anymore.
+
+    Attributes:
+        status (str): The current status of the reservation.
+    """
+
+    def __init__(self, status):
+        super().__init__(f"Reservation is {status}")
+        self.status = status
+
+def reserve(good_id, quantity, ttl, reference=None):
+    """
+    Holds units of a good for `ttl` seconds.
+
+    The units are taken from the stock with the same conditional UPDATE as a deduction, and the
+    reservation row is written in the same transaction.
+
+    Args:
+        good_id (int): The id of the good.
+        quantity (int): The positive number of units to hold.
+        ttl (int): Seconds before an unconfirmed hold is reclaimed.
+        reference (str, optional): A caller reference, such as an order id.
+
+    Returns:
+        dict: The reservation id, the good id, the quantity and the expiry time.
+
+    Raises:
+        GoodNotFound: If the good does not exist.
+        InsufficientStock: If the stock is lower than the quantity.
+    """
+    if conditional_deduct(good_id, quantity) is None:
+        db.session.rollback()
+        raise deduction_failure([good_id])
+
+    now = datetime.utcnow()
+    reservation_id = uuid.uuid4().hex
+    expires_at = now + timedelta(seconds=ttl)
+    db.session.execute(db.insert(reservations_table).values(
+        id=reservation_id,
+        good_id=good_id,
+        quantity=quantity,
+        status=HELD,
+        reference=reference,
+        created_at=now,
+        expires_at=expires_at
+    ))
+    db.session.commit()
+    return {"reservation_id": reservation_id, "good_id": good_id, "quantity": quantity, "expires_at": expires_at.isoformat()}
+
+def _transition(reservation_id, status, now):
+    """
+    Moves a held reservation to another status, guarded so that only one transition can win.
+
+    Returns:
+        Row: The reservation's `good_id` and `quantity` if the transition happened, otherwise None.
+    """
+    conditions = [reservations_table.c.id == reservation_id, reservations_table.c.status == HELD]
+    if status == CONFIRMED:
+        conditions.append(reservations_table.c.expires_at > now)
+    return db.session.execute(
+        db.update(reservations_table)
+        .where(*conditions)
+        .values(status=status)
+        .returning(reservations_table.c.good_id, reservations_table.c.quantity)
+    ).first()
+
+def _not_held(reservation_id):
+    status = db.session.execute(
+        db.select(reservations_table.c.status).where(reservations_table.c.id == reservation_id)
+    ).scalar()
+    if status is None:
+        return ReservationNotFound("Reservation not found")
+    return ReservationNotHeld(EXPIRED if status == HELD else status)
+
+def confirm(reservation_id):
+    """
+    Confirms a held reservation: its units are sold and will not return to stock.
+
+    Raises:
+        ReservationNotFound: If the reservation does not exist.
+        ReservationNotHeld: If it was already confirmed, released or has expired.
+    """
+    if _transition(reservation_id, CONFIRMED, datetime.utcnow()) is None:
+        db.session.rollback()
+        raise _not_held(reservation_id)
+    db.session.commit()
+
+def release(reservation_id):
+    """
+    Releases a held reservation and puts its units back into stock.
+
+    Raises:
+        ReservationNotFound: If the reservation does not exist.
+        ReservationNotHeld: If it was already confirmed, released or reclaimed.
+    """
+    held = _transition(reservation_id, RELEASED, datetime.utcnow())
+    if held is None:
+        db.session.rollback()
+        raise _not_held(reservation_id)
+    restock(held.good_id, held.quantity)
+    db.session.commit()
+
+def expire_reservations(now=None):
+    """
+    Reclaims the stock of every hold that expired without being confirmed.
+
+    Each hold is moved to "expired" with the same guarded UPDATE as `release`, so a hold that is
+    confirmed or released concurrently is never restocked twice.
+
+    Returns:
+        int: The number of reclaimed holds.
+    """
+    now = now or datetime.utcnow()
+    reclaimed = 0
+    while True:
+        expired_ids = db.session.execute(
+            db.select(reservations_table.c.id)
+            .where(reservations_table.c.status == HELD, reservations_table.c.expires_at <= now)
+            .limit(SWEEP_BATCH_SIZE)
+        ).scalars().all()
+        for reservation_id in expired_ids:
+            held = _transition(reservation_id, EXPIRED, now)
+            if held is not None:
+                restock(held.good_id, held.quantity)
+                reclaimed += 1
+        db.session.commit()
+        if reclaimed:
+            catalog_cache.invalidate()
+        if len(expired_ids) < SWEEP_BATCH_SIZE:
+            return reclaimed
+
+class ReservationSweeper:
+    """
+    Background thread that periodically reclaims expired holds.
+
+    Args:
+        interval (float): Seconds between sweeps.
+    """
+
+    def __init__(self, interval=30):
+        self.interval = interval
+        self._thread = None
+
+    def init_app(self, app):
+        """
+        Configures the sweeper from the Flask app config and starts it.
+
+        Config keys:
+            RESERVATION_SWEEP_INTERVAL (float): Seconds between sweeps.
+        """
+        self.interval = app.config.get('RESERVATION_SWEEP_INTERVAL', self.interval)
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, args=(app,), name="reservation-sweeper", daemon=True)
+            self._thread.start()
+
+    def _run(self, app):
+        while True:
+            time.sleep(self.interval)
+            try:
+                with app.app_context():
+                    reclaimed = expire_reservations()
+                if reclaimed:
+                    logging.info(f"Reclaimed {reclaimed} expired stock reservations")
+            except Exception as e:
+                logging.error(f"Failed to reclaim expired stock reservations: {e}")
+
+# Shared sweeper, started by `reservation_sweeper.init_app(app)`
+reservation_sweeper = ReservationSweeper()
@@ -1,9 +1,15 @@
 from flask_restful import Api, Resource
 from models import Good
 from database import db
-from flask import request, jsonify
-from utils import log_to_audit, encrypt_data, decrypt_data, circuit_breaker
+from flask import Response, request, current_app
+from utils import log_to_audit, encrypt_data, decrypt_data, decrypt_many, circuit_breaker
 from extensions import limiter
+from stock import deduct_stock, deduct_many, GoodNotFound, InsufficientStock
+from catalog_cache import catalog_cache
+from etag import conditional
+from goods_search import index_good, unindex_good, search_goods, SEARCH_PAGE_SIZE, MAX_SEARCH_PAGE_SIZE, MAX_SEARCH_OFFSET
+from goods_filters import wants_filtering, parse_filters, build_goods_query, encode_cursor
+from reservations import reserve, confirm, release, ReservationNotFound, ReservationNotHeld
 
 api = Api()
 
@@ -35,7 +41,8 @@ class AddGood(Resource):
           }
 
         This endpoint checks for the required fields, encrypts the description (if provided), 
-        and adds the good to the database. All actions are logged for auditing purposes.
+        and adds the good to the database. The plaintext is indexed for search in the same transaction.
+        All actions are logged for auditing purposes.
         """
         data = request.json
         name = data.get('name')
@@ -51,7 +58,10 @@ class AddGood(Resource):
         encrypted_description = encrypt_data(description) if description else None
         good = Good(name=name, category=category, price=price, description=encrypted_description, stock_count=stock_count)
         db.session.add(good)
+        db.session.flush()
+        index_good(good.id, name, category, description)
         db.session.commit()
+        catalog_cache.invalidate()
 
         log_to_audit("inventory_service", "/goods", "success", details=f"Added good: {name}")
         return {"message": "Good added successfully"}, 201
@@ -89,29 +99,179 @@ class DeductGood(Resource):
           }
 
         This endpoint updates the stock of a specified good by deducting the given quantity.
+        The check and the deduction are a single conditional UPDATE, so concurrent requests cannot oversell.
         If the stock is insufficient or invalid, an error is returned. All actions are logged for auditing.
         """
         data = request.json
         quantity = data.get('quantity')
 
-        if quantity is None or quantity <= 0:
+        if not isinstance(quantity, int) or quantity <= 0:
             log_to_audit("inventory_service", f"/goods/{good_id}/deduct", "error", details="Invalid quantity")
             return {"error": "Quantity must be greater than zero"}, 400
 
-        good = Good.query.get(good_id)
-        if not good:
+        try:
+            new_stock = deduct_stock(good_id, quantity)
+        except GoodNotFound:
             log_to_audit("inventory_service", f"/goods/{good_id}/deduct", "error", details="Good not found")
             return {"error": "Good not found"}, 404
-
-        if good.stock_count < quantity:
+        except InsufficientStock:
             log_to_audit("inventory_service", f"/goods/{good_id}/deduct", "error", details="Insufficient stock")
             return {"error": "Not enough stock available"}, 400
-
-        good.stock_count -= quantity
-        db.session.commit()
+        catalog_cache.patch_stock({good_id: new_stock})
 
         log_to_audit("inventory_service", f"/goods/{good_id}/deduct", "success", details=f"Deducted {quantity} units")
-        return {"message": "Stock updated successfully", "new_stock": good.stock_count}, 200
+        return {"message": "Stock updated successfully", "new_stock": new_stock}, 200
+
+class DeductGoods(Resource):
+    decorators = [limiter.limit("20/minute")]  # Limit this endpoint to 20 requests per minute
+
+    @circuit_breaker
+    def put(self):
+        """
+        Deducts stock from many goods in one transaction.
+
+        Request Body:
+        {
+            "items": [{"good_id": "int", "quantity": "int"}]
+        }
+
+        Response:
+        - 200 OK: Every deduction was applied.
+          {
+            "message": "Stock updated successfully",
+            "new_stock": {"<good_id>": "int"}
+          }
+        - 400 Bad Request: Invalid items, or some goods do not have enough stock (`good_ids` lists them).
+        - 404 Not Found: Some goods do not exist (`good_ids` lists them).
+
+        Either every deduction is applied or none is. Repeated goods are merged.
+        """
+        items = (request.json or {}).get('items')
+        if not isinstance(items, list) or not items:
+            return {"error": "items must be a non-empty list"}, 400
+
+        quantities = {}
+        for item in items:
+            good_id = item.get('good_id') if isinstance(item, dict) else None
+            quantity = item.get('quantity') if isinstance(item, dict) else None
+            if not isinstance(good_id, int) or not isinstance(quantity, int) or quantity <= 0:
+                log_to_audit("inventory_service", "/goods/deduct", "error", details="Invalid items")
+                return {"error": "Every item needs a good_id and a quantity greater than zero"}, 400
+            quantities[good_id] = quantities.get(good_id, 0) + quantity
+
+        try:
+            new_stock = deduct_many(quantities)
+        except GoodNotFound as e:
+            log_to_audit("inventory_service", "/goods/deduct", "error", details=str(e))
+            return {"error": "Good not found", "good_ids": e.good_ids}, 404
+        except InsufficientStock as e:
+            log_to_audit("inventory_service", "/goods/deduct", "error", details=str(e))
+            return {"error": "Not enough stock available", "good_ids": e.good_ids}, 400
+        catalog_cache.patch_stock(new_stock)
+
+        log_to_audit("inventory_service", "/goods/deduct", "success", details=f"Deducted stock of {len(quantities)} goods")
+        return {"message": "Stock updated successfully", "new_stock": {str(good_id): stock for good_id, stock in new_stock.items()}}, 200
+
+class ReserveGood(Resource):
+    decorators = [limiter.limit("60/minute")]  # Limit this endpoint to 60 requests per minute
+
+    @circuit_breaker
+    def post(self, good_id):
+        """
+        Holds units of a good during checkout.
+
+        Request Body:
+        {
+            "quantity": "int",
+            "ttl": "int (optional, seconds)",
+            "reference": "string (optional)"
+        }
+
+        Response:
+        - 201 Created: The units are held until `expires_at` unless confirmed or released first.
+          {
+            "reservation_id": "string",
+            "good_id": "int",
+            "quantity": "int",
+            "expires_at": "string"
+          }
+        - 400 Bad Request: Invalid quantity or ttl, or not enough stock available.
+        - 404 Not Found: Good not found by `good_id`.
+
+        Held units are taken out of the stock immediately, so concurrent buyers cannot take them,
+        and are returned by the reservation sweeper if the hold expires.
+        """
+        data = request.json or {}
+        quantity = data.get('quantity')
+        ttl = data.get('ttl', current_app.config.get('RESERVATION_TTL', 300))
+
+        if not isinstance(quantity, int) or quantity <= 0:
+            log_to_audit("inventory_service", f"/goods/{good_id}/reservations", "error", details="Invalid quantity")
+            return {"error": "Quantity must be greater than zero"}, 400
+        if not isinstance(ttl, int) or not 0 < ttl <= current_app.config.get('RESERVATION_MAX_TTL', 3600):
+            return {"error": "ttl must be a positive number of seconds within the allowed maximum"}, 400
+
+        try:
+            reservation = reserve(good_id, quantity, ttl, data.get('reference'))
+        except GoodNotFound:
+            log_to_audit("inventory_service", f"/goods/{good_id}/reservations", "error", details="Good not found")
+            return {"error": "Good not found"}, 404
+        except InsufficientStock:
+            log_to_audit("inventory_service", f"/goods/{good_id}/reservations", "error", details="Insufficient stock")
+            return {"error": "Not enough stock available"}, 400
+        catalog_cache.invalidate()
+
+        log_to_audit("inventory_service", f"/goods/{good_id}/reservations", "success", details=f"Reserved {quantity} units")
+        return reservation, 201
+
+class ConfirmReservation(Resource):
+    decorators = [limiter.limit("60/minute")]  # Limit this endpoint to 60 requests per minute
+
+    @circuit_breaker
+    def post(self, reservation_id):
+        """
+        Confirms a held reservation once payment succeeded; the held units are sold.
+
+        Response:
+        - 200 OK: The reservation was confirmed.
+        - 404 Not Found: Reservation not found.
+        - 409 Conflict: The reservation was already confirmed, released or has expired.
+        """
+        try:
+            confirm(reservation_id)
+        except ReservationNotFound:
+            return {"error": "Reservation not found"}, 404
+        except ReservationNotHeld as e:
+            log_to_audit("inventory_service", "/reservations/confirm", "error", details=f"Reservation {reservation_id} is {e.status}")
+            return {"error": f"Reservation is {e.status}"}, 409
+
+        log_to_audit("inventory_service", "/reservations/confirm", "success", details=f"Confirmed reservation {reservation_id}")
+        return {"message": "Reservation confirmed"}, 200
+
+class ReleaseReservation(Resource):
+    decorators = [limiter.limit("60/minute")]  # Limit this endpoint to 60 requests per minute
+
+    @circuit_breaker
+    def post(self, reservation_id):
+        """
+        Releases a held reservation, for example when payment failed; the units go back to stock.
+
+        Response:
+        - 200 OK: The reservation was released.
+        - 404 Not Found: Reservation not found.
+        - 409 Conflict: The reservation was already confirmed, released or has expired.
+        """
+        try:
+            release(reservation_id)
+        except ReservationNotFound:
+            return {"error": "Reservation not found"}, 404
+        except ReservationNotHeld as e:
+            log_to_audit("inventory_service", "/reservations/release", "error", details=f"Reservation {reservation_id} is {e.status}")
+            return {"error": f"Reservation is {e.status}"}, 409
+        catalog_cache.invalidate()
+
+        log_to_audit("inventory_service", "/reservations/release", "success", details=f"Released reservation {reservation_id}")
+        return {"message": "Reservation released"}, 200
 
 class UpdateGood(Resource):
     decorators = [limiter.limit("5/minute")]  # Limit this endpoint to 5 requests per minute
@@ -141,6 +301,7 @@ class UpdateGood(Resource):
           }
 
         This endpoint allows updating the details of a product. The description is encrypted before storing in the database.
+        The search index entry is replaced in the same transaction.
         All actions are logged for auditing purposes.
         """
         data = request.json
@@ -150,27 +311,132 @@ class UpdateGood(Resource):
             log_to_audit("inventory_service", f"/goods/{good_id}", "error", details="Good not found")
             return {"error": "Good not found"}, 404
 
+        previous_description = decrypt_data(good.description) if good.description else None
+        unindex_good(good.id, good.name, good.category, previous_description)
+
         good.name = data.get('name', good.name)
         good.category = data.get('category', good.category)
         good.price = data.get('price', good.price)
         good.description = encrypt_data(data.get('description')) if data.get('description') else good.description
         good.stock_count = data.get('stock_count', good.stock_count)
+        index_good(good.id, good.name, good.category, data.get('description') or previous_description)
 
         db.session.commit()
+        catalog_cache.invalidate()
 
         log_to_audit("inventory_service", f"/goods/{good_id}", "success", details=f"Updated good ID {good_id}")
         return {"message": "Good updated successfully"}, 200
 
+class DeleteGood(Resource):
+    decorators = [limiter.limit("5/minute")]  # Limit this endpoint to 5 requests per minute
+
+    @circuit_breaker
+    def delete(self, good_id):
+        """
+        Deletes a good from the inventory.
+
+        Response:
+        - 200 OK: Good successfully deleted.
+          {
+            "message": "Good deleted successfully"
+          }
+        - 404 Not Found: Good not found by `good_id`.
+          {
+            "error": "Good not found"
+          }
+
+        The good is removed from the search index in the same transaction. All actions are logged for auditing purposes.
+        """
+        good = db.session.get(Good, good_id)
+        if not good:
+            log_to_audit("inventory_service", f"/goods/{good_id}", "error", details="Good not found")
+            return {"error": "Good not found"}, 404
+
+        unindex_good(good.id, good.name, good.category, decrypt_data(good.description) if good.description else None)
+        db.session.delete(good)
+        db.session.commit()
+        catalog_cache.invalidate()
+
+        log_to_audit("inventory_service", f"/goods/{good_id}", "success", details=f"Deleted good ID {good_id}")
+        return {"message": "Good deleted successfully"}, 200
+
+class SearchGoods(Resource):
+    decorators = [limiter.limit("60/minute")]  # Limit this endpoint to 60 requests per minute
+
+    @circuit_breaker
+    def get(self):
+        """
+        Searches goods by name, category and description, best matches first.
+
+        Query Parameters:
+            q (str): The search text. Every word must match; the last word also matches as a prefix.
+            limit (int, optional): Page size (default 20, maximum 100).
+            offset (int, optional): Number of results to skip (maximum 1000).
+
+        Response:
+        - 200 OK: One page of results in rank order.
+          {
+            "goods": [{"id": "int", "name": "string", "category": "string", "price": "float",
+                       "description": "string", "stock_count": "int"}],
+            "next_offset": "int or null"
+          }
+        - 400 Bad Request: Missing `q`, or invalid `limit` or `offset`.
+
+        Matches come from the full-text index, ranked with bm25 (name matches weigh most), and only the
+        descriptions of the returned page are decrypted.
+        """
+        text = request.args.get('q', '').strip()
+        if not text:
+            return {"error": "q is required"}, 400
+        try:
+            limit = min(int(request.args.get('limit', SEARCH_PAGE_SIZE)), MAX_SEARCH_PAGE_SIZE)
+            offset = int(request.args.get('offset', 0))
+        except ValueError:
+            return {"error": "limit and offset must be integers"}, 400
+        if limit < 1 or not 0 <= offset <= MAX_SEARCH_OFFSET:
+            return {"error": f"limit must be greater than zero and offset between 0 and {MAX_SEARCH_OFFSET}"}, 400
+
+        goods, more = search_goods(text, limit, offset)
+        log_to_audit("inventory_service", "/goods/search", "success", details=f"Searched goods: {text}")
+        return {"goods": serialize_goods(goods), "next_offset": offset + limit if more else None}, 200
+
+def serialize_goods(goods):
+    """
+    Builds the JSON representation of goods rows, decrypting all descriptions in one batch.
+    """
+    descriptions = decrypt_many([g.description or None for g in goods])
+    return [
+        {
+            "id": g.id,
+            "name": g.name,
+            "category": g.category,
+            "price": g.price,
+            "description": description,
+            "stock_count": g.stock_count
+        }
+        for g, description in zip(goods, descriptions)
+    ]
+
 class GetAllGoods(Resource):
     decorators = [limiter.limit("20/minute")]  # Limit this endpoint to 20 requests per minute
 
+    @conditional("goods")
     @circuit_breaker
     def get(self):
         """
-        Retrieves all goods from the inventory.
+        Retrieves all goods from the inventory, or a filtered page of them.
+
+        Query Parameters (all optional):
+            category (str): Only goods of this category.
+            min_price, max_price (float): Only goods within this price range (inclusive).
+            in_stock (bool): If "true", only goods with a positive stock count.
+            name_prefix (str): Only goods whose name starts with this prefix (case-sensitive).
+            sort (str): One of `id` (default), `price`, `-price`, `name`, `-name`.
+            limit (int): Page size (default 50, maximum 500).
+            cursor (str): The `next_cursor` of the previous page.
 
         Response:
-        - 200 OK: Returns a list of all goods in the inventory.
+        - 200 OK: Without query parameters, returns a list of all goods in the inventory.
           [
             {
               "id": "int",
@@ -181,29 +447,49 @@ class GetAllGoods(Resource):
               "stock_count": "int"
             }
           ]
+          With any query parameter, returns one page: {"goods": [...], "next_cursor": "string or null"}.
+        - 400 Bad Request: Invalid query parameters.
 
         This endpoint retrieves all products in the inventory, decrypting their description before returning.
+        The serialized catalog is kept in `catalog_cache` and served from memory until a write changes it.
+        Filtered pages are read with keyset pagination on the indexes of `goods`, and only the descriptions
+        of the page are decrypted.
+        The ETag follows the catalog version, so a matching `If-None-Match` gets 304 Not Modified.
         All actions are logged for auditing purposes.
         """
-        goods = Good.query.all()
-        goods_list = [
-            {
-                "id": g.id,
-                "name": g.name,
-                "category": g.category,
-                "price": g.price,
-                "description": decrypt_data(g.description) if g.description else None,
-                "stock_count": g.stock_count
-            }
-            for g in goods
-        ]
+        if wants_filtering(request.args):
+            return self.filtered()
+
+        version, body = catalog_cache.get()
+        if body is None:
+            body = catalog_cache.put(version, serialize_goods(Good.query.all()))
 
         log_to_audit("inventory_service", "/goods", "success", details="Retrieved all goods")
-        return jsonify(goods_list)
+        return Response(body, mimetype="application/json")
+
+    def filtered(self):
+        """
+        Returns one keyset-paginated page of the goods matching the query parameters.
+        """
+        try:
+            filters = parse_filters(request.args)
+            rows = db.session.execute(build_goods_query(filters)).all()
+        except ValueError as e:
+            return {"error": str(e)}, 400
 
+        limit = filters["limit"]
+        next_cursor = encode_cursor(rows[limit - 1], filters["sort"]) if len(rows) > limit else None
+        log_to_audit("inventory_service", "/goods", "success", details="Retrieved filtered goods")
+        return {"goods": serialize_goods(rows[:limit]), "next_cursor": next_cursor}, 200
 
 # Add API resources
 api.add_resource(AddGood, '/goods')
 api.add_resource(DeductGood, '/goods/<int:good_id>/deduct')
-api.add_resource(UpdateGood, '/goods/<int:good_id>')
+api.add_resource(DeductGoods, '/goods/deduct')
+api.add_resource(ReserveGood, '/goods/<int:good_id>/reservations')
+api.add_resource(ConfirmReservation, '/reservations/<string:reservation_id>/confirm')
+api.add_resource(ReleaseReservation, '/reservations/<string:reservation_id>/release')
+api.add_resource(UpdateGood, '/goods/<int:good_id>', endpoint='update_good')
+api.add_resource(DeleteGood, '/goods/<int:good_id>', endpoint='delete_good')
+api.add_resource(SearchGoods, '/goods/search')
 api.add_resource(GetAllGoods, '/goods')
@@ -0,0 +1,120 @@
+from database import db
+from models import Good
+
+goods_table = Good.__table__
+
+class GoodNotFound(LookupError):
+    """
+    Raised when a stock change targets goods that do not exist.
+
+    Attributes:
+        good_ids (list): The ids of the missing goods.
+    """
+
+    def __init__(self, good_ids):
+        super().__init__(f"Goods not found: {good_ids}")
+        self.good_ids = good_ids
+
+class InsufficientStock(ValueError):
+    """
+    Raised when a deduction would make the stock of some goods negative.
+
+    Attributes:
+        good_ids (list): The ids of the goods without enough stock.
+    """
+
+    def __init__(self, good_ids):
+        super().__init__(f"Not enough stock available for goods: {good_ids}")
+        self.good_ids = good_ids
+
+def conditional_deduct(good_id, quantity):
+    """
+    Runs `UPDATE goods SET stock_count = stock_count - :q WHERE id = :id AND stock_count >= :q`
+    in the current transaction, without committing.
+
+    Returns:
+        int: The new stock count, or None if the row did not match.
+    """
+    return db.session.execute(
+        db.update(goods_table)
+        .where(goods_table.c.id == good_id, goods_table.c.stock_count >= quantity)
+        .values(stock_count=goods_table.c.stock_count - quantity)
+        .returning(goods_table.c.stock_count)
+    ).scalar()
+
+def restock(good_id, quantity):
+    """
+    Adds a quantity back to the stock of a good in the current transaction, without committing.
+    """
+    db.session.execute(
+        db.update(goods_table)
+        .where(goods_table.c.id == good_id)
+        .values(stock_count=goods_table.c.stock_count + quantity)
+    )
+
+def deduction_failure(good_ids):
+    """
+    Tells missing goods apart from goods without enough stock after a deduction did not match.
+    """
+    existing = set(db.session.execute(
+        db.select(goods_table.c.id).where(goods_table.c.id.in_(good_ids))
+    ).scalars())
+    missing = [good_id for good_id in good_ids if good_id not in existing]
+    if missing:
+        return GoodNotFound(missing)
+    return InsufficientStock(good_ids)
+
+def deduct_stock(good_id, quantity):
+    """
+    Atomically deducts a quantity from the stock of a good.
+
+    The check and the write are one conditional UPDATE, so concurrent deductions can never
+    oversell: whichever statement runs second sees the already reduced stock.
+
+    Args:
+        good_id (int): The id of the good.
+        quantity (int): The positive quantity to deduct.
+
+    Returns:
+        int: The new stock count.
+
+    Raises:
+        GoodNotFound: If the good does not exist.
+        InsufficientStock: If the stock is lower than the quantity.
+    """
+    new_stock = conditional_deduct(good_id, quantity)
+    if new_stock is None:
+        db.session.rollback()
+        raise deduction_failure([good_id])
+    db.session.commit()
+    return new_stock
+
+def deduct_many(quantities):
+    """
+    Atomically deducts stock from many goods in one transaction.
+
+    Either every deduction is applied or none is.
+
+    Args:
+        quantities (dict): Positive quantities to deduct, keyed by good id.
+
+    Returns:
+        dict: The new stock count of every good, keyed by good id.
+
+    Raises:
+        GoodNotFound: If some goods do not exist.
+        InsufficientStock: If some goods do not have enough stock.
+    """
+    new_stock = {}
+    failed = []
+    for good_id, quantity in quantities.items():
+        stock = conditional_deduct(good_id, quantity)
+        if stock is None:
+            failed.append(good_id)
+        else:
+            new_stock[good_id] = stock
+    if failed:
+        db.session.rollback()
+        raise deduction_failure(failed)
+    db.session.commit()
+    return new_stock
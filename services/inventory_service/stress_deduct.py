@@ -0,0 +1,110 @@
+import argparse
+import os
+import random
+import tempfile
+import time
+from multiprocessing import Pool
+
+def worker(args):
+    """
+    Sends deduction requests through the real routes and returns how many units each success deducted.
+    """
+    database_uri, good_ids, requests_per_worker, max_quantity, batch, seed = args
+    os.environ['INVENTORY_DATABASE_URI'] = database_uri
+    os.environ['RATELIMIT_ENABLED'] = 'false'
+    import utils
+    from app import app
+
+    # Audit events are not the subject of this test; keep them off the network
+    utils.audit_shipper.submit = lambda event: True
+
+    rng = random.Random(seed)
+    client = app.test_client()
+    deducted = {good_id: 0 for good_id in good_ids}
+    statuses = {}
+    for _ in range(requests_per_worker):
+        if batch:
+            chosen = rng.sample(good_ids, k=rng.randint(1, len(good_ids)))
+            items = [{"good_id": good_id, "quantity": rng.randint(1, max_quantity)} for good_id in chosen]
+            response = client.put('/goods/deduct', json={"items": items})
+        else:
+            items = [{"good_id": rng.choice(good_ids), "quantity": rng.randint(1, max_quantity)}]
+            response = client.put(f"/goods/{items[0]['good_id']}/deduct", json={"quantity": items[0]['quantity']})
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        if response.status_code == 200:
+            for item in items:
+                deducted[item['good_id']] += item['quantity']
+    return deducted, statuses
+
+def main():
+    parser = argparse.ArgumentParser(description="Hammer the stock deduction endpoints and check that stock is never oversold.")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=500, help="Requests per worker")
+    parser.add_argument("--goods", type=int, default=3)
+    parser.add_argument("--stock", type=int, default=1000, help="Initial stock of every good")
+    parser.add_argument("--max-quantity", type=int, default=5)
+    parser.add_argument("--batch", action="store_true", help="Use PUT /goods/deduct with several goods per request")
+    args = parser.parse_args()
+
+    database_path = os.path.join(tempfile.mkdtemp(), "stress_inventory.db")
+    database_uri = f"sqlite:///{database_path}"
+    os.environ['INVENTORY_DATABASE_URI'] = database_uri
+    os.environ['RATELIMIT_ENABLED'] = 'false'
+    from app import app
+    from database import db
+    from models import Good
+
+    with app.app_context():
+        db.create_all()
+        goods = [Good(name=f"Stress {index}", category="stress", price=1.0, stock_count=args.stock) for index in range(args.goods)]
+        db.session.add_all(goods)
+        db.session.commit()
+        good_ids = [good.id for good in goods]
+
+    tasks = [(database_uri, good_ids, args.requests, args.max_quantity, args.batch, seed) for seed in range(args.workers)]
+    started = time.perf_counter()
+    with Pool(args.workers) as pool:
+        results = pool.map(worker, tasks)
+    elapsed = time.perf_counter() - started
+
+    statuses = {}
+    deducted = {good_id: 0 for good_id in good_ids}
+    for worker_deducted, worker_statuses in results:
+        for good_id, quantity in worker_deducted.items():
+            deducted[good_id] += quantity
+        for status, count in worker_statuses.items():
+            statuses[status] = statuses.get(status, 0) + count
+
+    with app.app_context():
+        final = {good.id: good.stock_count for good in Good.query.filter(Good.id.in_(good_ids))}
+
+    total = args.workers * args.requests
+    print(f"{total} requests in {elapsed:.2f}s ({total / elapsed:.0f} req/s), statuses: {statuses}")
+    consistent = True
+    for good_id in good_ids:
+        expected = args.stock - deducted[good_id]
+        ok = final[good_id] >= 0 and final[good_id] == expected
+        consistent = consistent and ok
+        print(f"good {good_id}: final stock {final[good_id]}, acknowledged deductions {deducted[good_id]}, expected {expected} -> {'OK' if ok else 'MISMATCH'}")
+    os.remove(database_path)
+    raise SystemExit(0 if consistent else 1)
+
+if __name__ == "__main__":
+    main()
+
+"""
+Concurrency stress test for stock deductions.
+
+Several processes send deduction requests for the same few goods at once, through the real Flask routes
+and a shared SQLite file. Afterwards every good must satisfy:
+
+- its stock never went negative, and
+- its final stock equals the initial stock minus the quantities of the requests that returned 200.
+
+Both hold only if the check and the write are one conditional UPDATE; a read-compare-write implementation
+either oversells or loses acknowledged deductions. The script exits with status 1 on any mismatch.
+
+Usage:
+    python stress_deduct.py --workers 8 --requests 500 --stock 1000
+    python stress_deduct.py --batch --goods 5
+"""
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# The service modules import each other by name, as they do when the service runs from its own directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault("INVENTORY_DATABASE_URI", "sqlite://")
+os.environ.setdefault("RATELIMIT_ENABLED", "false")
@@ -0,0 +1,103 @@
+import json
+import pytest
+from catalog_cache import CatalogCache
+
+GOODS = [
+    {"id": 1, "name": "Kettle", "category": "kitchen", "price": 25.0, "stock_count": 5},
+    {"id": 2, "name": "Toaster", "category": "kitchen", "price": 40.0, "stock_count": 3},
+]
+
+class FakeRedis:
+    """
+    In-memory stand-in for `redis.Redis`, with the commands the catalog cache uses. Values come back
+    as bytes, as they do from Redis. While `down` is set, every command raises like an unreachable server.
+    """
+
+    def __init__(self):
+        self.values = {}
+        self.down = False
+
+    def _check(self):
+        if self.down:
+            raise ConnectionError("Connection refused")
+
+    def get(self, key):
+        self._check()
+        return self.values.get(key)
+
+    def set(self, key, value, ex=None):
+        self._check()
+        self.values[key] = value if isinstance(value, bytes) else str(value).encode()
+        return True
+
+    def incr(self, key):
+        self._check()
+        value = int(self.values.get(key, b"0")) + 1
+        self.values[key] = str(value).encode()
+        return value
+
+@pytest.fixture
+def redis():
+    return FakeRedis()
+
+def test_a_catalog_stored_by_one_worker_is_served_by_another(redis):
+    writer, reader = CatalogCache(redis), CatalogCache(redis)
+    version, body = writer.get()
+    assert body is None
+    writer.put(version, GOODS)
+
+    assert reader.get() == (version, json.dumps(GOODS, separators=(",", ":")).encode())
+    assert reader.stats()["hits"] == 1
+
+def test_an_invalidation_in_one_worker_is_seen_by_another(redis):
+    writer, reader = CatalogCache(redis), CatalogCache(redis)
+    writer.put(writer.current_version(), GOODS)
+    assert reader.get()[1] is not None
+
+    writer.invalidate()
+    version, body = reader.get()
+    assert version == 1
+    assert body is None
+
+def test_a_stock_patch_in_one_worker_is_served_by_another(redis):
+    writer, reader = CatalogCache(redis), CatalogCache(redis)
+    writer.put(writer.current_version(), GOODS)
+    reader.get()
+
+    writer.patch_stock({1: 4})
+    version, body = reader.get()
+    assert version == 1
+    assert [good["stock_count"] for good in json.loads(body)] == [4, 3]
+
+def test_an_older_stock_patch_is_dropped(redis):
+    cache = CatalogCache(redis)
+    cache.put(cache.current_version(), GOODS)
+    cache.patch_stock({1: 3})
+
+    cache.patch_stock({1: 4})
+    assert cache.get() == (2, None)
+
+def test_an_unreachable_shared_tier_falls_back_to_the_database(redis):
+    cache = CatalogCache(redis)
+    cache.put(cache.current_version(), GOODS)
+    redis.down = True
+
+    # Nothing is served from the cache; the caller loads the catalog and `put` only serializes it
+    assert cache.get() == (None, None)
+    assert json.loads(cache.put(None, GOODS)) == GOODS
+
+    # A write still succeeds, and the local snapshot it could not version is dropped
+    cache.invalidate()
+    cache.patch_stock({1: 4})
+    assert cache.stats()["version"] is None
+
+def test_a_failed_share_still_keeps_the_local_snapshot(redis):
+    cache = CatalogCache(redis)
+    version = cache.current_version()
+
+    def failing_set(key, value, ex=None):
+        raise ConnectionError("Connection refused")
+    redis.set = failing_set
+
+    cache.put(version, GOODS)
+    assert cache.get() == (version, json.dumps(GOODS, separators=(",", ":")).encode())
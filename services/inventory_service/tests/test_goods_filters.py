@@ -0,0 +1,38 @@
+import base64
+import json
+import pytest
+from werkzeug.datastructures import MultiDict
+from goods_filters import parse_filters, encode_cursor
+from models import Good
+
+def cursor(position):
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+@pytest.mark.parametrize("sort", ["id", "price", "-price", "name", "-name"])
+def test_a_cursor_round_trips(sort):
+    row = Good(id=7, name="Kettle", price=25.0)
+    filters = parse_filters(MultiDict({"sort": sort, "cursor": encode_cursor(row, sort)}))
+    assert filters["cursor"][-1] == 7
+
+@pytest.mark.parametrize("sort, position", [
+    ("id", [{"a": 1}]),
+    ("id", ["7"]),
+    ("id", [True]),
+    ("id", [1.5]),
+    ("price", ["cheap", 7]),
+    ("price", [25.0, "7"]),
+    ("name", [25.0, 7]),
+    ("name", ["Kettle", None]),
+])
+def test_a_cursor_with_values_of_the_wrong_type_is_rejected(sort, position):
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        parse_filters(MultiDict({"sort": sort, "cursor": cursor(position)}))
+
+def test_a_cursor_for_another_sort_order_is_rejected():
+    with pytest.raises(ValueError, match="does not match the sort order"):
+        parse_filters(MultiDict({"sort": "price", "cursor": cursor([7])}))
+
+@pytest.mark.parametrize("value", ["not base64!", cursor({"id": 7}), cursor([])])
+def test_a_malformed_cursor_is_rejected(value):
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        parse_filters(MultiDict({"cursor": value}))
@@ -0,0 +1,66 @@
+import random
+import pytest
+from werkzeug.datastructures import MultiDict
+from app import app
+from database import db
+from goods_filters import parse_filters, build_goods_query, encode_cursor
+from models import Good
+
+# Every case: the GET /goods query parameters, the index that must serve them, and whether the rows
+# must come out of that index already sorted (no temporary B-tree for the ORDER BY)
+CASES = [
+    ({"category": "books"}, "ix_goods_category", True),
+    ({"category": "books", "min_price": "10", "max_price": "20"}, "ix_goods_category_price", False),
+    ({"category": "books", "sort": "price"}, "ix_goods_category_price", True),
+    ({"category": "books", "sort": "-price", "min_price": "10"}, "ix_goods_category_price", True),
+    ({"category": "books", "sort": "price", "cursor": None}, "ix_goods_category_price", True),
+    ({"category": "books", "name_prefix": "Wid"}, "ix_goods_category_name", False),
+    ({"category": "books", "name_prefix": "Wid", "sort": "name"}, "ix_goods_category_name", True),
+    ({"min_price": "10", "max_price": "20"}, "ix_goods_price", False),
+    ({"sort": "price", "in_stock": "true"}, "ix_goods_price", True),
+    ({"sort": "-price", "min_price": "50"}, "ix_goods_price", True),
+    ({"name_prefix": "Gad"}, "ix_goods_name", False),
+    ({"name_prefix": "Gad", "sort": "name"}, "ix_goods_name", True),
+    ({"sort": "name", "in_stock": "true"}, "ix_goods_name", True),
+]
+
+goods_table = Good.__table__
+
+@pytest.fixture(scope="module")
+def catalog():
+    """
+    An analyzed synthetic catalog, so that SQLite plans the queries as it would on real data.
+    """
+    rng = random.Random(0)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        db.session.execute(db.insert(goods_table), [
+            {
+                "name": f"{rng.choice(['Widget', 'Gadget', 'Gizmo'])} {index}",
+                "category": rng.choice(["books", "games", "tools", "toys"]),
+                "price": round(rng.uniform(1, 100), 2),
+                "stock_count": rng.randint(0, 20)
+            }
+            for index in range(5000)
+        ])
+        db.session.commit()
+        db.session.execute(db.text("ANALYZE"))
+        yield
+        db.drop_all()
+
+def explain(query):
+    compiled = query.compile(db.engine, compile_kwargs={"literal_binds": True})
+    return [row[3] for row in db.session.execute(db.text(f"EXPLAIN QUERY PLAN {compiled}")).all()]
+
+@pytest.mark.parametrize("params, index, ordered", CASES, ids=lambda value: str(value) if isinstance(value, dict) else None)
+def test_goods_filters_are_served_by_an_index(catalog, params, index, ordered):
+    if "cursor" in params:
+        first = db.session.execute(build_goods_query(parse_filters(MultiDict({"category": "books", "sort": "price"})))).first()
+        params = dict(params, cursor=encode_cursor(first, "price"))
+
+    plan = explain(build_goods_query(parse_filters(MultiDict(params))))
+    assert any(f"USING INDEX {index} " in f"{step} " for step in plan), plan
+    assert f"SCAN {goods_table.name}" not in plan, plan
+    if ordered:
+        assert not any("TEMP B-TREE" in step for step in plan), plan
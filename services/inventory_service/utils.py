@@ -1,8 +1,10 @@
-import requests
 from cryptography.fernet import Fernet
 import os
 import logging
 from pybreaker import CircuitBreaker
+from audit_shipper import create_shipper
+from batch_crypto import create_batch_crypto
+from decrypt_cache import DecryptCache
 
 # Set up logging configuration
 logging.basicConfig(level=logging.INFO)
@@ -11,10 +13,25 @@ logging.basicConfig(level=logging.INFO)
 ENCRYPTION_KEY = os.getenv("ENCRYPTION_KEY", Fernet.generate_key().decode())
 cipher_suite = Fernet(ENCRYPTION_KEY.encode())
 
+# Batch decryption helper used by the list endpoints
+batch_crypto = create_batch_crypto()
+
+# LRU cache of decrypted values keyed by ciphertext, bound once to the key, which is fixed for the life of the process
+decrypt_cache = DecryptCache(
+    max_entries=int(os.getenv("DECRYPT_CACHE_MAX_ENTRIES", 10000)),
+    max_bytes=int(os.getenv("DECRYPT_CACHE_MAX_BYTES", 16 * 1024 * 1024)),
+    ttl=float(os.getenv("DECRYPT_CACHE_TTL")) if os.getenv("DECRYPT_CACHE_TTL") else None
+)
+decrypt_cache.bind_key(ENCRYPTION_KEY)
+
 # Circuit Breaker Configuration
 circuit_breaker = CircuitBreaker(fail_max=5, reset_timeout=60)
 breaker = circuit_breaker
 
+# Security service base URL and the background shipper that delivers audit events off the request path
+SECURITY_SERVICE_URL = os.getenv("SECURITY_SERVICE_URL", "http://localhost:5005")
+audit_shipper = create_shipper(f"{SECURITY_SERVICE_URL}/audit_logs/bulk", circuit_breaker=circuit_breaker)
+
 # Logging Function
 def log_to_audit(service_name, endpoint, status, user=None, details=""):
     """
@@ -28,35 +45,19 @@ def log_to_audit(service_name, endpoint, status, user=None, details=""):
         details (str, optional): Additional details about the operation. Default is an empty string.
     
     Description:
-        This function creates an audit log and sends it as a JSON payload to the security service.
-        If the request to the security service fails, it retries based on the CircuitBreaker configuration.
-        All errors in the process are logged.
+        This function creates an audit log and queues it for the security service. The log is delivered
+        in batches by the background `audit_shipper`, so the request never waits on the security service.
+        If the security service is unavailable, the CircuitBreaker stops further attempts and the
+        failures are logged by the shipper.
     """
     audit_log = {
-        "service_name": service_name,
-        "endpoint": endpoint,
+        "service": service_name,
+        "operation": endpoint,
         "status": status,
         "user": user,
         "details": details
     }
-    security_service_url = os.getenv("SECURITY_SERVICE_URL", "http://localhost:5005/audit-log")
-
-    @circuit_breaker
-    def send_audit_log():
-        try:
-            response = requests.post(security_service_url, json=audit_log)
-            if response.status_code == 201:
-                logging.info(f"Audit log sent successfully: {audit_log}")
-            else:
-                logging.error(f"Failed to send audit log: {response.status_code} {response.text}")
-        except requests.exceptions.RequestException as e:
-            logging.error(f"Error connecting to Security Service: {e}")
-            raise e
-
-    try:
-        send_audit_log()
-    except Exception as e:
-        logging.error(f"Audit log failed due to circuit breaker: {e}")
+    audit_shipper.submit(audit_log)
 
 # Encryption Function
 def encrypt_data(data):
@@ -96,12 +97,46 @@ def decrypt_data(encrypted_data):
     Description:
         This function decrypts the provided encrypted data using the Fernet decryption scheme and returns 
         the decrypted data as a string. If the data is `None`, it returns `None`.
+        Values already decrypted with the current key are served from `decrypt_cache`.
     """
     if encrypted_data is None:
         return None
+    cached = decrypt_cache.get(encrypted_data)
+    if cached is not None:
+        return cached
     try:
         decrypted_data = cipher_suite.decrypt(encrypted_data.encode()).decode()
+        decrypt_cache.put(encrypted_data, decrypted_data)
         return decrypted_data
     except Exception as e:
         logging.error(f"Decryption error: {e}")
         raise e
+
+# Batch Decryption Function
+def decrypt_many(encrypted_values):
+    """
+    Decrypts a list of encrypted values in one batch.
+
+    Args:
+        encrypted_values (list): The encrypted strings to be decrypted.
+
+    Returns:
+        list: The decrypted strings, in the same order.
+
+    Description:
+        Values found in `decrypt_cache` skip the crypto entirely; the misses are decrypted together and
+        large lists of misses are split across the `batch_crypto` worker pool. `None` entries are returned as `None`.
+    """
+    results = [decrypt_cache.get(value) if value is not None else None for value in encrypted_values]
+    misses = [index for index, value in enumerate(encrypted_values) if value is not None and results[index] is None]
+    if not misses:
+        return results
+    try:
+        decrypted = batch_crypto.decrypt_many([encrypted_values[index] for index in misses], [ENCRYPTION_KEY])
+    except Exception as e:
+        logging.error(f"Decryption error: {e}")
+        raise e
+    for index, value in zip(misses, decrypted):
+        decrypt_cache.put(encrypted_values[index], value)
+        results[index] = value
+    return results
@@ -1,14 +1,14 @@
+import os
 from flask import Flask, jsonify
+from flask_migrate import Migrate
 from database import db
-from routes import api
-from flask_limiter import Limiter
-from flask_limiter.util import get_remote_address
+from routes import api, limiter
 from pybreaker import CircuitBreaker
 
 app = Flask(__name__)
 
 # Configuration
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///reviews.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('REVIEWS_DATABASE_URI', 'sqlite:///reviews.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['CIRCUIT_BREAKER_FAIL_MAX'] = 5
 app.config['CIRCUIT_BREAKER_RESET_TIMEOUT'] = 60
@@ -20,17 +20,17 @@ circuit_breaker = CircuitBreaker(
     reset_timeout=app.config['CIRCUIT_BREAKER_RESET_TIMEOUT']
 )
 
-# Rate Limiter Configuration
-limiter = Limiter(
-    get_remote_address,  # Key function
-    app=app,  # Flask app
-    default_limits=[app.config['RATELIMIT_DEFAULT']]  # Default rate limits
-)
+# Rate Limiter Configuration: the limiter whose per-route limits decorate the resources in routes.py
+app.config['RATELIMIT_ENABLED'] = os.getenv('RATELIMIT_ENABLED', 'true').lower() == 'true'
+limiter.init_app(app)
 
 # Initialize extensions
 db.init_app(app)
 api.init_app(app)
 
+# Schema migrations (`flask db upgrade`), kept in migrations/versions
+migrate = Migrate(app, db)
+
 @app.errorhandler(429)
 def ratelimit_exceeded(e):
     """
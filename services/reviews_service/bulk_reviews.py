@@ -0,0 +1,240 @@
+import argparse
+import csv
+import io
+import json
+import logging
+import sys
+import time
+from database import db
+from etag import generations
+from models import Review
+from review_queries import REVIEW_STATUSES
+from review_stats import apply_changes
+from utils import encrypt_many, decrypt_many
+
+NDJSON = "ndjson"
+CSV = "csv"
+FORMATS = (NDJSON, CSV)
+
+# Rows encrypted and inserted per transaction
+IMPORT_CHUNK_SIZE = 1000
+
+# Rows read and decrypted per chunk of an export
+EXPORT_CHUNK_SIZE = 1000
+
+# Rejected rows reported back in detail; the rest are only counted
+MAX_REPORTED_ERRORS = 100
+
+EXPORT_FIELDS = ["id", "good_id", "username", "rating", "comment", "status"]
+
+reviews_table = Review.__table__
+
+def read_records(lines, fmt):
+    """
+    Parses an NDJSON or CSV stream lazily.
+
+    Args:
+        lines (iterable): Text lines.
+        fmt (str): "ndjson" or "csv". A CSV stream starts with a header naming its columns.
+
+    Yields:
+        tuple: The line number and the record (a dict), or the line number and a parse error (a str).
+    """
+    if fmt == CSV:
+        reader = csv.DictReader(lines)
+        for record in reader:
+            yield reader.line_num, record
+        return
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield line_number, f"Invalid JSON: {e}"
+            continue
+        yield line_number, record if isinstance(record, dict) else "Expected a JSON object"
+
+def validate_record(record):
+    """
+    Checks one imported review, accepting the string values of CSV cells.
+
+    Returns:
+        dict: The review's column values, without the encrypted comment.
+
+    Raises:
+        ValueError: If the record is not a valid review.
+    """
+    try:
+        good_id = int(record.get('good_id'))
+        rating = int(record.get('rating'))
+    except (TypeError, ValueError):
+        raise ValueError("good_id and rating must be integers")
+    username = record.get('username')
+    comment = record.get('comment')
+    status = record.get('status') or "pending"
+    if not username or not isinstance(username, str) or len(username) > 80:
+        raise ValueError("username is required (at most 80 characters)")
+    if not comment or not isinstance(comment, str):
+        raise ValueError("comment is required")
+    if not 1 <= rating <= 5:
+        raise ValueError("Rating must be between 1 and 5")
+    if status not in REVIEW_STATUSES:
+        raise ValueError(f"status must be one of: {', '.join(REVIEW_STATUSES)}")
+    return {"good_id": good_id, "username": username, "rating": rating, "comment": comment, "status": status}
+
+def import_reviews(lines, fmt=NDJSON, chunk_size=IMPORT_CHUNK_SIZE, progress=None):
+    """
+    Imports reviews from an NDJSON or CSV stream.
+
+    The stream is read lazily. Every `chunk_size` valid rows, the comments are encrypted together
+    (large chunks are spread over the `batch_crypto` pool) and the rows are inserted with one
+    multi-row INSERT, together with the rating aggregate updates, in one transaction. Memory use is
+    bounded by the chunk size, and a failure only loses the current chunk.
+
+    Args:
+        lines (iterable): Text lines.
+        fmt (str): "ndjson" or "csv".
+        chunk_size (int): Rows per transaction.
+        progress (callable, optional): Called after every chunk with the running totals.
+
+    Returns:
+        dict: The imported and rejected counts, the first rejected rows with their errors, the elapsed
+        seconds and the rows per second.
+    """
+    started = time.perf_counter()
+    totals = {"imported": 0, "rejected": 0, "errors": []}
+
+    def reject(line_number, error):
+        totals["rejected"] += 1
+        if len(totals["errors"]) < MAX_REPORTED_ERRORS:
+            totals["errors"].append({"line": line_number, "error": error})
+
+    def flush(rows):
+        comments = encrypt_many([row["comment"] for row in rows])
+        db.session.execute(db.insert(reviews_table), [dict(row, comment=comment) for row, comment in zip(rows, comments)])
+        apply_changes([(row["good_id"], None, (row["rating"], row["status"])) for row in rows])
+        db.session.commit()
+        # New reviews have no cached details yet; only their products' and customers' listings change
+        generations.bump(*{f"reviews:product:{row['good_id']}" for row in rows}, *{f"reviews:customer:{row['username']}" for row in rows})
+        totals["imported"] += len(rows)
+        if progress is not None:
+            progress(report(totals, "imported", started))
+
+    chunk = []
+    for line_number, record in read_records(lines, fmt):
+        if isinstance(record, str):
+            reject(line_number, record)
+            continue
+        try:
+            chunk.append(validate_record(record))
+        except ValueError as e:
+            reject(line_number, str(e))
+            continue
+        if len(chunk) >= chunk_size:
+            flush(chunk)
+            chunk = []
+    if chunk:
+        flush(chunk)
+    return report(totals, "imported", started)
+
+def report(totals, counter, started):
+    """
+    Adds the elapsed seconds and the throughput, in rows of `totals[counter]` per second, to running totals.
+    """
+    elapsed = time.perf_counter() - started
+    return dict(totals, seconds=round(elapsed, 3), rows_per_second=round(totals[counter] / elapsed, 1) if elapsed else 0.0)
+
+def export_reviews(fmt=NDJSON, good_id=None, chunk_size=EXPORT_CHUNK_SIZE, progress=None):
+    """
+    Streams reviews as NDJSON lines or CSV rows, oldest first.
+
+    Reviews are read in keyset-paginated chunks and each chunk's comments are decrypted just before it
+    is written, so memory use is bounded by the chunk size however many reviews are exported.
+
+    Args:
+        fmt (str): "ndjson" or "csv" (with a header row).
+        good_id (int, optional): Only export the reviews of this product.
+        chunk_size (int): Rows read and decrypted at a time.
+        progress (callable, optional): Called after every chunk with the exported count, elapsed
+            seconds and rows per second.
+
+    Yields:
+        str: Chunks of the output.
+    """
+    started = time.perf_counter()
+    totals = {"exported": 0}
+    if fmt == CSV:
+        yield ",".join(EXPORT_FIELDS) + "\r\n"
+
+    c = reviews_table.c
+    last_id = 0
+    while True:
+        query = db.select(*[c[field] for field in EXPORT_FIELDS]).where(c.id > last_id).order_by(c.id).limit(chunk_size)
+        if good_id is not None:
+            query = query.where(c.good_id == good_id)
+        rows = db.session.execute(query).all()
+        if not rows:
+            break
+        comments = decrypt_many([row.comment for row in rows])
+        records = [dict(row._mapping, comment=comment) for row, comment in zip(rows, comments)]
+        if fmt == CSV:
+            buffer = io.StringIO()
+            csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS).writerows(records)
+            yield buffer.getvalue()
+        else:
+            yield "".join(json.dumps(record) + "\n" for record in records)
+
+        totals["exported"] += len(rows)
+        last_id = rows[-1].id
+        if progress is not None:
+            progress(report(totals, "exported", started))
+
+def print_progress(report):
+    print(", ".join(f"{key}: {value}" for key, value in report.items() if key != "errors"), file=sys.stderr)
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import and export of reviews.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    import_parser = commands.add_parser("import", help="Import reviews from an NDJSON or CSV file ('-' for stdin)")
+    import_parser.add_argument("path")
+    import_parser.add_argument("--format", choices=FORMATS, default=NDJSON)
+    import_parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE)
+    export_parser = commands.add_parser("export", help="Export reviews to an NDJSON or CSV file ('-' for stdout)")
+    export_parser.add_argument("path")
+    export_parser.add_argument("--format", choices=FORMATS, default=NDJSON)
+    export_parser.add_argument("--good-id", type=int)
+    export_parser.add_argument("--chunk-size", type=int, default=EXPORT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    from app import app
+    with app.app_context():
+        if args.command == "import":
+            source = sys.stdin if args.path == "-" else open(args.path, newline="", encoding="utf-8")
+            with source:
+                result = import_reviews(source, args.format, args.chunk_size, progress=print_progress)
+            for error in result["errors"]:
+                print(f"line {error['line']}: {error['error']}", file=sys.stderr)
+            print_progress(result)
+        else:
+            target = sys.stdout if args.path == "-" else open(args.path, "w", newline="", encoding="utf-8")
+            with target:
+                for chunk in export_reviews(args.format, args.good_id, args.chunk_size, progress=print_progress):
+                    target.write(chunk)
+
+if __name__ == "__main__":
+    logging.getLogger().setLevel(logging.WARNING)
+    main()
+
+"""
+Bulk import and export of reviews, also served over HTTP by `POST /reviews/bulk/import` and `GET /reviews/bulk/export`.
+
+Import reads NDJSON (one JSON object per line) or CSV (with a header row) with the fields `good_id`, `username`,
+`rating`, `comment` and optionally `status` (default "pending"). Invalid rows are skipped and reported with their
+line number. Export writes the same fields plus `id`, oldest review first.
+
+Usage:
+    python bulk_reviews.py import reviews.ndjson
+    python bulk_reviews.py import old_platform.csv --format csv --chunk-size 5000
+    python bulk_reviews.py export - --format csv --good-id 42 > reviews_42.csv
+"""
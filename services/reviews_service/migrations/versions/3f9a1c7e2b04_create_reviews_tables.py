@@ -0,0 +1,56 @@
+"""create reviews and review_stats tables
+
+Databases created earlier with `db.create_all()` already have these tables; they are only created
+when missing, so such databases can be brought under migration control with `flask db upgrade`.
+For the same reason the downgrade leaves them in place.
+
+Revision ID: 3f9a1c7e2b04
+Revises: 
+Create Date: 2026-10-17 18:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f9a1c7e2b04'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    existing = sa.inspect(op.get_bind()).get_table_names()
+    if 'reviews' not in existing:
+        op.create_table(
+            'reviews',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('good_id', sa.Integer(), nullable=False),
+            sa.Column('username', sa.String(length=80), nullable=False),
+            sa.Column('rating', sa.Integer(), nullable=False),
+            sa.Column('comment', sa.String(length=255), nullable=False),
+            sa.Column('status', sa.String(length=20), nullable=True),
+            sa.PrimaryKeyConstraint('id')
+        )
+    if 'review_stats' not in existing:
+        op.create_table(
+            'review_stats',
+            sa.Column('good_id', sa.Integer(), nullable=False),
+            sa.Column('review_count', sa.Integer(), nullable=False),
+            sa.Column('rating_sum', sa.Integer(), nullable=False),
+            sa.Column('rating_1', sa.Integer(), nullable=False),
+            sa.Column('rating_2', sa.Integer(), nullable=False),
+            sa.Column('rating_3', sa.Integer(), nullable=False),
+            sa.Column('rating_4', sa.Integer(), nullable=False),
+            sa.Column('rating_5', sa.Integer(), nullable=False),
+            sa.Column('approved_count', sa.Integer(), nullable=False),
+            sa.Column('approved_sum', sa.Integer(), nullable=False),
+            sa.PrimaryKeyConstraint('good_id')
+        )
+
+
+def downgrade():
+    # The tables may predate this revision (created by `db.create_all()`) and hold every review, so
+    # downgrading to base only takes the database off migration control; `upgrade` adopts them again.
+    pass
@@ -0,0 +1,28 @@
+"""add indexes for product and customer review lookups
+
+Revision ID: 8c41d2e6a95b
+Revises: 3f9a1c7e2b04
+Create Date: 2026-10-17 18:45:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8c41d2e6a95b'
+down_revision = '3f9a1c7e2b04'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_reviews_good_id_status', 'reviews', ['good_id', 'status'], if_not_exists=True)
+    op.create_index('ix_reviews_good_id_rating', 'reviews', ['good_id', 'rating'], if_not_exists=True)
+    op.create_index('ix_reviews_username', 'reviews', ['username'], if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_reviews_username', table_name='reviews')
+    op.drop_index('ix_reviews_good_id_rating', table_name='reviews')
+    op.drop_index('ix_reviews_good_id_status', table_name='reviews')
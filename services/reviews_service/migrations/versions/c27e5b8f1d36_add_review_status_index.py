@@ -0,0 +1,24 @@
+"""add (status, id) index for the moderation queue
+
+Revision ID: c27e5b8f1d36
+Revises: 8c41d2e6a95b
+Create Date: 2026-10-17 19:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c27e5b8f1d36'
+down_revision = '8c41d2e6a95b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_reviews_status_id', 'reviews', ['status', 'id'], if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_reviews_status_id', table_name='reviews')
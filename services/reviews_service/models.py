@@ -2,6 +2,12 @@ from database import db
 
 class Review(db.Model):
     __tablename__ = 'reviews'
+    __table_args__ = (
+        db.Index('ix_reviews_good_id_status', 'good_id', 'status'),
+        db.Index('ix_reviews_good_id_rating', 'good_id', 'rating'),
+        db.Index('ix_reviews_username', 'username'),
+        db.Index('ix_reviews_status_id', 'status', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     good_id = db.Column(db.Integer, nullable=False)
     username = db.Column(db.String(80), nullable=False)
@@ -9,6 +15,20 @@ class Review(db.Model):
     comment = db.Column(db.String(255), nullable=False)
     status = db.Column(db.String(20), default="pending")  # approved, flagged, pending
 
+
+class ReviewStats(db.Model):
+    __tablename__ = 'review_stats'
+    good_id = db.Column(db.Integer, primary_key=True)
+    review_count = db.Column(db.Integer, nullable=False, default=0)
+    rating_sum = db.Column(db.Integer, nullable=False, default=0)
+    rating_1 = db.Column(db.Integer, nullable=False, default=0)
+    rating_2 = db.Column(db.Integer, nullable=False, default=0)
+    rating_3 = db.Column(db.Integer, nullable=False, default=0)
+    rating_4 = db.Column(db.Integer, nullable=False, default=0)
+    rating_5 = db.Column(db.Integer, nullable=False, default=0)
+    approved_count = db.Column(db.Integer, nullable=False, default=0)
+    approved_sum = db.Column(db.Integer, nullable=False, default=0)
+
 """
 The `Review` class represents a review for a product (good) in the system and is used to interact with the `reviews` table in the database.
 
@@ -20,6 +40,12 @@ Attributes:
 - `comment` (str): The text of the review comment (required).
 - `status` (str): The status of the review (default: "pending"). This could be "approved", "flagged", or "pending".
 
+Indexes (managed by the Alembic migrations in `migrations/versions`):
+- `(good_id, status)` serves a product's reviews, optionally filtered by status.
+- `(good_id, rating)` serves a product's reviews sorted by rating.
+- `username` serves a customer's reviews.
+- `(status, id)` serves the moderation queue of pending reviews, oldest first.
+
 Methods:
 - As a model for SQLAlchemy, the `Review` class inherits from `db.Model`, which provides all the necessary CRUD operations (Create, Read, Update, Delete) for interacting with the `reviews` table in the database.
 
@@ -34,3 +60,21 @@ Example:
 
 The `Review` model helps manage user feedback, including the product rating, review comments, and the review's approval status.
 """
+
+"""
+The `ReviewStats` class holds the rating aggregates of one product, stored in the `review_stats` table.
+
+The row is updated incrementally in the same transaction as every review write (submit, update, delete and
+moderation), so a product's rating summary is read with a single primary-key lookup instead of loading its reviews.
+
+Attributes:
+- `good_id` (int): The ID of the product (Primary Key).
+- `review_count` (int): The number of reviews, whatever their status.
+- `rating_sum` (int): The sum of their ratings.
+- `rating_1` ... `rating_5` (int): The number of reviews with each rating.
+- `approved_count` (int): The number of approved reviews.
+- `approved_sum` (int): The sum of the ratings of approved reviews.
+
+Usage:
+- `review_stats.py` applies the changes and rebuilds the table from `reviews` when needed.
+"""
@@ -0,0 +1,131 @@
+from database import db
+from models import Review
+from review_queries import REVIEW_STATUSES
+from review_stats import apply_changes
+
+PENDING = "pending"
+MODERATION_STATUSES = ("approved", "flagged")
+
+DEFAULT_QUEUE_SIZE = 50
+MAX_QUEUE_SIZE = 500
+
+# Largest number of reviews moderated in one batch
+MAX_MODERATION_BATCH = 1000
+
+reviews_table = Review.__table__
+
+def pending_reviews(limit=DEFAULT_QUEUE_SIZE, after=0):
+    """
+    Returns the next pending reviews, oldest first.
+
+    The query is a range read of the `(status, id)` index, so its cost depends on the page size
+    and not on how many approved or flagged reviews the table holds.
+
+    Args:
+        limit (int): The number of reviews to return.
+        after (int): Only reviews with a greater id (the `next_after` of the previous call).
+
+    Returns:
+        list: The pending review rows.
+    """
+    c = reviews_table.c
+    return db.session.execute(
+        db.select(c.id, c.good_id, c.username, c.rating, c.comment, c.status)
+        .where(c.status == PENDING, c.id > after)
+        .order_by(c.id)
+        .limit(limit)
+    ).all()
+
+def moderate_many(review_ids, status):
+    """
+    Sets the status of many reviews in one transaction and updates the rating aggregates.
+
+    Each previous status is changed with its own `UPDATE ... WHERE status = :previous RETURNING`, so
+    every row reports the status it had, and a review moderated concurrently by someone else is
+    counted once in the aggregates.
+
+    Args:
+        review_ids (list): The ids of the reviews.
+        status (str): "approved" or "flagged".
+
+    Returns:
+        list: The changed reviews as `(id, good_id, username)` rows. Reviews that do not exist or
+        already had the status are left out.
+    """
+    c = reviews_table.c
+    changed = []
+    changes = []
+    for previous in REVIEW_STATUSES:
+        if previous == status:
+            continue
+        rows = db.session.execute(
+            db.update(reviews_table)
+            .where(c.id.in_(review_ids), c.status == previous)
+            .values(status=status)
+            .returning(c.id, c.good_id, c.username, c.rating)
+        ).all()
+        changed.extend(rows)
+        changes.extend((row.good_id, (row.rating, previous), (row.rating, status)) for row in rows)
+    apply_changes(changes)
+    db.session.commit()
+    return changed
+
+# Attempts of a guarded review update before it gives up on concurrent writers
+MAX_UPDATE_ATTEMPTS = 3
+
+def update_review(review_id, rating=None, comment=None):
+    """
+    Changes the rating and/or the (encrypted) comment of a review and updates the rating aggregates.
+
+    The `UPDATE` only matches if the review still has the rating and status that were read, like the
+    guard of `moderate_many`, so a review changed concurrently is never counted twice in the aggregates:
+    the review is read again and the update retried.
+
+    Args:
+        review_id (int): The review.
+        rating (int, optional): The new rating.
+        comment (str, optional): The new encrypted comment.
+
+    Returns:
+        Row: The review's `(id, good_id, username)`, or None if it does not exist.
+
+    Raises:
+        RuntimeError: If the review kept changing for `MAX_UPDATE_ATTEMPTS` attempts.
+    """
+    c = reviews_table.c
+    values = {"comment": comment} if comment is not None else {}
+    for _ in range(MAX_UPDATE_ATTEMPTS):
+        review = db.session.execute(
+            db.select(c.id, c.good_id, c.username, c.rating, c.status).where(c.id == review_id)
+        ).first()
+        if review is None:
+            return None
+        new_rating = review.rating if rating is None else rating
+        changed = db.session.execute(
+            db.update(reviews_table)
+            .where(c.id == review_id, c.rating == review.rating, c.status == review.status)
+            .values(rating=new_rating, **values)
+            .returning(c.id, c.good_id, c.username)
+        ).first()
+        if changed is not None:
+            apply_changes([(review.good_id, (review.rating, review.status), (new_rating, review.status))])
+            db.session.commit()
+            return changed
+        db.session.rollback()
+    raise RuntimeError(f"Review {review_id} was changed concurrently")
+
+def delete_review(review_id):
+    """
+    Deletes a review and removes it from the rating aggregates, using the values of the deleted row.
+
+    Returns:
+        Row: The deleted review's `(id, good_id, username)`, or None if it did not exist.
+    """
+    c = reviews_table.c
+    deleted = db.session.execute(
+        db.delete(reviews_table).where(c.id == review_id).returning(c.id, c.good_id, c.username, c.rating, c.status)
+    ).first()
+    if deleted is not None:
+        apply_changes([(deleted.good_id, (deleted.rating, deleted.status), None)])
+    db.session.commit()
+    return deleted
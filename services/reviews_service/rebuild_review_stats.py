@@ -0,0 +1,21 @@
+from app import app
+from review_stats import rebuild_review_stats
+
+def main():
+    with app.app_context():
+        products = rebuild_review_stats()
+    print(f"Rebuilt rating aggregates of {products} products")
+
+if __name__ == "__main__":
+    main()
+
+"""
+Recomputes the `review_stats` table from the `reviews` table.
+
+The aggregates are maintained incrementally by every review write. Run this once after upgrading an existing
+database, and whenever they are suspected to be out of sync (e.g. after editing reviews directly in the database).
+The whole table is recomputed with one aggregate query, in a single transaction.
+
+Usage:
+    python rebuild_review_stats.py
+"""
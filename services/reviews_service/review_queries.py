@@ -0,0 +1,127 @@
+import base64
+import json
+from database import db
+from models import Review
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+# Query parameters that switch the product and customer listings to paginated pages
+PAGE_PARAMS = ("sort", "status", "limit", "cursor")
+
+REVIEW_STATUSES = ("pending", "approved", "flagged")
+
+# Sort orders: the rating column (if any) and whether the order is descending. `id` breaks ties and
+# stands for recency, since review ids only grow.
+SORT_ORDERS = {
+    "newest": (False, True),
+    "highest": (True, True),
+    "lowest": (True, False),
+}
+
+reviews_table = Review.__table__
+
+def wants_page(args):
+    """
+    Tells whether a listing request uses any sort, filter or pagination parameter.
+    """
+    return any(param in args for param in PAGE_PARAMS)
+
+def parse_page_args(args):
+    """
+    Validates the sort, status filter and pagination parameters of the review listings.
+
+    Returns:
+        dict: The parsed parameters.
+
+    Raises:
+        ValueError: If a parameter is invalid.
+    """
+    try:
+        limit = int(args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise ValueError("limit must be an integer")
+    if limit < 1:
+        raise ValueError("limit must be greater than zero")
+    sort = args.get('sort', 'newest')
+    if sort not in SORT_ORDERS:
+        raise ValueError(f"sort must be one of: {', '.join(SORT_ORDERS)}")
+    status = args.get('status') or None
+    if status is not None and status not in REVIEW_STATUSES:
+        raise ValueError(f"status must be one of: {', '.join(REVIEW_STATUSES)}")
+    return {
+        "sort": sort,
+        "status": status,
+        "limit": min(limit, MAX_PAGE_SIZE),
+        "cursor": decode_cursor(args['cursor']) if args.get('cursor') else None,
+    }
+
+def encode_cursor(row, sort):
+    """
+    Encodes the keyset position after `row` as an opaque URL-safe string.
+    """
+    by_rating, _ = SORT_ORDERS[sort]
+    position = [row.rating, row.id] if by_rating else [row.id]
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+def decode_cursor(cursor):
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(position, list) or not position or not all(isinstance(value, int) for value in position):
+        raise ValueError("Invalid cursor")
+    return position
+
+def reviews_page_query(page, good_id=None, username=None):
+    """
+    Builds the keyset-paginated SELECT for a page of a product's or a customer's reviews.
+
+    The filters match the migration-managed indexes: `(good_id, status)` serves a product's reviews
+    (in id order when a status is given), `(good_id, rating)` serves the rating sorts of a product, and
+    `username` serves a customer's reviews in id order.
+
+    Args:
+        page (dict): Parameters returned by `parse_page_args`.
+        good_id (int, optional): Only reviews of this product.
+        username (str, optional): Only reviews by this customer.
+
+    Returns:
+        Select: The query, fetching one row more than the page size to detect the last page.
+    """
+    c = reviews_table.c
+    conditions = []
+    if good_id is not None:
+        conditions.append(c.good_id == good_id)
+    if username is not None:
+        conditions.append(c.username == username)
+    if page["status"] is not None:
+        conditions.append(c.status == page["status"])
+
+    by_rating, descending = SORT_ORDERS[page["sort"]]
+    keys = ([c.rating] if by_rating else []) + [c.id]
+    cursor = page["cursor"]
+    if cursor is not None:
+        if len(cursor) != len(keys):
+            raise ValueError("Cursor does not match the sort order")
+        position = db.tuple_(*keys)
+        conditions.append(position < db.tuple_(*cursor) if descending else position > db.tuple_(*cursor))
+
+    return (
+        db.select(c.id, c.good_id, c.username, c.rating, c.comment, c.status)
+        .where(*conditions)
+        .order_by(*[key.desc() if descending else key for key in keys])
+        .limit(page["limit"] + 1)
+    )
+
+def fetch_page(page, **filters):
+    """
+    Runs `reviews_page_query` and splits off the next cursor.
+
+    Returns:
+        tuple: The rows of the page and the `next_cursor` (None on the last page).
+    """
+    rows = db.session.execute(reviews_page_query(page, **filters)).all()
+    limit = page["limit"]
+    next_cursor = encode_cursor(rows[limit - 1], page["sort"]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
@@ -0,0 +1,108 @@
+from sqlalchemy.dialects.sqlite import insert
+from database import db
+from models import Review, ReviewStats
+
+APPROVED = "approved"
+RATINGS = range(1, 6)
+
+stats_table = ReviewStats.__table__
+reviews_table = Review.__table__
+
+# Counter columns of `review_stats`, incremented or decremented by every review write
+COUNTER_COLUMNS = ["review_count", "rating_sum"] + [f"rating_{rating}" for rating in RATINGS] + ["approved_count", "approved_sum"]
+
+def contribution(rating, status, sign=1):
+    """
+    Returns what one review adds to (sign=1) or removes from (sign=-1) its product's counters.
+    """
+    approved = status == APPROVED
+    values = {
+        "review_count": sign,
+        "rating_sum": sign * rating,
+        "approved_count": sign if approved else 0,
+        "approved_sum": sign * rating if approved else 0,
+    }
+    for value in RATINGS:
+        values[f"rating_{value}"] = sign if value == rating else 0
+    return values
+
+def apply_change(good_id, removed=None, added=None):
+    """
+    Updates the aggregates of a product in the current transaction, without committing.
+
+    The change is one `INSERT ... ON CONFLICT DO UPDATE SET column = column + delta`, so concurrent
+    writes never lose an update.
+
+    Args:
+        good_id (int): The product.
+        removed (tuple, optional): `(rating, status)` of the review before the write.
+        added (tuple, optional): `(rating, status)` of the review after the write.
+    """
+    apply_changes([(good_id, removed, added)])
+
+def apply_changes(changes):
+    """
+    Applies the changes of many reviews in the current transaction, without committing.
+
+    Deltas are summed per product first, so a batch costs one upsert per product rather than per review.
+
+    Args:
+        changes (list): `(good_id, removed, added)` tuples, as the arguments of `apply_change`.
+    """
+    deltas = {}
+    for good_id, removed, added in changes:
+        delta = deltas.setdefault(good_id, dict.fromkeys(COUNTER_COLUMNS, 0))
+        for change, sign in ((removed, -1), (added, 1)):
+            if change is not None:
+                for column, value in contribution(*change, sign=sign).items():
+                    delta[column] += value
+
+    for good_id, delta in deltas.items():
+        if not any(delta.values()):
+            continue
+        stmt = insert(stats_table).values(good_id=good_id, **delta)
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=[stats_table.c.good_id],
+            set_={column: stats_table.c[column] + stmt.excluded[column] for column in COUNTER_COLUMNS}
+        ))
+
+def review_summary(good_id):
+    """
+    Reads the rating summary of a product with one primary-key lookup.
+
+    Returns:
+        dict: The review count, the average rating, the 1-5 histogram and the approved-only count and average.
+    """
+    row = db.session.get(ReviewStats, good_id)
+    counters = {column: getattr(row, column) if row else 0 for column in COUNTER_COLUMNS}
+    return {
+        "good_id": good_id,
+        "review_count": counters["review_count"],
+        "average_rating": round(counters["rating_sum"] / counters["review_count"], 2) if counters["review_count"] else None,
+        "histogram": {str(rating): counters[f"rating_{rating}"] for rating in RATINGS},
+        "approved_count": counters["approved_count"],
+        "approved_average_rating": round(counters["approved_sum"] / counters["approved_count"], 2) if counters["approved_count"] else None,
+    }
+
+def rebuild_review_stats():
+    """
+    Recomputes every product's aggregates from the `reviews` table in one transaction.
+
+    Returns:
+        int: The number of products with reviews.
+    """
+    approved = reviews_table.c.status == APPROVED
+    rating = reviews_table.c.rating
+    aggregates = db.select(
+        reviews_table.c.good_id,
+        db.func.count(),
+        db.func.sum(rating),
+        *[db.func.sum(db.case((rating == value, 1), else_=0)) for value in RATINGS],
+        db.func.sum(db.case((approved, 1), else_=0)),
+        db.func.sum(db.case((approved, rating), else_=0)),
+    ).group_by(reviews_table.c.good_id)
+
+    db.session.execute(db.delete(stats_table))
+    result = db.session.execute(db.insert(stats_table).from_select(["good_id"] + COUNTER_COLUMNS, aggregates))
+    db.session.commit()
+    return result.rowcount
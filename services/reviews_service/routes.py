@@ -1,13 +1,42 @@
 from flask_restful import Api, Resource
 from models import Review
 from database import db
-from flask import request, jsonify
-from utils import log_to_audit, encrypt_data, decrypt_data, breaker
+import io
+from flask import request, jsonify, Response, stream_with_context
+from utils import log_to_audit, encrypt_data, decrypt_data, decrypt_many, breaker
+from etag import conditional, generations
+from review_stats import apply_change, review_summary
+from review_queries import wants_page, parse_page_args, fetch_page
+from bulk_reviews import import_reviews, export_reviews, FORMATS, NDJSON, CSV, IMPORT_CHUNK_SIZE
+from moderation import pending_reviews, moderate_many, update_review, delete_review, MODERATION_STATUSES, DEFAULT_QUEUE_SIZE, MAX_QUEUE_SIZE, MAX_MODERATION_BATCH
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address  # Import the correct key function
 
 api = Api()
 
+def reviews_page(fields, **filters):
+    """
+    Returns one keyset-paginated page of reviews, decrypting only the comments of that page.
+
+    Args:
+        fields (list): The review fields to return besides `comment`.
+        **filters: `good_id` or `username`.
+    """
+    try:
+        page = parse_page_args(request.args)
+        rows, next_cursor = fetch_page(page, **filters)
+    except ValueError as e:
+        return {"error": str(e)}, 400
+    comments = decrypt_many([row.comment for row in rows])
+    reviews = [dict({field: getattr(row, field) for field in fields}, comment=comment) for row, comment in zip(rows, comments)]
+    return {"reviews": reviews, "next_cursor": next_cursor}, 200
+
+def review_changed(review):
+    """
+    Bumps the generations of every read resource that shows the review. Call it after the commit.
+    """
+    generations.bump(f"reviews:product:{review.good_id}", f"reviews:customer:{review.username}", f"reviews:review:{review.id}")
+
 # Initialize Limiter with a key function
 limiter = Limiter(key_func=get_remote_address)
 
@@ -57,7 +86,10 @@ class SubmitReview(Resource):
         encrypted_comment = encrypt_data(comment)
         review = Review(good_id=good_id, username=username, rating=rating, comment=encrypted_comment)
         db.session.add(review)
+        db.session.flush()
+        apply_change(good_id, added=(review.rating, review.status))
         db.session.commit()
+        review_changed(review)
 
         log_to_audit("reviews_service", "/reviews", "success", f"Review submitted for good_id {good_id} by {username}")
         return {"message": "Review submitted successfully"}, 201
@@ -85,25 +117,25 @@ class UpdateReview(Resource):
           {
             "error": "Review not found"
           }
+        - 409 Conflict: The review kept changing concurrently.
 
         This endpoint allows users to update the rating and/or comment of an existing review. 
         The comment is encrypted before storing in the database.
         """
         data = request.json
-        review = Review.query.get(review_id)
+        if "rating" in data and not (1 <= data['rating'] <= 5):
+            return {"error": "Rating must be between 1 and 5"}, 400
+
+        comment = encrypt_data(data['comment']) if "comment" in data else None
+        try:
+            review = update_review(review_id, rating=data.get('rating'), comment=comment)
+        except RuntimeError as e:
+            return {"error": f"{e}; retry"}, 409
         if not review:
             log_to_audit("reviews_service", f"/reviews/{review_id}", "error", "Review not found")
             return {"error": "Review not found"}, 404
 
-        if "rating" in data:
-            if not (1 <= data['rating'] <= 5):
-                return {"error": "Rating must be between 1 and 5"}, 400
-            review.rating = data['rating']
-
-        if "comment" in data:
-            review.comment = encrypt_data(data['comment'])
-
-        db.session.commit()
+        review_changed(review)
         log_to_audit("reviews_service", f"/reviews/{review_id}", "success", f"Review {review_id} updated")
         return {"message": "Review updated successfully"}, 200
 
@@ -127,23 +159,30 @@ class DeleteReview(Resource):
 
         This endpoint deletes a specific review from the database.
         """
-        review = Review.query.get(review_id)
+        review = delete_review(review_id)
         if not review:
             log_to_audit("reviews_service", f"/reviews/{review_id}", "error", "Review not found")
             return {"error": "Review not found"}, 404
 
-        db.session.delete(review)
-        db.session.commit()
+        review_changed(review)
         log_to_audit("reviews_service", f"/reviews/{review_id}", "success", f"Review {review_id} deleted")
         return {"message": "Review deleted successfully"}, 200
 
 class GetProductReviews(Resource):
     decorators = [limiter.limit("20/minute")]  # Limit this endpoint to 20 requests per minute
 
+    # Per-process generation: run one worker, or a write handled by another worker is answered with a stale 304
+    @conditional("reviews:product:{good_id}")
     @breaker
     def get(self, good_id):
         """
-        Retrieves all reviews for a specific product.
+        Retrieves all reviews for a specific product, or one sorted page of them.
+
+        Query Parameters (all optional):
+            sort (str): `newest` (default), `highest` or `lowest` rated.
+            status (str): Only reviews with this status ("pending", "approved" or "flagged").
+            limit (int): Page size (default 20, maximum 100).
+            cursor (str): The `next_cursor` of the previous page.
 
         Response:
         - 200 OK: List of reviews for the product.
@@ -160,21 +199,28 @@ class GetProductReviews(Resource):
           {
             "message": "No reviews found for the product"
           }
+        - With any query parameter, 200 OK with one page: {"reviews": [...], "next_cursor": "string or null"},
+          or 400 Bad Request for invalid parameters. Pages are read through the `(good_id, status)` and
+          `(good_id, rating)` indexes.
 
         This endpoint retrieves reviews for a specific product identified by `good_id`. The comment is decrypted before returning.
+        Responses carry an ETag and Last-Modified; a matching conditional request gets 304 Not Modified without a query.
         """
+        if wants_page(request.args):
+            return reviews_page(['id', 'username', 'rating', 'status'], good_id=good_id)
         try:
             reviews = Review.query.filter_by(good_id=good_id).all()
             if not reviews:
                 return {"message": "No reviews found for the product"}, 404
 
+            comments = decrypt_many([review.comment for review in reviews])
             response = [{
                 'id': review.id,
                 'username': review.username,
                 'rating': review.rating,
-                'comment': decrypt_data(review.comment),
+                'comment': comment,
                 'status': review.status
-            } for review in reviews]
+            } for review, comment in zip(reviews, comments)]
 
             log_to_audit("reviews_service", f"/reviews/product/{good_id}", "success", f"Retrieved reviews for good_id {good_id}")
             return jsonify(response)
@@ -182,13 +228,43 @@ class GetProductReviews(Resource):
             log_to_audit("reviews_service", f"/reviews/product/{good_id}", "error", f"Error occurred: {str(e)}")
             return {"error": f"An unexpected error occurred: {str(e)}"}, 500
 
+class GetProductReviewSummary(Resource):
+    decorators = [limiter.limit("60/minute")]  # Limit this endpoint to 60 requests per minute
+
+    # Per-process generation, like `GetProductReviews`
+    @conditional("reviews:product:{good_id}")
+    @breaker
+    def get(self, good_id):
+        """
+        Retrieves the rating summary of a product.
+
+        Response:
+        - 200 OK: The aggregates of the product's reviews (zero counts if it has none).
+          {
+            "good_id": "int",
+            "review_count": "int",
+            "average_rating": "float or null",
+            "histogram": {"1": "int", "2": "int", "3": "int", "4": "int", "5": "int"},
+            "approved_count": "int",
+            "approved_average_rating": "float or null"
+          }
+
+        The summary is read from the `review_stats` row of the product, which every review write keeps up to
+        date, so it costs one primary-key lookup however many reviews the product has.
+        """
+        return review_summary(good_id), 200
+
 class GetCustomerReviews(Resource):
     decorators = [limiter.limit("10/minute")]  # Limit this endpoint to 10 requests per minute
 
+    # Per-process generation, like `GetProductReviews`
+    @conditional("reviews:customer:{username}")
     @breaker
     def get(self, username):
         """
-        Retrieves all reviews for a specific customer.
+        Retrieves all reviews for a specific customer, or one sorted page of them.
+
+        Query Parameters (all optional): `sort`, `status`, `limit` and `cursor`, as for the product reviews.
 
         Response:
         - 200 OK: List of reviews for the customer.
@@ -202,16 +278,22 @@ class GetCustomerReviews(Resource):
             }
           ]
 
+        With any query parameter, returns one page: {"reviews": [...], "next_cursor": "string or null"},
+        read through the `username` index.
+
         This endpoint retrieves all reviews submitted by a specific customer, identified by `username`.
         """
+        if wants_page(request.args):
+            return reviews_page(['id', 'good_id', 'rating', 'status'], username=username)
         reviews = Review.query.filter_by(username=username).all()
+        comments = decrypt_many([review.comment for review in reviews])
         response = [{
             'id': review.id,
             'good_id': review.good_id,
             'rating': review.rating,
-            'comment': decrypt_data(review.comment),
+            'comment': comment,
             'status': review.status
-        } for review in reviews]
+        } for review, comment in zip(reviews, comments)]
 
         log_to_audit("reviews_service", f"/reviews/customer/{username}", "success", f"Retrieved reviews for {username}")
         return jsonify(response)
@@ -250,8 +332,11 @@ class ModerateReview(Resource):
         if status not in ["approved", "flagged"]:
             return {"error": "Invalid status"}, 400
 
-        review = Review.query.get(review_id)
-        if not review:
+        # Guarded like a batch: the aggregates change only if this call changed the status
+        changed = moderate_many([review_id], status)
+        if changed:
+            review_changed(changed[0])
+        elif db.session.get(Review, review_id) is None:
             log_to_audit(
                 service_name="reviews_service",
                 endpoint=f"/reviews/moderate/{review_id}",
@@ -260,8 +345,6 @@ class ModerateReview(Resource):
             )
             return {"error": "Review not found"}, 404
 
-        review.status = status
-        db.session.commit()
         log_to_audit(
             service_name="reviews_service",
             endpoint=f"/reviews/moderate/{review_id}",
@@ -270,9 +353,175 @@ class ModerateReview(Resource):
         )
         return {"message": "Review status updated successfully"}, 200
 
+class ModerationQueue(Resource):
+    decorators = [limiter.limit("60/minute")]  # Limit this endpoint to 60 requests per minute
+
+    @breaker
+    def get(self):
+        """
+        Retrieves the next pending reviews to moderate, oldest first.
+
+        Query Parameters:
+            limit (int, optional): The number of reviews (default 50, maximum 500).
+            after (int, optional): The `next_after` of the previous call, to read past reviews already fetched.
+
+        Response:
+        - 200 OK:
+          {
+            "reviews": [{"id": "int", "good_id": "int", "username": "string", "rating": "int", "comment": "string"}],
+            "next_after": "int or null"
+          }
+        - 400 Bad Request: Invalid `limit` or `after`.
+
+        The queue is read from the `(status, id)` index, so it stays fast however many reviews were already moderated.
+        """
+        try:
+            limit = min(int(request.args.get('limit', DEFAULT_QUEUE_SIZE)), MAX_QUEUE_SIZE)
+            after = int(request.args.get('after', 0))
+        except ValueError:
+            return {"error": "limit and after must be integers"}, 400
+        if limit < 1:
+            return {"error": "limit must be greater than zero"}, 400
+
+        rows = pending_reviews(limit, after)
+        comments = decrypt_many([row.comment for row in rows])
+        reviews = [{
+            'id': row.id,
+            'good_id': row.good_id,
+            'username': row.username,
+            'rating': row.rating,
+            'comment': comment
+        } for row, comment in zip(rows, comments)]
+
+        log_to_audit("reviews_service", "/reviews/moderation/queue", "success", f"Fetched {len(reviews)} pending reviews")
+        return {"reviews": reviews, "next_after": rows[-1].id if len(rows) == limit else None}, 200
+
+class ModerateReviews(Resource):
+    decorators = [limiter.limit("30/minute")]  # Limit this endpoint to 30 requests per minute
+
+    @breaker
+    def post(self):
+        """
+        Approves or flags many reviews in one transaction.
+
+        Request Body:
+        {
+            "ids": ["int"],
+            "status": "string"  # "approved" or "flagged"
+        }
+
+        Response:
+        - 200 OK: The reviews were moderated.
+          {
+            "updated": ["int"],
+            "skipped": ["int"]  # reviews that do not exist or already had the status
+          }
+        - 400 Bad Request: Invalid status, or `ids` is not a list of at most 1000 integers.
+
+        The rating aggregates of the affected products are updated in the same transaction.
+        """
+        data = request.json or {}
+        status = data.get('status')
+        review_ids = data.get('ids')
+        if status not in MODERATION_STATUSES:
+            return {"error": "Invalid status"}, 400
+        if not isinstance(review_ids, list) or not review_ids or not all(isinstance(review_id, int) for review_id in review_ids):
+            return {"error": "ids must be a non-empty list of review ids"}, 400
+        if len(review_ids) > MAX_MODERATION_BATCH:
+            return {"error": f"At most {MAX_MODERATION_BATCH} reviews can be moderated at once"}, 400
+
+        changed = moderate_many(review_ids, status)
+        for row in changed:
+            review_changed(row)
+        updated = {row.id for row in changed}
+
+        log_to_audit("reviews_service", "/reviews/moderation/batch", "success", f"Moderated {len(updated)} reviews to status {status}")
+        return {"updated": sorted(updated), "skipped": [review_id for review_id in dict.fromkeys(review_ids) if review_id not in updated]}, 200
+
+class ImportReviews(Resource):
+    decorators = [limiter.limit("5/minute")]  # Limit this endpoint to 5 requests per minute
+
+    def post(self):
+        """
+        Imports reviews in bulk from an NDJSON or CSV request body.
+
+        Query Parameters:
+            format (str, optional): "ndjson" (default, one review object per line) or "csv" (with a header row).
+            chunk_size (int, optional): Reviews encrypted and inserted per transaction (default 1000).
+
+        Each review has `good_id`, `username`, `rating`, `comment` and optionally `status` (default "pending").
+
+        Response:
+        - 200 OK: The import summary. Invalid rows are skipped, not fatal.
+          {
+            "imported": "int",
+            "rejected": "int",
+            "errors": [{"line": "int", "error": "string"}],  # the first 100 rejected rows
+            "seconds": "float",
+            "rows_per_second": "float"
+          }
+        - 400 Bad Request: Invalid `format` or `chunk_size`.
+
+        The body is read as a stream, so its size is not bounded by memory. Every chunk is committed on its
+        own: if the import fails midway, the chunks before the failure stay imported.
+        """
+        fmt = request.args.get('format', NDJSON)
+        if fmt not in FORMATS:
+            return {"error": f"format must be one of: {', '.join(FORMATS)}"}, 400
+        try:
+            chunk_size = int(request.args.get('chunk_size', IMPORT_CHUNK_SIZE))
+        except ValueError:
+            return {"error": "chunk_size must be an integer"}, 400
+        if chunk_size < 1:
+            return {"error": "chunk_size must be greater than zero"}, 400
+
+        lines = io.TextIOWrapper(request.stream, encoding="utf-8", newline="" if fmt == CSV else None)
+        result = import_reviews(lines, fmt, chunk_size)
+
+        log_to_audit(
+            "reviews_service", "/reviews/bulk/import", "success",
+            f"Imported {result['imported']} reviews ({result['rejected']} rejected) at {result['rows_per_second']} rows/s"
+        )
+        return result, 200
+
+class ExportReviews(Resource):
+    decorators = [limiter.limit("5/minute")]  # Limit this endpoint to 5 requests per minute
+
+    def get(self):
+        """
+        Streams every review, or every review of one product, oldest first.
+
+        Query Parameters:
+            format (str, optional): "ndjson" (default) or "csv" (with a header row).
+            good_id (int, optional): Only export the reviews of this product.
+
+        Response:
+        - 200 OK: The reviews, with `id`, `good_id`, `username`, `rating`, `comment` and `status`, streamed
+          in chunks as they are read and decrypted.
+        - 400 Bad Request: Invalid `format` or `good_id`.
+        """
+        fmt = request.args.get('format', NDJSON)
+        if fmt not in FORMATS:
+            return {"error": f"format must be one of: {', '.join(FORMATS)}"}, 400
+        try:
+            good_id = int(request.args['good_id']) if 'good_id' in request.args else None
+        except ValueError:
+            return {"error": "good_id must be an integer"}, 400
+
+        def stream():
+            progress = {"exported": 0, "rows_per_second": 0.0}
+            yield from export_reviews(fmt, good_id, progress=progress.update)
+            log_to_audit("reviews_service", "/reviews/bulk/export", "success",
+                         f"Exported {progress['exported']} reviews at {progress['rows_per_second']} rows/s")
+
+        mimetype = "text/csv" if fmt == CSV else "application/x-ndjson"
+        return Response(stream_with_context(stream()), mimetype=mimetype)
+
 class GetReviewDetails(Resource):
     decorators = [limiter.limit("10/minute")]  # Limit this endpoint to 10 requests per minute
 
+    # Per-process generation, like `GetProductReviews`
+    @conditional("reviews:review:{review_id}")
     @breaker
     def get(self, review_id):
         """
@@ -327,6 +576,11 @@ api.add_resource(SubmitReview, '/reviews')
 api.add_resource(UpdateReview, '/reviews/<int:review_id>')
 api.add_resource(DeleteReview, '/reviews/<int:review_id>')
 api.add_resource(GetProductReviews, '/reviews/product/<int:good_id>')
+api.add_resource(GetProductReviewSummary, '/reviews/product/<int:good_id>/summary')
 api.add_resource(GetCustomerReviews, '/reviews/customer/<string:username>')
 api.add_resource(ModerateReview, '/reviews/moderate/<int:review_id>')
+api.add_resource(ModerationQueue, '/reviews/moderation/queue')
+api.add_resource(ModerateReviews, '/reviews/moderation/batch')
+api.add_resource(ImportReviews, '/reviews/bulk/import')
+api.add_resource(ExportReviews, '/reviews/bulk/export')
 api.add_resource(GetReviewDetails, '/reviews/details/<int:review_id>')
@@ -1,19 +1,37 @@
+import os
 import requests
 from datetime import datetime
 import logging
 from pybreaker import CircuitBreaker
 from cryptography.fernet import Fernet
+from batch_crypto import create_batch_crypto
+from decrypt_cache import DecryptCache
+from service_client import create_service_client
 
 with open("secret.key", "rb") as key_file:
     encryption_key = key_file.read()
 cipher = Fernet(encryption_key)
 
+# Batch decryption helper used by the list endpoints
+batch_crypto = create_batch_crypto()
+
+# LRU cache of decrypted values keyed by ciphertext, bound once to the key, which is fixed for the life of the process
+decrypt_cache = DecryptCache(
+    max_entries=int(os.getenv("DECRYPT_CACHE_MAX_ENTRIES", 10000)),
+    max_bytes=int(os.getenv("DECRYPT_CACHE_MAX_BYTES", 16 * 1024 * 1024)),
+    ttl=float(os.getenv("DECRYPT_CACHE_TTL")) if os.getenv("DECRYPT_CACHE_TTL") else None
+)
+decrypt_cache.bind_key(encryption_key)
+
 # Set up logging configuration
 logging.basicConfig(level=logging.INFO)
 
 # Circuit Breaker Configuration
 breaker = CircuitBreaker(fail_max=5, reset_timeout=60)
 
+# Pooled keep-alive HTTP client shared by every call to another service
+service_client = create_service_client()
+
 # Audit Logging Function
 def log_to_audit(service_name, endpoint, status, details):
     """
@@ -34,7 +52,7 @@ def log_to_audit(service_name, endpoint, status, details):
 
 # Cross-Service API Call Helper
 @breaker
-def call_service_api(method, url, payload=None):
+def call_service_api(method, url, payload=None, timeout=None, idempotent=None):
     """
     Makes an HTTP request to an external service.
 
@@ -42,26 +60,22 @@ def call_service_api(method, url, payload=None):
         method (str): The HTTP method to use for the request (GET, POST, PUT, DELETE).
         url (str): The URL of the external service endpoint.
         payload (dict, optional): The data to send with the request (for POST/PUT methods). Defaults to None.
+        timeout (tuple, optional): `(connect, read)` timeouts in seconds, overriding the client defaults.
+        idempotent (bool, optional): Whether the call may be retried. Defaults to True for GET only.
 
     Returns:
         Response: The response object from the HTTP request.
 
     Description:
-        This function makes an HTTP request to an external service and logs the request details 
-        and response status using the `log_to_audit` function. It is protected with a circuit breaker 
-        to manage retries in case of failures.
+        This function makes an HTTP request to an external service through the shared `service_client`
+        (pooled keep-alive connections, timeouts and jittered retries for idempotent calls) and logs the
+        request details and response status using the `log_to_audit` function. It is protected with a
+        circuit breaker to manage retries in case of failures.
     """
     try:
-        if method == "GET":
-            response = requests.get(url)
-        elif method == "POST":
-            response = requests.post(url, json=payload)
-        elif method == "PUT":
-            response = requests.put(url, json=payload)
-        elif method == "DELETE":
-            response = requests.delete(url)
-        else:
+        if method not in ("GET", "POST", "PUT", "DELETE"):
             raise ValueError("Invalid HTTP method")
+        response = service_client.request(method, url, json=payload, timeout=timeout, idempotent=idempotent)
 
         log_to_audit("reviews_service", url, response.status_code, f"Method: {method}, Payload: {payload}")
         return response
@@ -88,6 +102,22 @@ def encrypt_data(data):
         data = data.encode('utf-8')
     return cipher.encrypt(data).decode('utf-8')
 
+def encrypt_many(values):
+    """
+    Encrypts a list of values in one batch.
+
+    Args:
+        values (list): The strings to encrypt.
+
+    Returns:
+        list: The encrypted strings, in the same order.
+
+    Description:
+        This function encrypts every value with the same key as `encrypt_data`. Large lists are split
+        across the `batch_crypto` worker pool instead of being encrypted one value at a time.
+    """
+    return batch_crypto.encrypt_many(values, [encryption_key])
+
 def decrypt_data(encrypted_data):
     """
     Decrypts the given data using Fernet encryption.
@@ -100,6 +130,36 @@ def decrypt_data(encrypted_data):
 
     Description:
         This function decrypts the input encrypted data using the Fernet symmetric decryption algorithm.
-        The encrypted data must be in string format.
+        The encrypted data must be in string format. Values already decrypted with the current key
+        are served from `decrypt_cache`.
+    """
+    cached = decrypt_cache.get(encrypted_data)
+    if cached is not None:
+        return cached
+    decrypted_data = cipher.decrypt(encrypted_data.encode('utf-8')).decode('utf-8')
+    decrypt_cache.put(encrypted_data, decrypted_data)
+    return decrypted_data
+
+def decrypt_many(encrypted_values):
+    """
+    Decrypts a list of encrypted values in one batch.
+
+    Args:
+        encrypted_values (list): The encrypted strings to decrypt.
+
+    Returns:
+        list: The decrypted strings, in the same order.
+
+    Description:
+        This function decrypts every value with the same key as `decrypt_data`. Values found in
+        `decrypt_cache` skip the crypto entirely; the misses are decrypted together, and large lists of
+        misses are split across the `batch_crypto` worker pool instead of being decrypted one row at a time.
     """
-    return cipher.decrypt(encrypted_data.encode('utf-8')).decode('utf-8')
+    results = [decrypt_cache.get(value) if value is not None else None for value in encrypted_values]
+    misses = [index for index, value in enumerate(encrypted_values) if value is not None and results[index] is None]
+    if misses:
+        decrypted = batch_crypto.decrypt_many([encrypted_values[index] for index in misses], [encryption_key])
+        for index, value in zip(misses, decrypted):
+            decrypt_cache.put(encrypted_values[index], value)
+            results[index] = value
+    return results
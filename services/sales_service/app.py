@@ -1,19 +1,24 @@
+import os
 from flask import Flask, jsonify
 from database import db
 from routes import api
-from flask_limiter import Limiter
-from flask_limiter.util import get_remote_address
 from pybreaker import CircuitBreaker
+from extensions import limiter  # Import limiter from extensions.py
+from idempotency import idempotency_store
+from etag import generations
+import table_versions
 
 # Flask App Initialization
 app = Flask(__name__)
 
 # Configuration
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///sales.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('SALES_DATABASE_URI', 'sqlite:///sales.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['CIRCUIT_BREAKER_FAIL_MAX'] = 5
 app.config['CIRCUIT_BREAKER_RESET_TIMEOUT'] = 60
 app.config['RATE_LIMITS'] = ["200 per day", "50 per hour"]
+app.config['IDEMPOTENCY_TTL'] = 24 * 3600  # Seconds a response to an Idempotency-Key request is replayed
+app.config['IDEMPOTENCY_EVICTION_INTERVAL'] = 300
 
 # Circuit Breaker Configuration
 circuit_breaker = CircuitBreaker(
@@ -22,15 +27,18 @@ circuit_breaker = CircuitBreaker(
 )
 
 # Rate Limiter Configuration
-limiter = Limiter(
-    app,
-    key_func=get_remote_address,
-    default_limits=app.config['RATE_LIMITS']
-)
+app.config['RATELIMIT_DEFAULT'] = "; ".join(app.config['RATE_LIMITS'])
+app.config['RATELIMIT_ENABLED'] = os.getenv('RATELIMIT_ENABLED', 'true').lower() == 'true'
+limiter.init_app(app)
 
 # Initialize extensions
 db.init_app(app)
 api.init_app(app)
+idempotency_store.init_app(app)
+table_versions.init_app(app)
+
+# The goods table is also written outside this process, so its generation is read from the database
+generations.track("goods", lambda: table_versions.table_version("goods"))
 
 @app.errorhandler(429)
 def ratelimit_exceeded(e):
@@ -0,0 +1,296 @@
+import asyncio
+import json
+import logging
+import os
+from datetime import datetime
+import httpx
+from app import app
+from database import db
+from idempotency import idempotency_store, IDEMPOTENCY_HEADER, MAX_KEY_LENGTH
+from models import Good, Sale
+from routes import CUSTOMERS_SERVICE_URL, derive_debit_key
+from rollups import record_sales
+from utils import log_to_audit
+
+goods_table = Good.__table__
+sales_table = Sale.__table__
+
+# Largest request body accepted by the ASGI entry point
+MAX_BODY_BYTES = 64 * 1024
+
+PURCHASE_PATH = "/sales/purchase"
+
+class AsyncCheckout:
+    """
+    Asynchronous implementation of `POST /sales/purchase`.
+
+    The synchronous `MakeSale` view ties up a worker thread for the whole purchase. Here every
+    network call is awaited on an `httpx.AsyncClient` with pooled keep-alive connections, so one
+    worker handles many checkouts at once, and the steps that do not depend on each other overlap:
+    the conditional stock decrement runs while the wallet debit is in flight. If one of the two
+    fails, the other is compensated (stock is put back or the debit is refunded).
+
+    Like `MakeSale`, a request with an `Idempotency-Key` runs at most once (see `application`) and
+    sends a key derived from it with the wallet debit, which a refund releases again.
+
+    Database work stays on the synchronous engine and runs in the default thread pool.
+
+    Args:
+        engine (Engine): The sales database engine.
+        customers_url (str): Base URL of the customers service.
+        max_connections (int): Size of the connection pool to the customers service.
+        connect_timeout (float): Seconds to wait for a connection.
+        read_timeout (float): Seconds to wait for a response.
+    """
+
+    def __init__(self, engine, customers_url, max_connections=100, connect_timeout=1.0, read_timeout=5.0):
+        self.engine = engine
+        self.customers_url = customers_url
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(base_url=self.customers_url, limits=self.limits, timeout=self.timeout)
+        return self._client
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    # Database steps, run in worker threads
+
+    def _get_price(self, good_id):
+        with self.engine.connect() as connection:
+            return connection.execute(
+                db.select(goods_table.c.price).where(goods_table.c.id == good_id)
+            ).scalar()
+
+    def _reserve_stock(self, good_id, quantity):
+        with self.engine.begin() as connection:
+            reserved = connection.execute(
+                db.update(goods_table)
+                .where(goods_table.c.id == good_id, goods_table.c.stock_count >= quantity)
+                .values(stock_count=goods_table.c.stock_count - quantity)
+                .returning(goods_table.c.id)
+            ).first()
+        return reserved is not None
+
+    def _release_stock(self, good_id, quantity):
+        with self.engine.begin() as connection:
+            connection.execute(
+                db.update(goods_table)
+                .where(goods_table.c.id == good_id)
+                .values(stock_count=goods_table.c.stock_count + quantity)
+            )
+
+    def _record_sale(self, good_id, username, quantity, price):
+        timestamp = datetime.utcnow()
+        with self.engine.begin() as connection:
+            connection.execute(db.insert(sales_table).values(good_id=good_id, username=username, quantity=quantity, timestamp=timestamp))
+            record_sales(username, [(good_id, quantity, price)], timestamp, connection=connection)
+
+    # Customers service steps
+
+    async def _debit(self, username, amount, reference, debit_key=None):
+        return await self.client.post(
+            f"/customers/username/{username}/wallet/debit",
+            json={"amount": amount, "reference": reference},
+            headers={IDEMPOTENCY_HEADER: debit_key} if debit_key else None
+        )
+
+    async def _refund(self, debit, amount, debit_key=None):
+        """
+        Refunds a debit by its ledger entry, at most once (see `routes.refund_wallet`). Failures are logged
+        and audited for reconciliation, never raised.
+        """
+        customer_id, ledger_id = debit["id"], debit.get("ledger_id")
+        try:
+            response = await self.client.post(
+                f"/customers/{customer_id}/wallet/refund",
+                json={"ledger_id": ledger_id, "debit_key": debit_key},
+                headers={IDEMPOTENCY_HEADER: f"sales:refund:{ledger_id}"}
+            )
+            if response.status_code == 200:
+                return
+            error = f"status {response.status_code}"
+        except httpx.HTTPError as e:
+            error = str(e) or type(e).__name__
+        details = f"Refund of {amount} to customer {customer_id} (ledger entry {ledger_id}) failed: {error}; reconcile manually"
+        logging.error(details)
+        log_to_audit("sales_service", PURCHASE_PATH, "error", details)
+
+    async def purchase(self, username, good_id, quantity, debit_key=None):
+        """
+        Processes one purchase.
+
+        Args:
+            debit_key (str, optional): The `Idempotency-Key` of the wallet debit (see `routes.derive_debit_key`).
+
+        Returns:
+            tuple: The response body and HTTP status, with the same meaning as `MakeSale.post`.
+        """
+        price = await asyncio.to_thread(self._get_price, good_id)
+        if price is None:
+            return {"error": "Good not found"}, 404
+
+        total_cost = price * quantity
+        reference = f"good:{good_id}x{quantity}"
+        reserved, debit = await asyncio.gather(
+            asyncio.to_thread(self._reserve_stock, good_id, quantity),
+            self._debit(username, total_cost, reference, debit_key),
+            return_exceptions=True
+        )
+
+        if isinstance(reserved, Exception):
+            if not isinstance(debit, Exception) and debit.status_code == 200:
+                await self._refund(debit.json(), total_cost, debit_key)
+            return {"error": f"Failed to reserve stock: {reserved}"}, 500
+
+        if isinstance(debit, Exception) or debit.status_code != 200:
+            if reserved:
+                await asyncio.to_thread(self._release_stock, good_id, quantity)
+            if isinstance(debit, Exception):
+                return {"error": f"Error communicating with Customers Service: {debit}"}, 500
+            if debit.status_code == 404:
+                return {"error": "Customer not found"}, 404
+            if debit.status_code == 400:
+                return {"error": "Insufficient wallet balance"}, 400
+            return {"error": "Failed to update wallet balance"}, 500
+
+        if not reserved:
+            await self._refund(debit.json(), total_cost, debit_key)
+            return {"error": "Not enough stock available"}, 400
+
+        try:
+            await asyncio.to_thread(self._record_sale, good_id, username, quantity, price)
+        except Exception as e:
+            await asyncio.to_thread(self._release_stock, good_id, quantity)
+            await self._refund(debit.json(), total_cost, debit_key)
+            return {"error": f"Failed to record sale: {e}"}, 500
+
+        log_to_audit("sales_service", PURCHASE_PATH, "success", f"Processed sale for {username}, good ID {good_id}")
+        return {"message": "Sale completed successfully"}, 201
+
+with app.app_context():
+    checkout = AsyncCheckout(
+        db.engine,
+        CUSTOMERS_SERVICE_URL,
+        max_connections=int(os.getenv("ASYNC_CHECKOUT_MAX_CONNECTIONS", 100)),
+        connect_timeout=float(os.getenv("SERVICE_CONNECT_TIMEOUT", 1.0)),
+        read_timeout=float(os.getenv("SERVICE_READ_TIMEOUT", 5.0))
+    )
+
+async def read_body(receive):
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if len(body) > MAX_BODY_BYTES:
+            raise ValueError("Request body too large")
+        if not message.get("more_body"):
+            break
+    return body
+
+async def send_body(send, status, body, headers=()):
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()), *headers]
+    })
+    await send({"type": "http.response.body", "body": body})
+
+async def send_json(send, status, payload):
+    await send_body(send, status, json.dumps(payload).encode())
+
+# The idempotency store works on the Flask-SQLAlchemy session, so its calls run in an app context
+
+def claim_key(key, scope, body):
+    with app.app_context():
+        return idempotency_store.claim(key, scope, body)
+
+def finish_key(key, scope, status, body):
+    with app.app_context():
+        idempotency_store.finish(key, scope, status, body)
+
+async def handle_purchase(body, debit_key=None):
+    """
+    Validates a purchase request body and processes the purchase.
+
+    Returns:
+        tuple: The response body and HTTP status.
+    """
+    try:
+        data = json.loads(body or b"{}")
+    except ValueError:
+        return {"error": "Invalid JSON body"}, 400
+    if not isinstance(data, dict):
+        return {"error": "Request body must be a JSON object"}, 400
+
+    username = data.get('username')
+    good_id = data.get('good_id')
+    quantity = data.get('quantity', 1)
+    if not username or not isinstance(good_id, int) or not isinstance(quantity, int) or quantity <= 0:
+        return {"error": "Invalid input: username, good_id, and quantity must be valid"}, 400
+
+    return await checkout.purchase(username, good_id, quantity, debit_key)
+
+async def application(scope, receive, send):
+    """
+    ASGI entry point serving the asynchronous `POST /sales/purchase`.
+
+    Requests with an `Idempotency-Key` header share the key store of the Flask app: a retry replays
+    the stored response, and a 5xx releases the key so that the retry runs again.
+
+    Run it next to the Flask app, for example:
+        uvicorn async_checkout:application --port 5013
+    """
+    if scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await checkout.close()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    if scope["type"] != "http":
+        return
+    if scope["path"] != PURCHASE_PATH:
+        return await send_json(send, 404, {"error": "Not found"})
+    if scope["method"] != "POST":
+        return await send_json(send, 405, {"error": "Method not allowed"})
+
+    try:
+        body = await read_body(receive)
+    except ValueError:
+        return await send_json(send, 400, {"error": "Invalid JSON body"})
+
+    key = dict(scope.get("headers", [])).get(IDEMPOTENCY_HEADER.lower().encode(), b"").decode("latin-1")
+    if not key:
+        payload, status = await handle_purchase(body)
+        return await send_json(send, status, payload)
+    if len(key) > MAX_KEY_LENGTH:
+        return await send_json(send, 400, {"error": f"{IDEMPOTENCY_HEADER} must be at most {MAX_KEY_LENGTH} characters"})
+
+    key_scope = f"POST {PURCHASE_PATH}"
+    claimed = await asyncio.to_thread(claim_key, key, key_scope, body)
+    if claimed is not None:
+        status, stored, replayed = claimed
+        return await send_body(send, status, stored.encode(), [(b"idempotent-replayed", b"true")] if replayed else [])
+
+    try:
+        payload, status = await handle_purchase(body, derive_debit_key(key, PURCHASE_PATH))
+    except Exception:
+        await asyncio.to_thread(finish_key, key, key_scope, 500, None)
+        raise
+    await asyncio.to_thread(finish_key, key, key_scope, status, json.dumps(payload))
+    await send_json(send, status, payload)
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(application, port=int(os.getenv("ASYNC_CHECKOUT_PORT", 5013)))
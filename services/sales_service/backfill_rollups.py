@@ -0,0 +1,25 @@
+from app import app
+from rollups import rebuild_rollups
+
+def main():
+    with app.app_context():
+        written = rebuild_rollups()
+    for table, rows in written.items():
+        print(f"Rebuilt {table}: {rows} rows")
+
+if __name__ == "__main__":
+    main()
+
+"""
+Rebuilds the sales rollups (`sales_hourly`, `sales_daily` and `customer_lifetime_value`) from the `sales` table.
+
+The rollups are maintained incrementally by every sale. Run this once after upgrading an existing database,
+whose sales were recorded before the rollups existed, and whenever they are suspected to be out of sync
+(e.g. after editing sales directly in the database). Each table is recomputed with one aggregate query,
+all in a single transaction.
+
+`Sale` rows do not record the price they were charged at, so rebuilt revenue uses each good's current price.
+
+Usage:
+    python backfill_rollups.py
+"""
@@ -0,0 +1,78 @@
+import argparse
+import asyncio
+import time
+from collections import Counter
+import httpx
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+async def run(url, username, good_id, total, concurrency):
+    """
+    Sends `total` purchases to one checkout endpoint with at most `concurrency` in flight.
+
+    Returns:
+        dict: Latency percentiles in milliseconds, purchases per second and the status counts.
+    """
+    latencies = []
+    statuses = Counter()
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(limits=limits, timeout=30) as client:
+        async def purchase():
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    response = await client.post(f"{url}/sales/purchase", json={"username": username, "good_id": good_id, "quantity": 1})
+                    statuses[response.status_code] += 1
+                except httpx.HTTPError as e:
+                    statuses[type(e).__name__] += 1
+                latencies.append((time.perf_counter() - started) * 1000)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(purchase() for _ in range(total)))
+        elapsed = time.perf_counter() - started
+
+    return {
+        "p50_ms": percentile(latencies, 0.50),
+        "p99_ms": percentile(latencies, 0.99),
+        "purchases_per_second": statuses[201] / elapsed,
+        "statuses": dict(statuses)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the synchronous and asynchronous checkout paths.")
+    parser.add_argument("--sync-url", default="http://127.0.0.1:5003")
+    parser.add_argument("--async-url", default="http://127.0.0.1:5013")
+    parser.add_argument("--username", required=True)
+    parser.add_argument("--good-id", type=int, required=True)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"{'path':<8}{'p50 ms':>10}{'p99 ms':>10}{'purchases/s':>14}  statuses")
+    for name, url in [("sync", args.sync_url), ("async", args.async_url)]:
+        result = asyncio.run(run(url, args.username, args.good_id, args.requests, args.concurrency))
+        print(f"{name:<8}{result['p50_ms']:>10.1f}{result['p99_ms']:>10.1f}{result['purchases_per_second']:>14.1f}  {result['statuses']}")
+
+if __name__ == "__main__":
+    main()
+
+"""
+Benchmark of the synchronous (`MakeSale`, Flask) and asynchronous (`async_checkout.application`, ASGI)
+checkout paths.
+
+Both servers must share the same sales database and customers service. Give the customer enough wallet
+balance and the good enough stock for every request, and start the Flask app with `RATELIMIT_ENABLED=false`
+so the 5/minute limit on `/sales/purchase` does not turn the run into a rate limiter benchmark. Rejected
+purchases are reported in the status counts and do not count towards purchases per second.
+
+Usage:
+    python app.py                                        # synchronous path on port 5003
+    uvicorn async_checkout:application --port 5013       # asynchronous path
+    python benchmark_checkout.py --username alice --good-id 1 --requests 1000 --concurrency 100
+"""
@@ -50,3 +50,116 @@ class Sale(db.Model):
     username = db.Column(db.String(80), nullable=False)  # Username of the customer
     quantity = db.Column(db.Integer, nullable=False)  # Quantity of products sold
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)  # Timestamp of when the sale occurred (default to current time)
+
+class IdempotencyRecord(db.Model):
+    """
+    Represents a request made with an `Idempotency-Key` header.
+
+    The `IdempotencyRecord` model stores the hash of the first request made with a key and, once it
+    completes, its response, so that retries of the same request are answered from this row.
+
+    Attributes:
+        key (str): The client's idempotency key (Primary Key, with `scope`).
+        scope (str): The method and path the key was used on (Primary Key, with `key`).
+        request_hash (str): SHA-256 of the request body.
+        status_code (int): The stored response status, or None while the request is in progress.
+        response_body (str): The stored JSON response body.
+        created_at (datetime): When the key was claimed.
+        expires_at (datetime): When the row stops being replayed and can be evicted.
+    """
+    __tablename__ = 'idempotency_keys'
+    __table_args__ = (
+        db.Index('ix_idempotency_keys_expires_at', 'expires_at'),
+    )
+
+    key = db.Column(db.String(255), primary_key=True)  # Client-supplied idempotency key
+    scope = db.Column(db.String(255), primary_key=True)  # Method and path the key applies to
+    request_hash = db.Column(db.String(64), nullable=False)  # Hash of the request body
+    status_code = db.Column(db.Integer, nullable=True)  # Stored response status (None while in progress)
+    response_body = db.Column(db.Text, nullable=True)  # Stored response body
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)  # When the key was claimed
+    expires_at = db.Column(db.DateTime, nullable=False)  # When the row expires
+
+class HourlySales(db.Model):
+    """
+    Units sold and revenue of one good in one hour, maintained by every sale.
+
+    The rollup rows are upserted in the same transaction as the `Sale` rows they count, so the
+    analytics endpoints never read the `sales` table. `rollups.rebuild_rollups` recomputes them.
+
+    Attributes:
+        bucket (datetime): The start of the hour, in UTC (Primary Key, with `good_id`).
+        good_id (int): The product sold (Primary Key, with `bucket`).
+        sale_count (int): The number of `Sale` rows.
+        units (int): The quantity sold.
+        revenue (float): The amount charged.
+    """
+    __tablename__ = 'sales_hourly'
+    __table_args__ = (
+        db.Index('ix_sales_hourly_good_id_bucket', 'good_id', 'bucket'),
+    )
+
+    bucket = db.Column(db.DateTime, primary_key=True)  # Start of the hour
+    good_id = db.Column(db.Integer, primary_key=True)  # ID of the product sold
+    sale_count = db.Column(db.Integer, nullable=False, default=0)  # Number of sales
+    units = db.Column(db.Integer, nullable=False, default=0)  # Quantity sold
+    revenue = db.Column(db.Float, nullable=False, default=0.0)  # Amount charged
+
+class DailySales(db.Model):
+    """
+    Units sold and revenue of one good in one day, maintained by every sale.
+
+    Same columns as `HourlySales`, with `bucket` at midnight UTC. Reports over weeks or months read
+    these rows, 24 times fewer than the hourly ones.
+    """
+    __tablename__ = 'sales_daily'
+    __table_args__ = (
+        db.Index('ix_sales_daily_good_id_bucket', 'good_id', 'bucket'),
+    )
+
+    bucket = db.Column(db.DateTime, primary_key=True)  # Midnight of the day
+    good_id = db.Column(db.Integer, primary_key=True)  # ID of the product sold
+    sale_count = db.Column(db.Integer, nullable=False, default=0)  # Number of sales
+    units = db.Column(db.Integer, nullable=False, default=0)  # Quantity sold
+    revenue = db.Column(db.Float, nullable=False, default=0.0)  # Amount charged
+
+class CustomerLifetimeValue(db.Model):
+    """
+    What one customer has bought in total, maintained by every sale.
+
+    Attributes:
+        username (str): The customer (Primary Key).
+        sale_count (int): The number of `Sale` rows.
+        units (int): The quantity bought.
+        revenue (float): The amount spent.
+        first_purchase_at (datetime): The time of the first sale.
+        last_purchase_at (datetime): The time of the latest sale.
+    """
+    __tablename__ = 'customer_lifetime_value'
+    __table_args__ = (
+        db.Index('ix_customer_lifetime_value_revenue', 'revenue'),
+    )
+
+    username = db.Column(db.String(80), primary_key=True)  # Username of the customer
+    sale_count = db.Column(db.Integer, nullable=False, default=0)  # Number of sales
+    units = db.Column(db.Integer, nullable=False, default=0)  # Quantity bought
+    revenue = db.Column(db.Float, nullable=False, default=0.0)  # Amount spent
+    first_purchase_at = db.Column(db.DateTime, nullable=False)  # First sale
+    last_purchase_at = db.Column(db.DateTime, nullable=False)  # Latest sale
+
+class TableVersion(db.Model):
+    """
+    A version counter of a table, incremented by SQLite triggers on every write to it.
+
+    Because the triggers run inside SQLite, writes from any process (other workers, `initialize_db.py`,
+    direct edits of the database) bump the counter, so conditional GET can check it with one
+    primary-key read. See `table_versions.py`.
+
+    Attributes:
+        name (str): The name of the versioned table (Primary Key).
+        version (int): Incremented by every insert, delete and update of a tracked column.
+    """
+    __tablename__ = 'table_versions'
+
+    name = db.Column(db.String(80), primary_key=True)  # Name of the versioned table
+    version = db.Column(db.Integer, nullable=False, default=0)  # Write counter
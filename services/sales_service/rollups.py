@@ -0,0 +1,252 @@
+from datetime import datetime, timedelta, timezone
+from sqlalchemy.dialects.sqlite import insert
+from database import db
+from models import Good, Sale, HourlySales, DailySales, CustomerLifetimeValue
+
+# Rollup table and bucket width of each granularity
+GRANULARITIES = {
+    "hour": (HourlySales.__table__, timedelta(hours=1)),
+    "day": (DailySales.__table__, timedelta(days=1)),
+}
+
+# SQLite `strftime` formats truncating a stored timestamp to the start of its bucket. They produce the same
+# text SQLAlchemy stores for a datetime, so backfilled buckets and upserted buckets compare equal.
+BUCKET_FORMATS = {
+    "hour": "%Y-%m-%d %H:00:00.000000",
+    "day": "%Y-%m-%d 00:00:00.000000",
+}
+
+DEFAULT_RANGE = timedelta(days=30)
+DEFAULT_TOP_N = 10
+MAX_TOP_N = 100
+
+# Most buckets a revenue series can span, e.g. 208 days of hours
+MAX_SERIES_BUCKETS = 5000
+
+RANKINGS = ("revenue", "units")
+
+COUNTER_COLUMNS = ["sale_count", "units", "revenue"]
+
+customers_table = CustomerLifetimeValue.__table__
+sales_table = Sale.__table__
+goods_table = Good.__table__
+
+def bucket_start(timestamp, granularity):
+    """
+    Truncates a timestamp to the start of its hour or day.
+    """
+    if granularity == "hour":
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def record_sales(username, items, timestamp, connection=None):
+    """
+    Adds sales to the rollups in the current transaction, without committing.
+
+    Every rollup row is changed with one `INSERT ... ON CONFLICT DO UPDATE SET column = column + delta`,
+    so concurrent sales never lose an update. Call it in the transaction that inserts the `Sale` rows,
+    so the rollups commit (or roll back) with them.
+
+    Args:
+        username (str): The customer.
+        items (list): `(good_id, quantity, unit_price)` tuples, one per `Sale` row.
+        timestamp (datetime): The `timestamp` of the `Sale` rows.
+        connection (Connection, optional): The connection to write with; defaults to the session.
+    """
+    executor = connection if connection is not None else db.session
+    for granularity, (table, _) in GRANULARITIES.items():
+        bucket = bucket_start(timestamp, granularity)
+        for good_id, quantity, unit_price in items:
+            stmt = insert(table).values(bucket=bucket, good_id=good_id, sale_count=1, units=quantity, revenue=quantity * unit_price)
+            executor.execute(stmt.on_conflict_do_update(
+                index_elements=[table.c.bucket, table.c.good_id],
+                set_={column: table.c[column] + stmt.excluded[column] for column in COUNTER_COLUMNS}
+            ))
+
+    stmt = insert(customers_table).values(
+        username=username,
+        sale_count=len(items),
+        units=sum(quantity for _, quantity, _ in items),
+        revenue=sum(quantity * unit_price for _, quantity, unit_price in items),
+        first_purchase_at=timestamp,
+        last_purchase_at=timestamp
+    )
+    set_ = {column: customers_table.c[column] + stmt.excluded[column] for column in COUNTER_COLUMNS}
+    set_["last_purchase_at"] = db.func.max(customers_table.c.last_purchase_at, stmt.excluded.last_purchase_at)
+    executor.execute(stmt.on_conflict_do_update(index_elements=[customers_table.c.username], set_=set_))
+
+def parse_datetime(value, name):
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"{name} must be an ISO 8601 date or datetime")
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+def parse_range(args):
+    """
+    Validates the time range and granularity parameters of the analytics endpoints.
+
+    `start` and `end` are ISO 8601 dates or datetimes (UTC unless an offset is given). The range defaults
+    to the last 30 days and is widened to whole buckets: it covers every bucket that `[start, end)` overlaps.
+
+    Returns:
+        dict: `granularity`, `start` (the first bucket) and `end` (exclusive).
+
+    Raises:
+        ValueError: If a parameter is invalid.
+    """
+    granularity = args.get('granularity', 'day')
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"granularity must be one of: {', '.join(GRANULARITIES)}")
+    end = parse_datetime(args['end'], "end") if args.get('end') else datetime.utcnow()
+    start = parse_datetime(args['start'], "start") if args.get('start') else end - DEFAULT_RANGE
+    if start >= end:
+        raise ValueError("start must be before end")
+    return {"granularity": granularity, "start": bucket_start(start, granularity), "end": end}
+
+def top_goods(period, by="revenue", limit=DEFAULT_TOP_N):
+    """
+    Ranks goods by revenue or units sold over a period, reading only the rollup of its granularity.
+
+    Args:
+        period (dict): Returned by `parse_range`.
+        by (str): "revenue" or "units".
+        limit (int): The number of goods.
+
+    Returns:
+        list: Dicts with the good's `good_id`, `name`, `units`, `revenue` and `sale_count`, best first.
+    """
+    table, _ = GRANULARITIES[period["granularity"]]
+    totals = [db.func.sum(table.c[column]).label(column) for column in COUNTER_COLUMNS]
+    rank = totals[COUNTER_COLUMNS.index(by)]
+    rows = db.session.execute(
+        db.select(table.c.good_id, *totals)
+        .where(table.c.bucket >= period["start"], table.c.bucket < period["end"])
+        .group_by(table.c.good_id)
+        .order_by(rank.desc(), table.c.good_id)
+        .limit(limit)
+    ).all()
+
+    # Names of the ranked goods only, by primary key
+    names = dict(db.session.execute(
+        db.select(goods_table.c.id, goods_table.c.name).where(goods_table.c.id.in_([row.good_id for row in rows]))
+    ).all())
+    return [{
+        "good_id": row.good_id,
+        "name": names.get(row.good_id),
+        "units": row.units,
+        "revenue": round(row.revenue, 2),
+        "sale_count": row.sale_count
+    } for row in rows]
+
+def revenue_series(period, good_id=None):
+    """
+    Returns the units and revenue of every bucket with sales in a period, oldest first.
+
+    The whole catalog is summed per bucket from the primary key `(bucket, good_id)`; one good's series
+    is read from the `(good_id, bucket)` index.
+
+    Args:
+        period (dict): Returned by `parse_range`.
+        good_id (int, optional): Only this good's sales.
+
+    Returns:
+        list: Dicts with the `bucket` (ISO 8601), `units`, `revenue` and `sale_count`.
+
+    Raises:
+        ValueError: If the period spans more than `MAX_SERIES_BUCKETS` buckets.
+    """
+    table, width = GRANULARITIES[period["granularity"]]
+    if (period["end"] - period["start"]) / width > MAX_SERIES_BUCKETS:
+        raise ValueError(f"The range spans more than {MAX_SERIES_BUCKETS} {period['granularity']}s; use a coarser granularity")
+    conditions = [table.c.bucket >= period["start"], table.c.bucket < period["end"]]
+    if good_id is not None:
+        conditions.append(table.c.good_id == good_id)
+    rows = db.session.execute(
+        db.select(table.c.bucket, *[db.func.sum(table.c[column]).label(column) for column in COUNTER_COLUMNS])
+        .where(*conditions)
+        .group_by(table.c.bucket)
+        .order_by(table.c.bucket)
+    ).all()
+    return [{
+        "bucket": row.bucket.isoformat(),
+        "units": row.units,
+        "revenue": round(row.revenue, 2),
+        "sale_count": row.sale_count
+    } for row in rows]
+
+def serialize_customer(row):
+    return {
+        "username": row.username,
+        "revenue": round(row.revenue, 2),
+        "units": row.units,
+        "sale_count": row.sale_count,
+        "first_purchase_at": row.first_purchase_at.isoformat(),
+        "last_purchase_at": row.last_purchase_at.isoformat(),
+    }
+
+def customer_value(username):
+    """
+    Reads a customer's lifetime value with one primary-key lookup.
+
+    Returns:
+        dict: The customer's totals, or None if they never bought anything.
+    """
+    row = db.session.get(CustomerLifetimeValue, username)
+    return serialize_customer(row) if row else None
+
+def top_customers(limit=DEFAULT_TOP_N):
+    """
+    Returns the customers with the highest lifetime value, read from the `revenue` index.
+    """
+    rows = db.session.execute(
+        db.select(customers_table).order_by(customers_table.c.revenue.desc(), customers_table.c.username).limit(limit)
+    ).all()
+    return [serialize_customer(row) for row in rows]
+
+def rebuild_rollups():
+    """
+    Recomputes every rollup from the `sales` table in one transaction.
+
+    `Sale` rows do not store the price they were charged at, so revenue is recomputed at each good's
+    current price; goods that no longer exist count their units with no revenue. Unlike the incremental
+    updates, a rebuild therefore does not keep past prices.
+
+    Returns:
+        dict: The number of rows written to each rollup table.
+    """
+    revenue = db.func.coalesce(db.func.sum(sales_table.c.quantity * goods_table.c.price), 0.0)
+    sales_with_prices = sales_table.outerjoin(goods_table, goods_table.c.id == sales_table.c.good_id)
+    written = {}
+
+    for granularity, (table, _) in GRANULARITIES.items():
+        bucket = db.func.strftime(BUCKET_FORMATS[granularity], sales_table.c.timestamp)
+        aggregates = (
+            db.select(bucket, sales_table.c.good_id, db.func.count(), db.func.sum(sales_table.c.quantity), revenue)
+            .select_from(sales_with_prices)
+            .where(sales_table.c.timestamp.is_not(None))
+            .group_by(bucket, sales_table.c.good_id)
+        )
+        db.session.execute(db.delete(table))
+        result = db.session.execute(db.insert(table).from_select(["bucket", "good_id"] + COUNTER_COLUMNS, aggregates))
+        written[table.name] = result.rowcount
+
+    aggregates = (
+        db.select(
+            sales_table.c.username, db.func.count(), db.func.sum(sales_table.c.quantity), revenue,
+            db.func.min(sales_table.c.timestamp), db.func.max(sales_table.c.timestamp)
+        )
+        .select_from(sales_with_prices)
+        .where(sales_table.c.timestamp.is_not(None))
+        .group_by(sales_table.c.username)
+    )
+    db.session.execute(db.delete(customers_table))
+    result = db.session.execute(db.insert(customers_table).from_select(
+        ["username"] + COUNTER_COLUMNS + ["first_purchase_at", "last_purchase_at"], aggregates
+    ))
+    written[customers_table.name] = result.rowcount
+
+    db.session.commit()
+    return written
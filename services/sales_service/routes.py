@@ -1,18 +1,26 @@
+import hashlib
+import logging
+import os
+from datetime import datetime
 from flask_restful import Api, Resource
 from models import Good, Sale
 from database import db
 from flask import request, jsonify
 from utils import log_to_audit, call_service_api, circuit_breaker
-from flask_limiter import Limiter
+from extensions import limiter
+from idempotency import idempotent, IDEMPOTENCY_HEADER
+from etag import conditional
+from rollups import record_sales, parse_range, top_goods, revenue_series, customer_value, top_customers, RANKINGS, DEFAULT_TOP_N, MAX_TOP_N
 
 api = Api()
 
-CUSTOMERS_SERVICE_URL = "http://127.0.0.1:5001"  # Replace with the actual Customers Service URL
+CUSTOMERS_SERVICE_URL = os.getenv("CUSTOMERS_SERVICE_URL", "http://127.0.0.1:5001")
 
 # DisplayGoods Resource
 class DisplayGoods(Resource):
     decorators = [limiter.limit("20/minute")]  # Limit this endpoint to 20 requests per minute
 
+    @conditional("goods")
     @circuit_breaker
     def get(self):
         """
@@ -27,6 +35,10 @@ class DisplayGoods(Resource):
                   "price": "float"
               }
           ]
+        - 304 Not Modified: The `If-None-Match` or `If-Modified-Since` header matches the current catalog.
+
+        The ETag is the goods table's write counter, bumped by SQLite triggers, so writes made by other
+        workers or directly in the database change it too.
         """
         goods = Good.query.all()
         goods_list = [{
@@ -78,15 +90,142 @@ class GetGoodDetails(Resource):
             "stock_count": good.stock_count
         })
 
+# Maximum number of distinct goods in one cart checkout
+MAX_CART_ITEMS = 100
+
+def derive_debit_key(key, path):
+    """
+    Derives the `Idempotency-Key` of the wallet debit from the key of a checkout request.
+
+    The key is scoped by the sales endpoint, so the same client key used on two endpoints never names
+    the same debit, and hashed, so it fits the Customers Service's key length limit.
+
+    Args:
+        key (str): The checkout request's `Idempotency-Key`, or None.
+        path (str): The path of the sales endpoint.
+
+    Returns:
+        str: The derived key, or None if the request has no `Idempotency-Key`.
+    """
+    if not key:
+        return None
+    return f"sales:{path}:{hashlib.sha256(key.encode()).hexdigest()}"
+
+def debit_key():
+    """
+    Derives the debit's `Idempotency-Key` from the current request (see `derive_debit_key`).
+    """
+    return derive_debit_key(request.headers.get(IDEMPOTENCY_HEADER), request.path)
+
+def debit_wallet(username, amount, reference):
+    """
+    Debits a customer's wallet through the Customers Service in one call.
+
+    If the incoming request carries an `Idempotency-Key`, a key derived from it (see `debit_key`) is sent
+    with the debit, which makes the debit safe to retry: a retried checkout never charges the wallet twice.
+    A refunded debit releases that key (see `refund_wallet`), so a retry after a failed sale is charged again.
+
+    Args:
+        username (str): The username of the customer.
+        amount (float): The amount to debit.
+        reference (str): A reference stored in the customer's wallet ledger.
+
+    Returns:
+        tuple: The debit (the customer's `id` and the debit's `ledger_id`) and None on success, or None
+        and an `(error, status)` response.
+    """
+    key = debit_key()
+    try:
+        debit_response = call_service_api(
+            "POST",
+            f"{CUSTOMERS_SERVICE_URL}/customers/username/{username}/wallet/debit",
+            {"amount": amount, "reference": reference},
+            headers={IDEMPOTENCY_HEADER: key} if key else None,
+            idempotent=bool(key)
+        )
+    except Exception as e:
+        return None, ({"error": f"Error communicating with Customers Service: {e}"}, 500)
+    if debit_response.status_code == 404:
+        return None, ({"error": "Customer not found"}, 404)
+    if debit_response.status_code == 400:
+        return None, ({"error": "Insufficient wallet balance"}, 400)
+    if debit_response.status_code != 200:
+        return None, ({"error": "Failed to update wallet balance"}, 500)
+    return debit_response.json(), None
+
+def refund_wallet(debit, amount, endpoint):
+    """
+    Gives a debit back to a customer's wallet when the sale could not be recorded.
+
+    The refund names the debit's ledger entry and carries an `Idempotency-Key` derived from it, so the
+    Customers Service refunds a debit at most once however often the call is retried. It also releases
+    the debit's own key: the failed sale answers 500, which the client may retry with the same key, and
+    that retry must debit the wallet again rather than get the refunded debit replayed. A refund that
+    fails is never raised to the caller, which still returns its own error: it is logged and audited
+    with the ledger entry, so the debit can be reconciled.
+
+    Args:
+        debit (dict): The debit returned by `debit_wallet`.
+        amount (float): The debited amount, for the log.
+        endpoint (str): The sales endpoint that debited the wallet, for the log.
+
+    Returns:
+        bool: True if the debit was refunded.
+    """
+    customer_id, ledger_id = debit["id"], debit.get("ledger_id")
+    try:
+        refund_response = call_service_api(
+            "POST", f"{CUSTOMERS_SERVICE_URL}/customers/{customer_id}/wallet/refund",
+            {"ledger_id": ledger_id, "debit_key": debit_key()},
+            headers={IDEMPOTENCY_HEADER: f"sales:refund:{ledger_id}"},
+            idempotent=True
+        )
+        if refund_response.status_code == 200:
+            return True
+        error = f"status {refund_response.status_code}"
+    except Exception as e:
+        error = str(e) or type(e).__name__
+    details = f"Refund of {amount} to customer {customer_id} (ledger entry {ledger_id}) failed: {error}; reconcile manually"
+    logging.error(details)
+    log_to_audit("sales_service", endpoint, "error", details)
+    return False
+
+def deduct_stock(quantities):
+    """
+    Deducts stock inside the current transaction with one conditional UPDATE per good:
+
+        UPDATE goods SET stock_count = stock_count - :q WHERE id = :id AND stock_count >= :q
+
+    The affected row count decides success, so concurrent checkouts can never oversell.
+
+    Args:
+        quantities (dict): Positive quantities to deduct, keyed by good id.
+
+    Raises:
+        ValueError: If a good does not have enough stock. The caller must roll back.
+    """
+    goods_table = Good.__table__
+    for good_id, quantity in quantities.items():
+        updated = db.session.execute(
+            db.update(goods_table)
+            .where(goods_table.c.id == good_id, goods_table.c.stock_count >= quantity)
+            .values(stock_count=goods_table.c.stock_count - quantity)
+        )
+        if updated.rowcount != 1:
+            raise ValueError(f"Not enough stock available for good {good_id}")
+
 # MakeSale Resource
 class MakeSale(Resource):
     decorators = [limiter.limit("5/minute")]  # Limit this endpoint to 5 requests per minute
 
+    @idempotent
     @circuit_breaker
     def post(self):
         """
         Processes a sale by deducting stock and updating customer wallet.
 
+        Requests with an `Idempotency-Key` header are processed at most once; retries get the stored response.
+
         Args:
         - username (str): The username of the customer.
         - good_id (int): The ID of the good being purchased.
@@ -125,36 +264,113 @@ class MakeSale(Resource):
         if good.stock_count < quantity:
             return {"error": "Not enough stock available"}, 400
 
-        try:
-            response = call_service_api("GET", f"{CUSTOMERS_SERVICE_URL}/customers/username/{username}")
-            if response.status_code != 200:
-                return {"error": "Customer not found"}, 404
-            customer_data = response.json()
-            wallet_balance = customer_data.get("wallet_balance", 0.0)
-        except Exception as e:
-            return {"error": f"Error communicating with Customers Service: {e}"}, 500
-
         total_cost = good.price * quantity
-        if wallet_balance < total_cost:
-            return {"error": "Insufficient wallet balance"}, 400
+
+        # One call checks and debits the wallet atomically; no prior GET of the customer is needed
+        reference = f"good:{good.id}x{quantity}"
+        debit, error = debit_wallet(username, total_cost, reference)
+        if error:
+            return error
 
         try:
-            update_response = call_service_api(
-                "PUT", f"{CUSTOMERS_SERVICE_URL}/customers/{customer_data['id']}/wallet", {"amount": -total_cost}
-            )
-            if update_response.status_code != 200:
-                return {"error": "Failed to update wallet balance"}, 500
+            deduct_stock({good.id: quantity})
+            timestamp = datetime.utcnow()
+            sale = Sale(good_id=good.id, username=username, quantity=quantity, timestamp=timestamp)
+            db.session.add(sale)
+            record_sales(username, [(good.id, quantity, good.price)], timestamp)
+            db.session.commit()
         except Exception as e:
-            return {"error": f"Error communicating with Customers Service: {e}"}, 500
-
-        good.stock_count -= quantity
-        sale = Sale(good_id=good.id, username=username, quantity=quantity)
-        db.session.add(sale)
-        db.session.commit()
+            db.session.rollback()
+            # Give the money back if the sale could not be recorded
+            refund_wallet(debit, total_cost, "/sales/purchase")
+            if isinstance(e, ValueError):
+                return {"error": "Not enough stock available"}, 400
+            return {"error": f"Failed to record sale: {e}"}, 500
 
         log_to_audit("sales_service", "/sales/purchase", "success", f"Processed sale for {username}, good ID {good_id}")
         return {"message": "Sale completed successfully"}, 201
 
+# CartCheckout Resource
+class CartCheckout(Resource):
+    decorators = [limiter.limit("5/minute")]  # Limit this endpoint to 5 requests per minute
+
+    @idempotent
+    @circuit_breaker
+    def post(self):
+        """
+        Processes a multi-item purchase with one wallet debit and one database transaction.
+
+        Requests with an `Idempotency-Key` header are processed at most once; retries get the stored response.
+
+        All goods are loaded with a single `IN (...)` query, the wallet is debited once for the
+        basket total, and every stock decrement, `Sale` row and rollup update is written in the same transaction,
+        so the per-basket cost does not grow with the number of items. Repeated goods are merged.
+
+        Args:
+        - username (str): The username of the customer.
+        - items (list): Line items, each with a `good_id` (int) and a `quantity` (int, defaults to 1).
+
+        Response:
+        - 201 Created: If every item was sold.
+          {
+              "message": "Checkout completed successfully",
+              "total_cost": "float",
+              "items": "int"
+          }
+        - 400 Bad Request: If the input is invalid, an item is out of stock or the wallet balance is insufficient.
+        - 404 Not Found: If a good or the customer is not found.
+        - 500 Internal Server Error: If there is an issue with the communication to the Customers Service.
+        """
+        data = request.json or {}
+        username = data.get('username')
+        items = data.get('items')
+
+        if not username or not isinstance(items, list) or not items:
+            return {"error": "Invalid input: username and a non-empty list of items are required"}, 400
+
+        quantities = {}
+        for item in items:
+            good_id = item.get('good_id') if isinstance(item, dict) else None
+            quantity = item.get('quantity', 1) if isinstance(item, dict) else None
+            if not isinstance(good_id, int) or not isinstance(quantity, int) or quantity <= 0:
+                return {"error": "Invalid input: every item needs a good_id and a positive quantity"}, 400
+            quantities[good_id] = quantities.get(good_id, 0) + quantity
+        if len(quantities) > MAX_CART_ITEMS:
+            return {"error": f"A cart can hold at most {MAX_CART_ITEMS} different goods"}, 400
+
+        goods = {good.id: good for good in Good.query.filter(Good.id.in_(quantities)).all()}
+        missing = [good_id for good_id in quantities if good_id not in goods]
+        if missing:
+            return {"error": f"Goods not found: {missing}"}, 404
+        short = [good_id for good_id, quantity in quantities.items() if goods[good_id].stock_count < quantity]
+        if short:
+            return {"error": f"Not enough stock available for goods: {short}"}, 400
+
+        total_cost = sum(goods[good_id].price * quantity for good_id, quantity in quantities.items())
+        reference = "cart:" + ",".join(f"{good_id}x{quantity}" for good_id, quantity in quantities.items())
+        debit, error = debit_wallet(username, total_cost, reference)
+        if error:
+            return error
+
+        try:
+            # Fails instead of overselling if stock changed since the check above
+            deduct_stock(quantities)
+            timestamp = datetime.utcnow()
+            db.session.execute(db.insert(Sale), [
+                {"good_id": good_id, "username": username, "quantity": quantity, "timestamp": timestamp}
+                for good_id, quantity in quantities.items()
+            ])
+            record_sales(username, [(good_id, quantity, goods[good_id].price) for good_id, quantity in quantities.items()], timestamp)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            # Give the money back if the sale could not be recorded
+            refund_wallet(debit, total_cost, "/sales/cart/checkout")
+            return {"error": f"Failed to record sale: {e}"}, 400 if isinstance(e, ValueError) else 500
+
+        log_to_audit("sales_service", "/sales/cart/checkout", "success", f"Processed cart of {len(quantities)} goods for {username}")
+        return {"message": "Checkout completed successfully", "total_cost": total_cost, "items": len(quantities)}, 201
+
 # GetPurchaseHistory Resource
 class GetPurchaseHistory(Resource):
     decorators = [limiter.limit("5/minute")]  # Limit this endpoint to 5 requests per minute
@@ -196,8 +412,151 @@ class GetPurchaseHistory(Resource):
         return jsonify(history)
 
 
+def parse_limit(args):
+    try:
+        limit = int(args.get('limit', DEFAULT_TOP_N))
+    except ValueError:
+        raise ValueError("limit must be an integer")
+    if limit < 1:
+        raise ValueError("limit must be greater than zero")
+    return min(limit, MAX_TOP_N)
+
+# TopGoods Resource
+class TopGoods(Resource):
+    decorators = [limiter.limit("30/minute")]  # Limit this endpoint to 30 requests per minute
+
+    @circuit_breaker
+    def get(self):
+        """
+        Ranks the best-selling goods over a period.
+
+        Query Parameters:
+            start, end (str, optional): ISO 8601 bounds of the period (default: the last 30 days).
+            granularity (str, optional): "day" (default) or "hour", the rollup the period is rounded to.
+            by (str, optional): "revenue" (default) or "units".
+            limit (int, optional): The number of goods (default 10, maximum 100).
+
+        Response:
+        - 200 OK:
+          {
+              "goods": [{"good_id": "int", "name": "string", "units": "int", "revenue": "float", "sale_count": "int"}]
+          }
+        - 400 Bad Request: If a parameter is invalid.
+
+        Only the hourly or daily rollups are read, never the `sales` table.
+        """
+        by = request.args.get('by', 'revenue')
+        if by not in RANKINGS:
+            return {"error": f"by must be one of: {', '.join(RANKINGS)}"}, 400
+        try:
+            period = parse_range(request.args)
+            limit = parse_limit(request.args)
+        except ValueError as e:
+            return {"error": str(e)}, 400
+
+        log_to_audit("sales_service", "/sales/analytics/top-goods", "success", f"Top {limit} goods by {by}")
+        return {"goods": top_goods(period, by, limit)}, 200
+
+# RevenueOverTime Resource
+class RevenueOverTime(Resource):
+    decorators = [limiter.limit("30/minute")]  # Limit this endpoint to 30 requests per minute
+
+    @circuit_breaker
+    def get(self):
+        """
+        Retrieves the units sold and revenue per hour or day over a period.
+
+        Query Parameters:
+            start, end (str, optional): ISO 8601 bounds of the period (default: the last 30 days).
+            granularity (str, optional): "day" (default) or "hour".
+            good_id (int, optional): Only this good's sales.
+
+        Response:
+        - 200 OK: Buckets without sales are omitted.
+          {
+              "granularity": "string",
+              "series": [{"bucket": "string", "units": "int", "revenue": "float", "sale_count": "int"}]
+          }
+        - 400 Bad Request: If a parameter is invalid or the period has too many buckets.
+        """
+        try:
+            good_id = int(request.args['good_id']) if 'good_id' in request.args else None
+        except ValueError:
+            return {"error": "good_id must be an integer"}, 400
+        try:
+            period = parse_range(request.args)
+            series = revenue_series(period, good_id)
+        except ValueError as e:
+            return {"error": str(e)}, 400
+
+        log_to_audit("sales_service", "/sales/analytics/revenue", "success", f"Revenue series of {len(series)} buckets")
+        return {"granularity": period["granularity"], "series": series}, 200
+
+# TopCustomers Resource
+class TopCustomers(Resource):
+    decorators = [limiter.limit("30/minute")]  # Limit this endpoint to 30 requests per minute
+
+    @circuit_breaker
+    def get(self):
+        """
+        Retrieves the customers with the highest lifetime value.
+
+        Query Parameters:
+            limit (int, optional): The number of customers (default 10, maximum 100).
+
+        Response:
+        - 200 OK:
+          {
+              "customers": [{"username": "string", "revenue": "float", "units": "int", "sale_count": "int",
+                             "first_purchase_at": "string", "last_purchase_at": "string"}]
+          }
+        - 400 Bad Request: If `limit` is invalid.
+        """
+        try:
+            limit = parse_limit(request.args)
+        except ValueError as e:
+            return {"error": str(e)}, 400
+
+        log_to_audit("sales_service", "/sales/analytics/customers", "success", f"Top {limit} customers")
+        return {"customers": top_customers(limit)}, 200
+
+# GetCustomerValue Resource
+class GetCustomerValue(Resource):
+    decorators = [limiter.limit("30/minute")]  # Limit this endpoint to 30 requests per minute
+
+    @circuit_breaker
+    def get(self, username):
+        """
+        Retrieves a customer's lifetime value: everything they bought, in total.
+
+        Response:
+        - 200 OK:
+          {
+              "username": "string",
+              "revenue": "float",
+              "units": "int",
+              "sale_count": "int",
+              "first_purchase_at": "string",
+              "last_purchase_at": "string"
+          }
+        - 404 Not Found: If the customer never bought anything.
+        """
+        value = customer_value(username)
+        if value is None:
+            log_to_audit("sales_service", f"/sales/analytics/customers/{username}", "error", "No purchases found")
+            return {"error": "No purchases found"}, 404
+
+        log_to_audit("sales_service", f"/sales/analytics/customers/{username}", "success", f"Lifetime value of {username}")
+        return value, 200
+
+
 # Add resources to API
 api.add_resource(DisplayGoods, '/sales/goods')
 api.add_resource(GetGoodDetails, '/sales/goods/<int:good_id>')
 api.add_resource(MakeSale, '/sales/purchase')
+api.add_resource(CartCheckout, '/sales/cart/checkout')
 api.add_resource(GetPurchaseHistory, '/sales/history/<string:username>')
+api.add_resource(TopGoods, '/sales/analytics/top-goods')
+api.add_resource(RevenueOverTime, '/sales/analytics/revenue')
+api.add_resource(TopCustomers, '/sales/analytics/customers')
+api.add_resource(GetCustomerValue, '/sales/analytics/customers/<string:username>')
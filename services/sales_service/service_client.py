@@ -0,0 +1,212 @@
+import bisect
+import os
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+
+# Methods that are retried by default; other methods are only retried when the caller says the call is idempotent
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+# Upstream statuses that are worth retrying
+RETRY_STATUSES = {502, 503, 504}
+
+# Upper bounds of the latency histogram buckets, in milliseconds (the last bucket is unbounded)
+LATENCY_BUCKETS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000]
+
+class LatencyHistogram:
+    """
+    Fixed-bucket histogram of request latencies for one upstream.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS_MS):
+        self.buckets = list(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.errors = 0
+        self.retries = 0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds, error=False):
+        milliseconds = seconds * 1000
+        with self._lock:
+            self.counts[bisect.bisect_left(self.buckets, milliseconds)] += 1
+            self.count += 1
+            self.total_ms += milliseconds
+            self.errors += int(error)
+
+    def record_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def percentile(self, fraction):
+        """
+        Returns the upper bound of the bucket holding the given fraction of requests, in milliseconds.
+        """
+        with self._lock:
+            if not self.count:
+                return None
+            target = fraction * self.count
+            seen = 0
+            for index, count in enumerate(self.counts):
+                seen += count
+                if seen >= target:
+                    return self.buckets[index] if index < len(self.buckets) else float("inf")
+
+    def snapshot(self):
+        """
+        Returns the histogram as a JSON-serializable dict.
+        """
+        labels = [f"le_{bound}ms" for bound in self.buckets] + ["le_inf"]
+        p50, p99 = self.percentile(0.5), self.percentile(0.99)
+        with self._lock:
+            return {
+                "count": self.count,
+                "errors": self.errors,
+                "retries": self.retries,
+                "mean_ms": self.total_ms / self.count if self.count else None,
+                "p50_ms": p50,
+                "p99_ms": p99,
+                "buckets": dict(zip(labels, self.counts))
+            }
+
+class ServiceClient:
+    """
+    Shared HTTP client for calls to other services.
+
+    Each upstream (scheme and host) gets its own `requests.Session` with a pooled `HTTPAdapter`,
+    so connections are kept alive and reused instead of opening a new TCP connection per call.
+    Every call has a connect and a read timeout. Idempotent calls that fail with a connection
+    error, a timeout or a 502/503/504 are retried with full-jitter exponential backoff, and each
+    attempt is recorded in a per-upstream latency histogram.
+
+    Args:
+        pool_size (int): Maximum number of kept-alive connections per upstream.
+        connect_timeout (float): Default seconds to wait for a connection.
+        read_timeout (float): Default seconds to wait for a response.
+        max_retries (int): Retries after the first attempt for idempotent calls.
+        backoff_base (float): Seconds of the first backoff window; each retry doubles it.
+        backoff_max (float): Upper bound of the backoff window in seconds.
+    """
+
+    def __init__(self, pool_size=10, connect_timeout=1.0, read_timeout=5.0, max_retries=2, backoff_base=0.05, backoff_max=1.0):
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._sessions = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def upstream(url):
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}"
+
+    def session(self, upstream):
+        """
+        Returns the pooled session of an upstream, creating it on first use.
+        """
+        with self._lock:
+            session = self._sessions.get(upstream)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=0)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self._sessions[upstream] = session
+                self._histograms[upstream] = LatencyHistogram()
+            return session
+
+    def backoff(self, attempt):
+        """
+        Returns the full-jitter delay before a retry: a random time up to `backoff_base * 2 ** attempt`.
+        """
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def request(self, method, url, json=None, headers=None, timeout=None, idempotent=None):
+        """
+        Sends a request through the upstream's pooled session.
+
+        Args:
+            method (str): The HTTP method.
+            url (str): The full URL.
+            json (dict, optional): The JSON body.
+            headers (dict, optional): Extra request headers.
+            timeout (tuple, optional): `(connect, read)` timeouts in seconds for this call.
+            idempotent (bool, optional): Whether the call may be retried. Defaults to True for GET, HEAD and OPTIONS.
+
+        Returns:
+            Response: The response of the last attempt.
+
+        Raises:
+            requests.RequestException: If the last attempt failed to get a response.
+        """
+        method = method.upper()
+        upstream = self.upstream(url)
+        session = self.session(upstream)
+        histogram = self._histograms[upstream]
+        timeout = timeout or (self.connect_timeout, self.read_timeout)
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+        retries = self.max_retries if idempotent else 0
+
+        for attempt in range(retries + 1):
+            started = time.perf_counter()
+            try:
+                response = session.request(method, url, json=json, headers=headers, timeout=timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                histogram.observe(time.perf_counter() - started, error=True)
+                if attempt == retries:
+                    raise
+            else:
+                retryable = response.status_code in RETRY_STATUSES
+                histogram.observe(time.perf_counter() - started, error=retryable)
+                if not retryable or attempt == retries:
+                    return response
+                response.close()
+            histogram.record_retry()
+            time.sleep(self.backoff(attempt))
+
+    def stats(self):
+        """
+        Returns the latency histogram of every upstream.
+        """
+        with self._lock:
+            histograms = dict(self._histograms)
+        return {upstream: histogram.snapshot() for upstream, histogram in histograms.items()}
+
+    def close(self):
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+
+def create_service_client():
+    """
+    Builds a `ServiceClient` configured from environment variables.
+
+    Environment variables:
+        SERVICE_POOL_SIZE (int): Kept-alive connections per upstream (default 10).
+        SERVICE_CONNECT_TIMEOUT (float): Connect timeout in seconds (default 1.0).
+        SERVICE_READ_TIMEOUT (float): Read timeout in seconds (default 5.0).
+        SERVICE_MAX_RETRIES (int): Retries for idempotent calls (default 2).
+        SERVICE_BACKOFF_BASE (float): First backoff window in seconds (default 0.05).
+        SERVICE_BACKOFF_MAX (float): Largest backoff window in seconds (default 1.0).
+
+    Returns:
+        ServiceClient: The configured client.
+    """
+    return ServiceClient(
+        pool_size=int(os.getenv("SERVICE_POOL_SIZE", 10)),
+        connect_timeout=float(os.getenv("SERVICE_CONNECT_TIMEOUT", 1.0)),
+        read_timeout=float(os.getenv("SERVICE_READ_TIMEOUT", 5.0)),
+        max_retries=int(os.getenv("SERVICE_MAX_RETRIES", 2)),
+        backoff_base=float(os.getenv("SERVICE_BACKOFF_BASE", 0.05)),
+        backoff_max=float(os.getenv("SERVICE_BACKOFF_MAX", 1.0))
+    )
@@ -0,0 +1,61 @@
+import logging
+from sqlalchemy import event
+from database import db
+from models import Good, TableVersion
+
+versions_table = TableVersion.__table__
+
+# Tables whose writes are counted, and the columns whose updates count: `goods` is versioned for
+# `GET /sales/goods`, which shows names and prices. Stock updates, which every sale makes, do not count.
+VERSIONED_TABLES = {
+    Good.__tablename__: ("name", "price"),
+}
+
+def trigger_statements(table, columns):
+    """
+    Returns the statements that create the version row and the triggers of a table, all idempotent.
+    """
+    bump = f"UPDATE table_versions SET version = version + 1 WHERE name = '{table}';"
+    return [
+        f"INSERT OR IGNORE INTO table_versions (name, version) VALUES ('{table}', 0)",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_version_insert AFTER INSERT ON {table} BEGIN {bump} END",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_version_update AFTER UPDATE OF {', '.join(columns)} ON {table} BEGIN {bump} END",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_version_delete AFTER DELETE ON {table} BEGIN {bump} END",
+    ]
+
+def install_version_triggers(connection):
+    """
+    Creates the version table, rows and triggers that are missing, on a database created by any
+    earlier version of the service as well as on a new one.
+    """
+    versions_table.create(connection, checkfirst=True)
+    tables = set(db.inspect(connection).get_table_names())
+    for table, columns in VERSIONED_TABLES.items():
+        if table in tables:
+            for statement in trigger_statements(table, columns):
+                connection.exec_driver_sql(statement)
+
+def _install_after_create(target, connection, **kwargs):
+    install_version_triggers(connection)
+
+# New databases get the triggers once `db.create_all()` has created every table
+event.listen(db.metadata, "after_create", _install_after_create)
+
+def init_app(app):
+    """
+    Installs the version triggers on the app's database, if its tables exist yet.
+    """
+    with app.app_context():
+        with db.engine.begin() as connection:
+            install_version_triggers(connection)
+
+def table_version(name):
+    """
+    Returns the write counter of a table, or None if it cannot be read (conditional GET is then skipped).
+    """
+    try:
+        return db.session.execute(db.select(versions_table.c.version).where(versions_table.c.name == name)).scalar()
+    except Exception as e:
+        logging.warning(f"Failed to read the version of table {name}: {e}")
+        db.session.rollback()
+        return None
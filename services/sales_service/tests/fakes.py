@@ -0,0 +1,59 @@
+import re
+
+class FakeResponse:
+    def __init__(self, status_code, body):
+        self.status_code = status_code
+        self.body = body
+        self.ok = status_code < 400
+
+    def json(self):
+        return self.body
+
+class FakeCustomersService:
+    """
+    The wallet endpoints of the Customers Service used at checkout, with its `Idempotency-Key` semantics:
+    a key is claimed per endpoint scope, a reused key with the same body replays the stored response,
+    with a different body it gets 422, and a refund releases the key of the debit it refunds.
+    """
+
+    def __init__(self, balance):
+        self.balance = balance
+        self.ledger = {}
+        self.refunded = set()
+        self.keys = {}
+        self.debits = 0
+
+    def __call__(self, method, url, payload=None, headers=None, timeout=None, idempotent=None):
+        path = url.split("://", 1)[-1].split("/", 1)[-1]
+        scope = f"{method} /{path}"
+        key = (headers or {}).get("Idempotency-Key")
+        if key and (key, scope) in self.keys:
+            stored_payload, response = self.keys[(key, scope)]
+            return response if stored_payload == payload else FakeResponse(422, {"error": "Key reused"})
+
+        if re.fullmatch(r"customers/username/[^/]+/wallet/debit", path):
+            response = self.debit(payload["amount"])
+        elif re.fullmatch(r"customers/\d+/wallet/refund", path):
+            response = self.refund(payload["ledger_id"], payload.get("debit_key"))
+        else:
+            response = FakeResponse(404, {"error": "Not found"})
+        if key:
+            self.keys[(key, scope)] = (payload, response)
+        return response
+
+    def debit(self, amount):
+        if amount > self.balance:
+            return FakeResponse(400, {"error": "Insufficient wallet balance"})
+        self.debits += 1
+        self.balance -= amount
+        ledger_id = len(self.ledger) + 1
+        self.ledger[ledger_id] = amount
+        return FakeResponse(200, {"id": 1, "username": "alice", "wallet_balance": self.balance, "ledger_id": ledger_id})
+
+    def refund(self, ledger_id, debit_key):
+        if debit_key:
+            self.keys.pop((debit_key, "POST /customers/username/alice/wallet/debit"), None)
+        if ledger_id not in self.refunded:
+            self.refunded.add(ledger_id)
+            self.balance += self.ledger[ledger_id]
+        return FakeResponse(200, {"id": 1, "wallet_balance": self.balance, "ledger_id": ledger_id, "refunded": True})
@@ -0,0 +1,99 @@
+import asyncio
+import json
+import httpx
+import pytest
+import async_checkout
+from app import app
+from database import db
+from fakes import FakeCustomersService
+from models import Good, Sale
+
+def post_purchase(body, key=None):
+    """
+    Sends one `POST /sales/purchase` through the ASGI app.
+
+    Returns:
+        tuple: The status, the decoded body and the response headers.
+    """
+    messages = [{"type": "http.request", "body": body}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    headers = [(b"idempotency-key", key.encode())] if key else []
+    scope = {"type": "http", "path": "/sales/purchase", "method": "POST", "headers": headers}
+    asyncio.run(async_checkout.application(scope, receive, send))
+    return sent[0]["status"], json.loads(sent[1]["body"]), dict(sent[0]["headers"])
+
+@pytest.fixture
+def customers(monkeypatch):
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        db.session.add(Good(name="Laptop", category="electronics", price=10.0, stock_count=10))
+        db.session.commit()
+    service = FakeCustomersService(balance=100.0)
+
+    def handler(request):
+        payload = json.loads(request.content) if request.content else None
+        response = service(request.method, str(request.url), payload, headers=request.headers)
+        return httpx.Response(response.status_code, json=response.body)
+
+    client = httpx.AsyncClient(base_url="http://customers", transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(async_checkout.checkout, "_client", client)
+    monkeypatch.setattr(async_checkout, "log_to_audit", lambda *args, **kwargs: None)
+    return service
+
+def sales_count():
+    with app.app_context():
+        return db.session.execute(db.select(db.func.count()).select_from(Sale)).scalar()
+
+@pytest.mark.parametrize("body", [b"[]", b'["alice", 1]', b'"alice"', b"null", b"42"])
+def test_a_body_that_is_not_an_object_is_rejected(body):
+    assert post_purchase(body)[:2] == (400, {"error": "Request body must be a JSON object"})
+
+def test_invalid_json_is_rejected():
+    assert post_purchase(b"{")[:2] == (400, {"error": "Invalid JSON body"})
+
+def test_retry_after_failed_sale_charges_the_wallet_again(customers, monkeypatch):
+    checkout = async_checkout.checkout
+    record_sale = checkout._record_sale
+    failures = iter([RuntimeError("database is locked")])
+
+    def fail_once(*args, **kwargs):
+        error = next(failures, None)
+        if error is not None:
+            raise error
+        return record_sale(*args, **kwargs)
+
+    monkeypatch.setattr(checkout, "_record_sale", fail_once)
+    body = json.dumps({"username": "alice", "good_id": 1, "quantity": 2}).encode()
+
+    status, _, _ = post_purchase(body, key="checkout-1")
+    assert status == 500
+    assert customers.balance == 100.0
+    assert sales_count() == 0
+
+    # The 500 released the sales-side key and the refund the debit's key, so the retry is charged again
+    status, _, _ = post_purchase(body, key="checkout-1")
+    assert status == 201
+    assert customers.debits == 2
+    assert customers.balance == 80.0
+    assert sales_count() == 1
+
+    status, _, headers = post_purchase(body, key="checkout-1")
+    assert status == 201
+    assert headers.get(b"idempotent-replayed") == b"true"
+    assert customers.balance == 80.0
+    assert sales_count() == 1
+
+def test_a_reused_key_with_another_body_is_rejected(customers):
+    post_purchase(json.dumps({"username": "alice", "good_id": 1, "quantity": 1}).encode(), key="checkout-2")
+
+    status, _, _ = post_purchase(json.dumps({"username": "alice", "good_id": 1, "quantity": 5}).encode(), key="checkout-2")
+    assert status == 422
+    assert customers.debits == 1
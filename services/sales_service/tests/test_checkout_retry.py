@@ -0,0 +1,68 @@
+import pytest
+import routes
+from app import app
+from database import db
+from fakes import FakeCustomersService
+from models import Good, Sale
+
+@pytest.fixture
+def customers(monkeypatch):
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        db.session.add(Good(name="Laptop", category="electronics", price=10.0, stock_count=10))
+        db.session.commit()
+    service = FakeCustomersService(balance=100.0)
+    monkeypatch.setattr(routes, "call_service_api", service)
+    monkeypatch.setattr(routes, "log_to_audit", lambda *args, **kwargs: None)
+    return service
+
+def sales_count():
+    with app.app_context():
+        return db.session.execute(db.select(db.func.count()).select_from(Sale)).scalar()
+
+def test_retry_after_failed_sale_charges_the_wallet_again(customers, monkeypatch):
+    record_sales = routes.record_sales
+    failures = iter([RuntimeError("database is locked")])
+
+    def fail_once(*args, **kwargs):
+        error = next(failures, None)
+        if error is not None:
+            raise error
+        return record_sales(*args, **kwargs)
+
+    monkeypatch.setattr(routes, "record_sales", fail_once)
+    client = app.test_client()
+    headers = {"Idempotency-Key": "checkout-1"}
+    body = {"username": "alice", "good_id": 1, "quantity": 2}
+
+    first = client.post("/sales/purchase", json=body, headers=headers)
+    assert first.status_code == 500
+    assert customers.balance == 100.0
+    assert sales_count() == 0
+
+    # The 500 released the sales-side key, so the client retries with it; the debit must not be replayed
+    retry = client.post("/sales/purchase", json=body, headers=headers)
+    assert retry.status_code == 201
+    assert customers.debits == 2
+    assert customers.balance == 80.0
+    assert sales_count() == 1
+
+    replay = client.post("/sales/purchase", json=body, headers=headers)
+    assert replay.status_code == 201
+    assert replay.headers.get("Idempotent-Replayed") == "true"
+    assert customers.balance == 80.0
+    assert sales_count() == 1
+
+def test_same_key_on_purchase_and_cart_checkout_debits_each(customers):
+    client = app.test_client()
+    headers = {"Idempotency-Key": "shared-key"}
+
+    purchase = client.post("/sales/purchase", json={"username": "alice", "good_id": 1, "quantity": 1}, headers=headers)
+    checkout = client.post("/sales/cart/checkout", json={"username": "alice", "items": [{"good_id": 1, "quantity": 3}]}, headers=headers)
+
+    assert purchase.status_code == 201
+    assert checkout.status_code == 201
+    assert customers.debits == 2
+    assert customers.balance == 60.0
+    assert sales_count() == 2
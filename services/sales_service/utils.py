@@ -1,7 +1,7 @@
 import logging
 from cryptography.fernet import Fernet
-import requests
 from pybreaker import CircuitBreaker
+from service_client import create_service_client
 
 # Initialize logging
 logging.basicConfig(
@@ -16,6 +16,10 @@ cipher_suite = Fernet(ENCRYPTION_KEY)  # Initialize the cipher suite for encrypt
 
 # Circuit Breaker Configuration
 circuit_breaker = CircuitBreaker(fail_max=5, reset_timeout=60)  # Configure the circuit breaker with a max of 5 failures and a 60-second reset timeout
+breaker = circuit_breaker
+
+# Pooled keep-alive HTTP client shared by every call to another service
+service_client = create_service_client()
 
 # Logging Function
 def log_to_audit(service_name, endpoint, status, details):
@@ -66,15 +70,20 @@ def decrypt_data(encrypted_data):
 
 # Cross-Service API Call
 @breaker
-def call_service_api(method, url, payload=None, headers=None):
+def call_service_api(method, url, payload=None, headers=None, timeout=None, idempotent=None):
     """
     Makes an HTTP request to another service using the specified HTTP method.
 
+    The request goes through the shared `service_client`, which reuses pooled keep-alive connections,
+    applies connect/read timeouts and retries idempotent calls with jittered backoff.
+
     Args:
         method (str): The HTTP method to be used (GET, POST, PUT, DELETE).
         url (str): The URL of the service endpoint.
         payload (dict, optional): The data to be sent with the request (for POST/PUT).
         headers (dict, optional): Additional headers to be included in the request.
+        timeout (tuple, optional): `(connect, read)` timeouts in seconds, overriding the client defaults.
+        idempotent (bool, optional): Whether the call may be retried. Defaults to True for GET only.
 
     Returns:
         Response: The response object returned by the requests library.
@@ -83,16 +92,9 @@ def call_service_api(method, url, payload=None, headers=None):
         Exception: If the request fails, an error is logged and the exception is raised.
     """
     try:
-        if method.upper() == "GET":
-            response = requests.get(url, headers=headers)  # Perform a GET request
-        elif method.upper() == "POST":
-            response = requests.post(url, json=payload, headers=headers)  # Perform a POST request with JSON payload
-        elif method.upper() == "PUT":
-            response = requests.put(url, json=payload, headers=headers)  # Perform a PUT request with JSON payload
-        elif method.upper() == "DELETE":
-            response = requests.delete(url, headers=headers)  # Perform a DELETE request
-        else:
+        if method.upper() not in ("GET", "POST", "PUT", "DELETE"):
             raise ValueError(f"Unsupported HTTP method: {method}")  # Raise an exception if the method is not supported
+        response = service_client.request(method, url, json=payload, headers=headers, timeout=timeout, idempotent=idempotent)
 
         # Log the response details
         log_to_audit(
@@ -1,8 +1,10 @@
 from flask import Flask, jsonify
-from database import db
+from database import db, create_missing_indexes
 from routes import api
 from extensions import limiter
+from partitions import partition_router
 import logging
+import os
 import redis
 from flask_limiter.util import get_remote_address
 
@@ -13,6 +15,11 @@ app = Flask(__name__)
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///audit_logs.db'  # Database URI for audit logs storage
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False  # Disables modification tracking for performance reasons
 app.config['RATELIMIT_STORAGE_URI'] = "redis://localhost:6379"  # Redis storage URI for rate limiter data
+app.config['AUDIT_PARTITIONING'] = os.getenv("AUDIT_PARTITIONING", "false").lower() == "true"  # Store audit logs in time-partitioned SQLite files instead of audit_logs.db
+app.config['AUDIT_PARTITION_DIR'] = os.getenv("AUDIT_PARTITION_DIR", "audit_partitions")  # Directory holding the partition files and archives
+app.config['AUDIT_PARTITION_GRANULARITY'] = os.getenv("AUDIT_PARTITION_GRANULARITY", "month")  # One partition per "day" or per "month"
+app.config['AUDIT_RETENTION_DAYS'] = int(os.getenv("AUDIT_RETENTION_DAYS", 365))  # Partitions older than this are deleted by `python partitions.py maintain`
+app.config['AUDIT_COMPACT_AFTER_DAYS'] = int(os.getenv("AUDIT_COMPACT_AFTER_DAYS", 31))  # Partitions older than this are compacted into gzip NDJSON archives
 
 # Configure Limiter
 limiter.init_app(app)  # Initialize Flask-Limiter with the app for rate limiting
@@ -20,6 +27,8 @@ limiter.init_app(app)  # Initialize Flask-Limiter with the app for rate limiting
 # Initialize extensions
 db.init_app(app)  # Initialize the database with Flask
 api.init_app(app)  # Initialize API routes with Flask
+partition_router.init_app(app)  # Configure time-partitioned audit log storage
+create_missing_indexes(app)  # Indexes added to the models since audit_logs.db was created
 
 # Configure logging
 logging.basicConfig(
@@ -1,8 +1,29 @@
+import logging
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.exc import SQLAlchemyError
 
 # Initialize SQLAlchemy instance
 db = SQLAlchemy()
 
+def create_missing_indexes(app):
+    """
+    Creates the model indexes that an existing database lacks.
+
+    `db.create_all()` skips tables that already exist, and with them the indexes added to their models
+    later. Call it at startup. An index that cannot be built (e.g. a unique index over duplicate rows)
+    is logged and skipped.
+    """
+    with app.app_context():
+        existing = set(db.inspect(db.engine).get_table_names())
+        for table in db.metadata.sorted_tables:
+            if table.name not in existing:
+                continue
+            for index in table.indexes:
+                try:
+                    index.create(db.engine, checkfirst=True)
+                except SQLAlchemyError as e:
+                    logging.error(f"Failed to create index {index.name}: {e}")
+
 """
 The `db` object is an instance of `SQLAlchemy`, which is used for interacting with the database in Flask applications.
 It provides an ORM (Object Relational Mapping) interface that allows you to define models (tables) and perform CRUD operations 
@@ -58,3 +79,5 @@ def init_db():
 def get_all_users():
     users = User.query.all()  # Retrieve all User records
     return users
+```
+"""
@@ -29,3 +29,5 @@ How it works:
 @limiter.limit("5 per minute")  # Allow 5 requests per minute per client
 def resource():
     return "This is a rate-limited resource."
+```
+"""
@@ -4,6 +4,14 @@ from datetime import datetime
 # AuditLog Model: Tracks service operations and logs for auditing purposes.
 class AuditLog(db.Model):
     __tablename__ = 'audit_logs'  # The table name in the database
+    __table_args__ = (
+        # Composite indexes backing the keyset-paginated, filtered reads of GET /audit_logs
+        db.Index('ix_audit_logs_timestamp_id', 'timestamp', 'id'),
+        db.Index('ix_audit_logs_service_timestamp', 'service', 'timestamp', 'id'),
+        db.Index('ix_audit_logs_operation_timestamp', 'operation', 'timestamp', 'id'),
+        db.Index('ix_audit_logs_status_timestamp', 'status', 'timestamp', 'id'),
+        db.Index('ix_audit_logs_user_timestamp', 'user', 'timestamp', 'id'),
+    )
 
     # Define columns in the 'audit_logs' table
     id = db.Column(db.Integer, primary_key=True)  # Primary key for the log entry
@@ -0,0 +1,328 @@
+import argparse
+import gzip
+import json
+import logging
+import os
+import threading
+from collections import namedtuple
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine, insert
+from audit_queries import audit_logs_table, build_audit_select, parse_audit_query, serialize_audit_row
+
+# Supported partition sizes
+DAY = "day"
+MONTH = "month"
+
+# Row shape of entries read back from compressed archives (same attributes as an `audit_logs` row)
+ArchivedRow = namedtuple('ArchivedRow', ['id', 'timestamp', 'service', 'operation', 'status', 'user', 'details'])
+
+class PartitionRouter:
+    """
+    Routes audit logs to time-partitioned storage.
+
+    Each day or month of audit logs lives in its own SQLite file (`audit_logs_<period>.db`) with the
+    same schema and indexes as the `audit_logs` table. Writes are grouped by partition, reads only open
+    the partitions that overlap the requested time range, expired partitions are dropped by deleting
+    their file, and old partitions are compacted into gzip-compressed NDJSON archives
+    (`audit_logs_<period>.ndjson.gz`) that `iter_rows()` and the command line query tool can still scan.
+
+    Ids are only unique within a partition; pagination uses `(timestamp, id)`, which stays unique
+    because partitions never overlap in time.
+
+    Args:
+        directory (str): The directory holding the partition and archive files.
+        granularity (str): "day" or "month".
+        retention_days (int, optional): Partitions that ended more than this many days ago are deleted.
+            None keeps everything.
+        compact_after_days (int, optional): Partitions that ended more than this many days ago are
+            compacted into archives. None disables compaction.
+    """
+
+    def __init__(self, directory="audit_partitions", granularity=MONTH, retention_days=None, compact_after_days=None):
+        self.enabled = False
+        self.configure(directory, granularity, retention_days, compact_after_days)
+        self._engines = {}
+        self._lock = threading.Lock()
+
+    def configure(self, directory, granularity, retention_days, compact_after_days):
+        if granularity not in (DAY, MONTH):
+            raise ValueError(f"Unsupported partition granularity: {granularity}")
+        self.directory = directory
+        self.granularity = granularity
+        self.retention_days = retention_days
+        self.compact_after_days = compact_after_days
+
+    def init_app(self, app):
+        """
+        Configures the router from the Flask app config.
+
+        Config keys:
+            AUDIT_PARTITIONING (bool): Store audit logs in partitions instead of the main database.
+            AUDIT_PARTITION_DIR (str): Directory of the partition files.
+            AUDIT_PARTITION_GRANULARITY (str): "day" or "month".
+            AUDIT_RETENTION_DAYS (int): Retention period in days, or None to keep everything.
+            AUDIT_COMPACT_AFTER_DAYS (int): Age in days after which partitions are archived, or None.
+        """
+        self.configure(
+            app.config.get('AUDIT_PARTITION_DIR', self.directory),
+            app.config.get('AUDIT_PARTITION_GRANULARITY', self.granularity),
+            app.config.get('AUDIT_RETENTION_DAYS', self.retention_days),
+            app.config.get('AUDIT_COMPACT_AFTER_DAYS', self.compact_after_days)
+        )
+        self.enabled = bool(app.config.get('AUDIT_PARTITIONING', False))
+
+    # Partition naming
+
+    def partition_key(self, timestamp):
+        return timestamp.strftime("%Y_%m_%d" if self.granularity == DAY else "%Y_%m")
+
+    def partition_bounds(self, key):
+        """
+        Returns the `[start, end)` time range covered by a partition.
+        """
+        if self.granularity == DAY:
+            start = datetime.strptime(key, "%Y_%m_%d")
+            return start, start + timedelta(days=1)
+        start = datetime.strptime(key, "%Y_%m")
+        end = datetime(start.year + 1, 1, 1) if start.month == 12 else datetime(start.year, start.month + 1, 1)
+        return start, end
+
+    def partition_path(self, key):
+        return os.path.join(self.directory, f"audit_logs_{key}.db")
+
+    def archive_path(self, key):
+        return os.path.join(self.directory, f"audit_logs_{key}.ndjson.gz")
+
+    def partitions(self):
+        """
+        Lists the stored partitions in time order.
+
+        Returns:
+            list: `(key, kind)` tuples, where kind is "sqlite" for live partitions and "archive" for compacted ones.
+        """
+        if not os.path.isdir(self.directory):
+            return []
+        found = {}
+        for name in os.listdir(self.directory):
+            if not name.startswith("audit_logs_"):
+                continue
+            if name.endswith(".db"):
+                found[name[len("audit_logs_"):-len(".db")]] = "sqlite"
+            elif name.endswith(".ndjson.gz"):
+                found.setdefault(name[len("audit_logs_"):-len(".ndjson.gz")], "archive")
+        return sorted(found.items())
+
+    def engine(self, key):
+        """
+        Returns the engine of a live partition, creating its file, table and indexes on first use.
+        """
+        with self._lock:
+            engine = self._engines.get(key)
+            if engine is None:
+                os.makedirs(self.directory, exist_ok=True)
+                engine = create_engine(f"sqlite:///{os.path.abspath(self.partition_path(key))}")
+                audit_logs_table.create(engine, checkfirst=True)
+                self._engines[key] = engine
+            return engine
+
+    def _dispose(self, key):
+        with self._lock:
+            engine = self._engines.pop(key, None)
+        if engine is not None:
+            engine.dispose()
+
+    # Writes
+
+    def insert_many(self, rows):
+        """
+        Inserts validated audit rows, with one executemany INSERT and one transaction per partition.
+
+        Args:
+            rows (list): Dicts with the `audit_logs` columns. Rows without a timestamp get the current UTC time.
+
+        Returns:
+            int: The number of inserted rows.
+        """
+        grouped = {}
+        for row in rows:
+            row.setdefault('timestamp', datetime.utcnow())
+            grouped.setdefault(self.partition_key(row['timestamp']), []).append(row)
+        for key, partition_rows in grouped.items():
+            with self.engine(key).begin() as connection:
+                connection.execute(insert(audit_logs_table), partition_rows)
+        return len(rows)
+
+    # Reads
+
+    def _overlaps(self, key, query):
+        start, end = self.partition_bounds(key)
+        if query['since'] is not None and end <= query['since']:
+            return False
+        if query['until'] is not None and start >= query['until']:
+            return False
+        if query['after'] is not None and end <= query['after'][0]:
+            return False
+        return True
+
+    def _archive_rows(self, key, query):
+        """
+        Scans a compressed archive and yields the rows matching the query, in `(timestamp, id)` order.
+        """
+        after = query['after']
+        with gzip.open(self.archive_path(key), "rt") as archive:
+            for line in archive:
+                data = json.loads(line)
+                data['timestamp'] = datetime.fromisoformat(data['timestamp'])
+                row = ArchivedRow(**data)
+                if any(getattr(row, field) != value for field, value in query['filters'].items()):
+                    continue
+                if query['since'] is not None and row.timestamp < query['since']:
+                    continue
+                if query['until'] is not None and row.timestamp >= query['until']:
+                    continue
+                if after is not None and (row.timestamp, row.id) <= after:
+                    continue
+                yield row
+
+    def _sqlite_rows(self, key, query, limit):
+        """
+        Streams the rows matching the query from a live partition, in `(timestamp, id)` order.
+        """
+        with self.engine(key).connect() as connection:
+            result = connection.execution_options(stream_results=True, yield_per=500).execute(
+                build_audit_select(query, limit=limit)
+            )
+            yield from result
+
+    def iter_rows(self, query, limit=None):
+        """
+        Yields the audit rows matching a query across every overlapping partition, in `(timestamp, id)` order.
+
+        Args:
+            query (dict): A query returned by `parse_audit_query`.
+            limit (int, optional): The maximum number of rows, or None for no limit.
+        """
+        remaining = limit
+        for key, kind in self.partitions():
+            if remaining is not None and remaining <= 0:
+                return
+            if not self._overlaps(key, query):
+                continue
+            if kind == "archive":
+                rows = self._archive_rows(key, query)
+            else:
+                rows = self._sqlite_rows(key, query, remaining)
+            for row in rows:
+                yield row
+                if remaining is not None:
+                    remaining -= 1
+                    if remaining <= 0:
+                        return
+
+    # Maintenance
+
+    def _expired(self, key, days, now):
+        return days is not None and self.partition_bounds(key)[1] <= now - timedelta(days=days)
+
+    def apply_retention(self, now=None):
+        """
+        Deletes every partition and archive that ended before the retention period.
+
+        Dropping a whole file replaces row-by-row DELETEs and returns the disk space immediately.
+
+        Returns:
+            list: The keys of the dropped partitions.
+        """
+        now = now or datetime.utcnow()
+        dropped = []
+        for key, _ in self.partitions():
+            if not self._expired(key, self.retention_days, now):
+                continue
+            self._dispose(key)
+            for path in (self.partition_path(key), self.archive_path(key)):
+                if os.path.exists(path):
+                    os.remove(path)
+            dropped.append(key)
+            logging.info(f"Dropped expired audit log partition {key}")
+        return dropped
+
+    def compact(self, now=None):
+        """
+        Rewrites old SQLite partitions as gzip-compressed NDJSON archives and deletes the SQLite files.
+
+        Returns:
+            list: The keys of the compacted partitions.
+        """
+        now = now or datetime.utcnow()
+        compacted = []
+        for key, kind in self.partitions():
+            if kind != "sqlite" or not self._expired(key, self.compact_after_days, now):
+                continue
+            empty_query = {'filters': {}, 'since': None, 'until': None, 'after': None}
+            temporary_path = self.archive_path(key) + ".tmp"
+            with self.engine(key).connect() as connection, gzip.open(temporary_path, "wt") as archive:
+                result = connection.execution_options(stream_results=True, yield_per=1000).execute(build_audit_select(empty_query))
+                for row in result:
+                    archive.write(json.dumps(serialize_audit_row(row)) + "\n")
+            os.replace(temporary_path, self.archive_path(key))
+            self._dispose(key)
+            os.remove(self.partition_path(key))
+            compacted.append(key)
+            logging.info(f"Compacted audit log partition {key}")
+        return compacted
+
+    def maintain(self, now=None):
+        """
+        Applies the retention policy and then compacts old partitions.
+        """
+        return {"dropped": self.apply_retention(now), "compacted": self.compact(now)}
+
+# Shared router instance, configured by `partition_router.init_app(app)`
+partition_router = PartitionRouter()
+
+def main():
+    """
+    Command line tool for partition maintenance and for querying partitions and archives.
+
+    Options that are not given default to the service's configuration (`AUDIT_PARTITION_DIR`,
+    `AUDIT_PARTITION_GRANULARITY`, `AUDIT_RETENTION_DAYS` and `AUDIT_COMPACT_AFTER_DAYS`, which can be
+    set through environment variables of the same names), so `maintain` applies the configured policy.
+
+    Examples:
+        python partitions.py maintain
+        python partitions.py maintain --retention-days 90 --compact-after-days 7
+        python partitions.py query --service customers_service --since 2024-12-01T00:00:00
+    """
+    parser = argparse.ArgumentParser(description="Maintain and query time-partitioned audit logs.")
+    parser.add_argument("command", choices=["list", "maintain", "query"])
+    parser.add_argument("--dir")
+    parser.add_argument("--granularity", choices=[DAY, MONTH])
+    parser.add_argument("--retention-days", type=int)
+    parser.add_argument("--compact-after-days", type=int)
+    for field in ["service", "operation", "status", "user", "since", "until", "limit"]:
+        parser.add_argument(f"--{field}")
+    args = parser.parse_args()
+
+    from app import app
+    router = PartitionRouter()
+    router.init_app(app)
+    router.configure(
+        args.dir or router.directory,
+        args.granularity or router.granularity,
+        args.retention_days if args.retention_days is not None else router.retention_days,
+        args.compact_after_days if args.compact_after_days is not None else router.compact_after_days
+    )
+    if args.command == "list":
+        for key, kind in router.partitions():
+            print(f"{key}\t{kind}")
+    elif args.command == "maintain":
+        print(json.dumps(router.maintain()))
+    else:
+        query_args = {key: value for key, value in vars(args).items() if value is not None}
+        query = parse_audit_query(query_args)
+        limit = query['limit'] if args.limit else None
+        for row in router.iter_rows(query, limit):
+            print(json.dumps(serialize_audit_row(row)))
+
+if __name__ == "__main__":
+    main()
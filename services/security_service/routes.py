@@ -1,9 +1,12 @@
 from flask_restful import Api, Resource
 from models import AuditLog, SecureKey
 from database import db
-from flask import request, jsonify
+from flask import request, jsonify, Response, stream_with_context
 from extensions import limiter  # Import limiter
 from cryptography.fernet import Fernet
+from partitions import partition_router
+from audit_queries import InvalidQuery, parse_audit_query, build_audit_select, encode_cursor, serialize_audit_row
+import json
 import os
 
 api = Api()
@@ -41,6 +44,68 @@ def decrypt_data(data):
         return None
     return cipher_suite.decrypt(data.encode()).decode()
 
+# Audit Event Validation
+AUDIT_REQUIRED_FIELDS = ['service', 'operation', 'status']
+AUDIT_FIELD_LENGTHS = {
+    'service': AuditLog.service.type.length,
+    'operation': AuditLog.operation.type.length,
+    'status': AuditLog.status.type.length,
+    'user': AuditLog.user.type.length,
+    'details': AuditLog.details.type.length
+}
+
+def validate_audit_event(event):
+    """
+    Validates a single audit event and converts it into a row for the `audit_logs` table.
+
+    Args:
+        event (dict): The audit event. Expected fields: 'service', 'operation', 'status', 'user', 'details'.
+
+    Returns:
+        tuple: `(row, None)` if the event is valid, or `(None, error)` describing why it was rejected.
+    """
+    if not isinstance(event, dict):
+        return None, "Event must be a JSON object"
+    missing = [key for key in AUDIT_REQUIRED_FIELDS if not event.get(key)]
+    if missing:
+        return None, f"Missing required fields: {', '.join(missing)}"
+
+    row = {}
+    for field, max_length in AUDIT_FIELD_LENGTHS.items():
+        value = event.get(field)
+        if value is not None and not isinstance(value, str):
+            value = str(value)
+        if value is not None and len(value) > max_length:
+            return None, f"Field '{field}' exceeds {max_length} characters"
+        row[field] = value
+    return row, None
+
+def parse_audit_batch():
+    """
+    Reads a batch of audit events from the request body.
+
+    The body can be a JSON array of events or an NDJSON stream (one event per line,
+    sent with the `application/x-ndjson` content type). NDJSON lines that are not valid
+    JSON are returned as `None` so that they are reported as rejected instead of failing the whole batch.
+
+    Returns:
+        list: The decoded events, or None if the body is not a JSON array or NDJSON stream.
+    """
+    if request.mimetype in ('application/x-ndjson', 'application/ndjson'):
+        events = []
+        for line in request.stream:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                events.append(json.loads(line))
+            except ValueError:
+                events.append(None)
+        return events
+
+    data = request.get_json(silent=True)
+    return data if isinstance(data, list) else None
+
 
 class AuditLogsAPI(Resource):
     """
@@ -50,21 +115,66 @@ class AuditLogsAPI(Resource):
 
     def get(self):
         """
-        Retrieves all audit logs from the database.
+        Retrieves audit logs one page at a time.
+
+        Query Parameters:
+            service, operation, status, user (str, optional): Exact-match filters.
+            since, until (str, optional): ISO 8601 bounds on the timestamp (`since` inclusive, `until` exclusive).
+            limit (int, optional): Page size (default 100, maximum 1000).
+            cursor (str, optional): The `next_cursor` of the previous page.
+            format (str, optional): "ndjson" streams every matching row as newline-delimited JSON
+                instead of returning a single page.
 
         Returns:
-            list: A list of all audit logs in JSON format.
+            dict: The page of logs and the `next_cursor` to fetch the next one (None on the last page),
+            or a streamed NDJSON response when `format=ndjson`.
         """
-        logs = AuditLog.query.all()
-        return jsonify([{
-            'id': log.id,
-            'timestamp': log.timestamp,
-            'service': log.service,
-            'operation': log.operation,
-            'status': log.status,
-            'user': log.user,
-            'details': log.details
-        } for log in logs])
+        try:
+            query = parse_audit_query(request.args)
+        except InvalidQuery as e:
+            return {"error": str(e)}, 400
+
+        if request.args.get('format') == 'ndjson':
+            return self.stream(query)
+
+        if partition_router.enabled:
+            rows = list(partition_router.iter_rows(query, limit=query['limit'] + 1))
+        else:
+            rows = db.session.execute(build_audit_select(query, limit=query['limit'] + 1)).all()
+        next_cursor = None
+        if len(rows) > query['limit']:
+            rows = rows[:query['limit']]
+            next_cursor = encode_cursor(rows[-1].timestamp, rows[-1].id)
+        return jsonify({
+            'logs': [serialize_audit_row(row) for row in rows],
+            'next_cursor': next_cursor
+        })
+
+    def stream(self, query):
+        """
+        Streams every log matching the query as NDJSON.
+
+        Rows are fetched from a server-side cursor in chunks, so memory use stays flat
+        however many rows match.
+
+        Args:
+            query (dict): A query returned by `parse_audit_query`.
+
+        Returns:
+            Response: A streamed `application/x-ndjson` response.
+        """
+        limit = query['limit'] if 'limit' in request.args else None
+
+        def generate():
+            if partition_router.enabled:
+                rows = partition_router.iter_rows(query, limit=limit)
+            else:
+                stmt = build_audit_select(query, limit=limit).execution_options(stream_results=True, yield_per=500)
+                rows = db.session.execute(stmt)
+            for row in rows:
+                yield json.dumps(serialize_audit_row(row)) + "\n"
+
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
 
     decorators = [limiter.limit("10/minute")]  # Limit this endpoint to 10 requests per minute
 
@@ -82,6 +192,13 @@ class AuditLogsAPI(Resource):
         if not data or not all(key in data for key in ['service', 'operation', 'status']):
             return {"error": "Missing required fields"}, 400
 
+        if partition_router.enabled:
+            row, error = validate_audit_event(data)
+            if error:
+                return {"error": error}, 400
+            partition_router.insert_many([row])
+            return {"message": "Log added successfully"}, 201
+
         log = AuditLog(
             service=data.get('service'),
             operation=data.get('operation'),
@@ -94,6 +211,51 @@ class AuditLogsAPI(Resource):
         return {"message": "Log added successfully"}, 201
 
 
+class AuditLogsBulkAPI(Resource):
+    """
+    API Resource for ingesting audit logs in bulk. Used by the batching audit shippers of the other services.
+    """
+    decorators = [limiter.limit("120/minute")]  # Limit this endpoint to 120 batches per minute
+
+    MAX_BATCH_SIZE = 5000  # Largest number of events accepted in one request
+
+    def post(self):
+        """
+        Creates many audit log entries in a single transaction.
+
+        The body is either a JSON array of audit events or an NDJSON stream. Every event is
+        validated; the valid ones are inserted with one executemany-style INSERT and one commit.
+
+        Returns:
+            dict: The number of accepted events and the index and reason of every rejected event,
+            so that clients can retry only the failures. The status is 201 when every event was
+            accepted and 207 when any was rejected, even all of them: the batch itself was processed,
+            and a shipper must not resend events that can never be valid.
+        """
+        events = parse_audit_batch()
+        if events is None:
+            return {"error": "Expected a JSON array or an NDJSON stream of audit events"}, 400
+        if len(events) > self.MAX_BATCH_SIZE:
+            return {"error": f"Batch exceeds {self.MAX_BATCH_SIZE} events"}, 413
+
+        rows, rejected = [], []
+        for index, event in enumerate(events):
+            row, error = validate_audit_event(event)
+            if error:
+                rejected.append({"index": index, "error": error})
+            else:
+                rows.append(row)
+
+        if rows and partition_router.enabled:
+            partition_router.insert_many(rows)
+        elif rows:
+            db.session.execute(db.insert(AuditLog), rows)
+            db.session.commit()
+
+        status_code = 207 if rejected else 201
+        return {"accepted": len(rows), "rejected_count": len(rejected), "rejected": rejected}, status_code
+
+
 class SecureKeysAPI(Resource):
     """
     API Resource for managing secure keys. Allows for storing and retrieving encrypted keys.
@@ -144,5 +306,6 @@ class SecureKeysAPI(Resource):
 
 # Add resources to API
 api.add_resource(AuditLogsAPI, '/audit_logs')
+api.add_resource(AuditLogsBulkAPI, '/audit_logs/bulk')
 api.add_resource(SecureKeysAPI, '/secure_keys', '/secure_keys/<string:key_name>')
 